@@ -0,0 +1,217 @@
+import asyncio
+import logging
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from bson import ObjectId
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.config import settings
+from app.database import db
+
+
+# Each uvicorn worker is its own process with its own in-memory caches
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+INVALIDATION_COLLECTION = "cache_invalidations"
+
+# Invalidations only matter to workers running right now
+INVALIDATION_TTL_SECONDS = 3600
+
+# How far back each poll re-reads. Times are assigned by the server, but a
+# write stamped earlier can still become visible after a later one.
+POLL_OVERLAP = timedelta(seconds=5)
+
+LEADER_LEASE_ID = "startup_leader"
+
+# cache name -> callable(keys) dropping those keys from the local cache
+_handlers = {}
+
+
+def register_handler(cache_name: str, handler):
+    """Register the function that clears a per-process cache"""
+    _handlers[cache_name] = handler
+
+
+def _apply(cache_name: str, keys: list):
+    handler = _handlers.get(cache_name)
+    if handler is None:
+        return
+    try:
+        handler(*keys)
+    except Exception as e:
+        logging.error(f"❌ Cache invalidation for {cache_name} failed: {e}")
+
+
+async def publish(cache_name: str, *keys: str):
+    """Clear a cache in this worker and tell every other worker to do so"""
+    _apply(cache_name, list(keys))
+    try:
+        # server_at comes from the server clock, so pollers in every worker
+        # see one ordering
+        await db[INVALIDATION_COLLECTION].update_one(
+            {"_id": ObjectId()},
+            {
+                "$setOnInsert": {
+                    "worker_id": WORKER_ID,
+                    "cache": cache_name,
+                    "keys": list(keys),
+                    "created_at": datetime.utcnow(),
+                },
+                "$currentDate": {"server_at": True},
+            },
+            upsert=True,
+        )
+    except PyMongoError as e:
+        # Other workers still converge once their cache TTL runs out
+        logging.warning(f"⚠️ Could not broadcast {cache_name} invalidation: {e}")
+
+
+def _receive(event: dict):
+    if event.get("worker_id") == WORKER_ID:
+        return
+    _apply(event.get("cache"), event.get("keys") or [])
+
+
+async def _watch_change_stream():
+    """Follow invalidations through a change stream (replica sets only)"""
+    pipeline = [{"$match": {"operationType": "insert"}}]
+    async with db[INVALIDATION_COLLECTION].watch(pipeline) as stream:
+        logging.info("📡 Cache invalidation bus using change streams")
+        async for change in stream:
+            _receive(change["fullDocument"])
+
+
+async def _poll():
+    """Follow invalidations by polling - works on a standalone mongod"""
+    logging.info(
+        f"📡 Cache invalidation bus polling every "
+        f"{settings.invalidation_poll_seconds}s"
+    )
+    collection = db[INVALIDATION_COLLECTION]
+    # Events already applied (or published before this worker started) in
+    # the overlap window -> their server time
+    seen = {}
+    latest = await collection.find_one(
+        {"server_at": {"$exists": True}},
+        {"server_at": 1},
+        sort=[("server_at", -1)],
+    )
+    newest = latest["server_at"] if latest else datetime.utcnow()
+    async for event in collection.find(
+        {"server_at": {"$gte": newest - POLL_OVERLAP}}, {"server_at": 1}
+    ):
+        seen[event["_id"]] = event["server_at"]
+
+    while True:
+        await asyncio.sleep(settings.invalidation_poll_seconds)
+        try:
+            async for event in collection.find(
+                {
+                    "server_at": {"$gte": newest - POLL_OVERLAP},
+                    "worker_id": {"$ne": WORKER_ID},
+                }
+            ).sort("server_at", 1):
+                if event["_id"] in seen:
+                    continue
+                seen[event["_id"]] = event["server_at"]
+                newest = max(newest, event["server_at"])
+                _receive(event)
+            seen = {
+                event_id: server_at
+                for event_id, server_at in seen.items()
+                if server_at >= newest - POLL_OVERLAP
+            }
+        except PyMongoError as e:
+            logging.warning(f"⚠️ Cache invalidation poll failed: {e}")
+
+
+async def run_invalidation_listener():
+    """Apply invalidations published by other workers until cancelled"""
+    from app.cascade import supports_transactions
+
+    await db[INVALIDATION_COLLECTION].create_index(
+        "created_at", expireAfterSeconds=INVALIDATION_TTL_SECONDS
+    )
+    await db[INVALIDATION_COLLECTION].create_index("server_at")
+    # Change streams need a replica set, same as transactions
+    if await supports_transactions():
+        try:
+            await _watch_change_stream()
+            return
+        except PyMongoError as e:
+            logging.warning(f"⚠️ Change stream unavailable, polling instead: {e}")
+    await _poll()
+
+
+async def acquire_leadership() -> bool:
+    """Take (or renew) the startup lease. Only the holder runs one-off
+    lifespan work such as seeding, restores and backups."""
+    now = datetime.utcnow()
+    try:
+        await db.app_meta.find_one_and_update(
+            {
+                "_id": LEADER_LEASE_ID,
+                "$or": [
+                    {"owner": WORKER_ID},
+                    {"expires_at": {"$lt": now}},
+                ],
+            },
+            {
+                "$set": {
+                    "owner": WORKER_ID,
+                    "expires_at": now
+                    + timedelta(seconds=settings.leader_lease_seconds),
+                }
+            },
+            upsert=True,
+        )
+        return True
+    except DuplicateKeyError:
+        # The lease exists and another live worker holds it
+        return False
+
+
+async def run_leader_election(leader_work: list):
+    """Keep competing for the lease in every worker. The holder runs
+    leader_work (async functions) and cancels them as soon as it loses the
+    lease, so a crashed leader is replaced within one lease period and two
+    workers never run them at once."""
+    tasks = []
+    held_until = None
+    try:
+        while True:
+            now = datetime.utcnow()
+            try:
+                is_leader = await acquire_leadership()
+                if is_leader:
+                    held_until = now + timedelta(
+                        seconds=settings.leader_lease_seconds
+                    )
+            except PyMongoError as e:
+                logging.warning(f"⚠️ Startup lease renewal failed: {e}")
+                # Still ours until the last renewal runs out
+                is_leader = held_until is not None and now < held_until
+
+            if is_leader and not tasks:
+                logging.info(f"👑 Worker {WORKER_ID} is now the leader")
+                tasks = [asyncio.create_task(work()) for work in leader_work]
+            elif not is_leader and tasks:
+                logging.warning("⚠️ Lost the startup lease to another worker")
+                for task in tasks:
+                    task.cancel()
+                tasks = []
+                held_until = None
+
+            await asyncio.sleep(settings.leader_lease_seconds / 3)
+    finally:
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await release_leadership()
+
+
+async def release_leadership():
+    """Give the lease up on shutdown so a restarted worker can take it"""
+    await db.app_meta.delete_one({"_id": LEADER_LEASE_ID, "owner": WORKER_ID})
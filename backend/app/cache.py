@@ -0,0 +1,44 @@
+import logging
+from cachetools import TTLCache
+from app.bus import publish, register_handler
+from app.database import db
+
+
+# Reference data (templates, dispositions, referral sites) changes rarely but
+# is fetched on every registration and dashboard page load
+REFERENCE_COLLECTIONS = [
+    "clinical_templates",
+    "notes_templates",
+    "dispositions",
+    "referral_sites",
+]
+
+reference_cache = TTLCache(maxsize=len(REFERENCE_COLLECTIONS), ttl=300)
+
+
+async def get_reference_data(collection_name: str) -> list:
+    """Get all documents of a reference collection, served from cache"""
+    documents = reference_cache.get(collection_name)
+    if documents is None:
+        documents = await db[collection_name].find({}, {"_id": 0}).to_list(
+            1000
+        )
+        reference_cache[collection_name] = documents
+    return documents
+
+
+def _drop_reference_data(*collection_names: str):
+    for collection_name in collection_names or REFERENCE_COLLECTIONS:
+        reference_cache.pop(collection_name, None)
+    logging.info(
+        f"Reference cache invalidated: {', '.join(collection_names) or 'all'}"
+    )
+
+
+register_handler("reference_data", _drop_reference_data)
+
+
+async def invalidate_reference_cache(*collection_names: str):
+    """Drop cached reference data in every worker so the next read goes to
+    the database"""
+    await publish("reference_data", *collection_names)
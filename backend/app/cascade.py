@@ -0,0 +1,171 @@
+import asyncio
+import logging
+from app.database import (
+    client,
+    db,
+    create_unique_indexes,
+    create_performance_indexes,
+)
+from app.hooks import CLIENT_COLLECTION, record_write
+
+
+# Collections holding per-client records keyed on registration_id
+CHILD_COLLECTIONS = [
+    "activities",
+    "test_records",
+    "notes_records",
+    "medications",
+    "interactions",
+    "dispensing",
+]
+
+# Share links created for a registration's attachments
+SHARE_COLLECTION = "temporary_shares"
+
+# Everything removed by a full client data wipe
+CLIENT_DATA_COLLECTIONS = (
+    [
+        "admin_registrations",
+        "legacy_data",
+        "legacy_records",
+        "legacy_upload_jobs",
+    ]
+    + CHILD_COLLECTIONS
+    + [SHARE_COLLECTION]
+)
+
+# Keeps each $in list well under the 16MB command limit
+DELETE_BATCH_SIZE = 500
+
+# Resolved on first use - standalone servers cannot run transactions
+_supports_transactions = None
+
+
+async def supports_transactions() -> bool:
+    """Check whether the deployment is a replica set (or sharded cluster)"""
+    global _supports_transactions
+    if _supports_transactions is None:
+        try:
+            hello = await client.admin.command("hello")
+            _supports_transactions = bool(
+                hello.get("setName") or hello.get("msg") == "isdbgrid"
+            )
+        except Exception as e:
+            logging.warning(f"Could not detect replica set: {e}")
+            _supports_transactions = False
+    return _supports_transactions
+
+
+async def _delete_batch(batch: list, session=None) -> dict:
+    """Delete one batch of registrations with their child records and shares"""
+    child_query = {"registration_id": {"$in": batch}}
+    collection_names = CHILD_COLLECTIONS + [SHARE_COLLECTION]
+
+    if session is None:
+        # No transaction - children and shares go concurrently, the parent
+        # only after every child delete succeeded so a failure never
+        # leaves orphaned records
+        results = await asyncio.gather(
+            *[
+                db[collection_name].delete_many(child_query)
+                for collection_name in collection_names
+            ]
+        )
+    else:
+        # A session cannot run operations concurrently
+        results = [
+            await db[collection_name].delete_many(child_query, session=session)
+            for collection_name in collection_names
+        ]
+
+    batch_counts = {
+        collection_name: result.deleted_count
+        for collection_name, result in zip(collection_names, results)
+    }
+
+    result = await db.admin_registrations.delete_many(
+        {"id": {"$in": batch}}, session=session
+    )
+    batch_counts["admin_registrations"] = result.deleted_count
+    return batch_counts
+
+
+async def delete_registrations(registration_ids: list) -> dict:
+    """Delete registrations and their child records in batches of ids
+    Each batch runs in a transaction on replica sets. Returns deleted
+    counts per collection."""
+    deletion_counts = {name: 0 for name in CHILD_COLLECTIONS}
+    deletion_counts[SHARE_COLLECTION] = 0
+    deletion_counts["admin_registrations"] = 0
+
+    use_transaction = await supports_transactions()
+
+    for start in range(0, len(registration_ids), DELETE_BATCH_SIZE):
+        batch = registration_ids[start : start + DELETE_BATCH_SIZE]
+
+        if use_transaction:
+            async with await client.start_session() as session:
+                batch_counts = await session.with_transaction(
+                    lambda s: _delete_batch(batch, session=s)
+                )
+        else:
+            batch_counts = await _delete_batch(batch)
+
+        for collection_name, count in batch_counts.items():
+            deletion_counts[collection_name] += count
+        await record_write(CLIENT_COLLECTION, "delete", batch)
+
+    return deletion_counts
+
+
+async def delete_registrations_matching(query: dict) -> dict:
+    """Delete every registration matching query along with its child
+    records. Only ids are read, never the registration documents."""
+    # Collect ids up front - deleting while the cursor is open would
+    # shift documents under it
+    registration_ids = [
+        doc["id"]
+        async for doc in db.admin_registrations.find(
+            query, {"_id": 0, "id": 1}
+        ).batch_size(DELETE_BATCH_SIZE)
+        if doc.get("id")
+    ]
+
+    deletion_counts = await delete_registrations(registration_ids)
+    logging.info(
+        f"Cascade deleted {deletion_counts['admin_registrations']} registrations"
+    )
+    return deletion_counts
+
+
+async def drop_client_data() -> dict:
+    """Drop every client data collection and recreate its indexes
+    Much faster than delete_many({}) and frees the storage immediately."""
+    existing = set(await db.list_collection_names())
+    collection_names = [
+        name for name in CLIENT_DATA_COLLECTIONS if name in existing
+    ]
+
+    counts = await asyncio.gather(
+        *[
+            db[collection_name].estimated_document_count()
+            for collection_name in collection_names
+        ]
+    )
+    await asyncio.gather(
+        *[
+            db.drop_collection(collection_name)
+            for collection_name in collection_names
+        ]
+    )
+
+    deletion_counts = {name: 0 for name in CLIENT_DATA_COLLECTIONS}
+    deletion_counts.update(dict(zip(collection_names, counts)))
+
+    # Dropping a collection drops its indexes too
+    await create_unique_indexes()
+    await create_performance_indexes()
+    await db.temporary_shares.create_index("expires_at", expireAfterSeconds=0)
+    await record_write(CLIENT_COLLECTION, "drop", [])
+
+    return deletion_counts
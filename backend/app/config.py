@@ -4,7 +4,7 @@ from typing import Any
 import os
 from dotenv import load_dotenv
 from cryptography.fernet import Fernet
-from anthropic import AsyncAnthropic
+from app.mongo import MongoSettings
 
 load_dotenv()
 
@@ -18,13 +18,23 @@ def get_env(key: str) -> Any:
 
 
 class Settings:
-    # database
-    mongo_url: str = os.getenv("MONGO_URL", "mongodb://localhost:27017")
-    db_name: str = os.getenv("DB_NAME", "my420_ca_db")
+    # database - pool, timeout and compression options live on mongo
+    mongo = MongoSettings()
+    mongo_url: str = mongo.url
+    db_name: str = mongo.db_name
 
     # claude
     anthropic_key = get_env("ANTHROPIC_API_KEY")
-    anthropic_client = AsyncAnthropic(api_key=anthropic_key)
+    _anthropic_client = None
+
+    @property
+    def anthropic_client(self):
+        # The SDK is slow to import and only the chat endpoint needs it
+        if self._anthropic_client is None:
+            from anthropic import AsyncAnthropic
+
+            self._anthropic_client = AsyncAnthropic(api_key=self.anthropic_key)
+        return self._anthropic_client
 
     # environment
     environment = os.getenv("ENVIRONMENT", "production").lower()
@@ -44,6 +54,28 @@ class Settings:
     smtp_username = os.getenv("SMTP_USERNAME", "")
     smtp_password = os.getenv("SMTP_PASSWORD", "")
 
+    # query monitoring
+    slow_query_ms = int(os.getenv("SLOW_QUERY_MS", "100"))
+    explain_sample_rate = float(os.getenv("EXPLAIN_SAMPLE_RATE", "0.1"))
+
+    # multi-worker coordination
+    invalidation_poll_seconds = float(
+        os.getenv("INVALIDATION_POLL_SECONDS", "2")
+    )
+    leader_lease_seconds = int(os.getenv("LEADER_LEASE_SECONDS", "60"))
+
+    # notifications - "immediate" sends each email, "digest" batches them
+    notification_mode = os.getenv("NOTIFICATION_MODE", "immediate").lower()
+    notification_digest_minutes = int(
+        os.getenv("NOTIFICATION_DIGEST_MINUTES", "15")
+    )
+    # Kinds (registration, contact, finalization) sent immediately in digest mode
+    notification_immediate_types = {
+        kind.strip()
+        for kind in os.getenv("NOTIFICATION_IMMEDIATE_TYPES", "").split(",")
+        if kind.strip()
+    }
+
 
 settings = Settings()
 
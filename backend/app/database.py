@@ -1,11 +1,24 @@
+import asyncio
+import hashlib
+import json
 import subprocess
-from motor.motor_asyncio import AsyncIOMotorClient
+from datetime import datetime
+from pymongo import UpdateOne
 import logging
 from app.config import settings
-from app.schema import Disposition, ReferralSite
-
-
-client = AsyncIOMotorClient(settings.mongo_url)
+from app.mongo import create_client
+from app.monitoring import command_monitor, pool_monitor
+from app.schema import (
+    ClinicalTemplate,
+    Disposition,
+    NotesTemplate,
+    ReferralSite,
+)
+
+
+client = create_client(
+    settings.mongo, event_listeners=[command_monitor, pool_monitor]
+)
 db = client[settings.db_name]
 
 
@@ -13,16 +26,91 @@ db = client[settings.db_name]
 async def create_unique_indexes():
     """Create unique indexes to permanently prevent duplicate registrations"""
     try:
-        # Create unique index on firstName + lastName to prevent any duplicates
+        # Namesakes are different people, so names no longer have to be
+        # unique - the index stays for name lookups
+        name_index = "firstName_1_lastName_1"
+        indexes = await db.admin_registrations.index_information()
+        if indexes.get(name_index, {}).get("unique"):
+            await db.admin_registrations.drop_index(name_index)
+            logging.info("✅ Dropped unique name index for admin_registrations")
+        await db.admin_registrations.create_index(
+            [("firstName", 1), ("lastName", 1)], background=True
+        )
+
+        # One registration per health card. Registrations without a card
+        # have a null key and are left out of the index.
+        await db.admin_registrations.create_index(
+            "healthCardKey",
+            unique=True,
+            partialFilterExpression={"healthCardKey": {"$type": "string"}},
+            background=True,
+        )
+        # Cards shared by registrations saved before the key existed
         await db.admin_registrations.create_index(
-            [("firstName", 1), ("lastName", 1)], unique=True, background=True
+            "healthCardConflict", sparse=True, background=True
         )
-        logging.info("✅ Unique index created for admin_registrations")
+        logging.info("✅ Unique health card index created for admin_registrations")
 
     except Exception as e:
         # Index might already exist, which is fine
         logging.info(f"Index creation info: {str(e)}")
 
+    # Reference data is upserted by name, so names must be unique
+    for collection_name in [
+        "clinical_templates",
+        "notes_templates",
+        "dispositions",
+        "referral_sites",
+    ]:
+        try:
+            await db[collection_name].create_index(
+                "name", unique=True, background=True
+            )
+            logging.info(f"✅ Unique name index created for {collection_name}")
+        except Exception as e:
+            # Existing duplicate names prevent the index from being built
+            logging.info(
+                f"Name index creation info for {collection_name}: {str(e)}"
+            )
+
+
+async def bulk_upsert_by_name(collection, documents: list, update_fields: list):
+    """Upsert documents keyed on name in a single unordered bulk_write
+
+    Existing documents only get update_fields (and updated_at) refreshed;
+    every other field is written on insert only. When a name appears more
+    than once the last document wins. Returns a tuple of
+    (inserted_count, updated_count).
+    """
+    # Two upserts of one new name would race to insert it and the loser
+    # fails on the unique name index
+    by_name = {document["name"]: document for document in documents}
+
+    operations = []
+    for document in by_name.values():
+        set_fields = {field: document[field] for field in update_fields}
+        set_fields["updated_at"] = document["updated_at"]
+        operations.append(
+            UpdateOne(
+                {"name": document["name"]},
+                {
+                    "$set": set_fields,
+                    "$setOnInsert": {
+                        k: v
+                        for k, v in document.items()
+                        if k != "name" and k not in set_fields
+                    },
+                },
+                upsert=True,
+            )
+        )
+
+    if not operations:
+        return 0, 0
+
+    result = await collection.bulk_write(operations, ordered=False)
+    return result.upserted_count, result.matched_count
+
 
 # PERFORMANCE OPTIMIZATION - Create performance indexes for dashboard queries
 async def create_performance_indexes():
@@ -59,366 +147,559 @@ async def create_performance_indexes():
         )
         logging.info("✅ Date index created for activities")
 
-    except Exception as e:
-        # Indexes might already exist, which is fine
-        logging.info(f"Performance index creation info: {str(e)}")
+        # Index for activity status filters sorted by newest first
+        await db.activities.create_index(
+            [("date", 1), ("created_at", -1)], background=True
+        )
+        logging.info("✅ Status filter index created for activities")
 
+        # Indexes for activity searches on client name and description
+        # words - each search word is an anchored prefix on one of them
+        await db.activities.create_index(
+            [("client_name_tokens", 1)], background=True
+        )
+        await db.activities.create_index(
+            [("description_tokens", 1)], background=True
+        )
+        logging.info("✅ Search token indexes created for activities")
 
-async def seed_clinical_templates():
-    """Ensure default clinical templates exist in database"""
-    try:
-        # Run template seeding using Node.js directly
-        result = subprocess.run(
-            ["node", "/app/scripts/seed-templates.js"],
-            capture_output=True,
-            text=True,
-            cwd="/app",
-            env={"MONGO_URL": settings.mongo_url, "DB_NAME": settings.db_name},
-            # env={
-            # **os.environ,
-            #     "MONGO_URL": os.environ.get(
-            #         "MONGO_URL", "mongodb://localhost:27017"
-            #     ),
-            #     "DB_NAME": os.environ.get("DB_NAME", "medical_db"),
-            # },
+        # Index for a client's notes timeline, newest first
+        await db.notes_records.create_index(
+            [("registration_id", 1), ("created_at", -1), ("id", -1)],
+            background=True,
         )
+        logging.info("✅ Timeline index created for notes")
 
-        if result.returncode == 0:
-            logging.info("✅ Clinical templates seeded successfully")
-        else:
-            logging.error(f"❌ Template seeding failed: {result.stderr}")
+        # Index for searching notes across clients
+        await db.notes_records.create_index(
+            [("noteText", "text"), ("templateType", "text")],
+            weights={"noteText": 1, "templateType": 5},
+            name="notes_text_search",
+            background=True,
+        )
+        logging.info("✅ Text index created for notes search")
+
+        # Legacy upload records in file order, and upload jobs kept a week
+        await db.legacy_records.create_index(
+            [("upload_id", 1), ("row", 1)], background=True
+        )
+        await db.legacy_upload_jobs.create_index(
+            "created_at", expireAfterSeconds=7 * 24 * 3600, background=True
+        )
+        logging.info("✅ Indexes created for legacy uploads")
 
     except Exception as e:
-        logging.error(f"❌ Error running template seeding: {str(e)}")
+        # Indexes might already exist, which is fine
+        logging.info(f"Performance index creation info: {str(e)}")
 
 
-async def seed_notes_templates():
-    """Ensure default Notes templates exist in database"""
+async def _store_health_card_keys(batch: list) -> int:
+    """Set healthCardKey for (registration id, key) pairs. Keys already
+    taken are stored in healthCardConflict instead. Returns how many were
+    flagged that way."""
+    from pymongo.errors import BulkWriteError
+
     try:
-        # Run Notes template seeding using Node.js directly
-        result = subprocess.run(
-            ["node", "/app/scripts/seed-notes-templates.js"],
-            capture_output=True,
-            text=True,
-            cwd="/app",
-            env={"MONGO_URL": settings.mongo_url, "DB_NAME": settings.db_name},
-            #
-            #     **os.environ,
-            #     "MONGO_URL": os.environ.get(
-            #         "MONGO_URL", "mongodb://localhost:27017"
-            #     ),
-            #     "DB_NAME": os.environ.get("DB_NAME", "medical_db"),
-            # },
+        await db.admin_registrations.bulk_write(
+            [
+                UpdateOne({"id": reg_id}, {"$set": {"healthCardKey": key}})
+                for reg_id, key in batch
+            ],
+            ordered=False,
         )
+        return 0
+    except BulkWriteError as e:
+        errors = e.details["writeErrors"]
+        if any(error["code"] != 11000 for error in errors):
+            raise
+        for error in errors:
+            reg_id, key = batch[error["index"]]
+            await db.admin_registrations.update_one(
+                {"id": reg_id},
+                {"$set": {"healthCardKey": None, "healthCardConflict": key}},
+            )
+        return len(errors)
 
-        if result.returncode == 0:
-            logging.info("✅ Notes templates seeded successfully")
-        else:
-            logging.error(f"❌ Notes template seeding failed: {result.stderr}")
 
-    except Exception as e:
-        logging.error(f"❌ Error running Notes template seeding: {str(e)}")
+async def backfill_health_card_keys():
+    """Store the health card key on registrations saved before it existed.
+    A card already keyed on another registration is flagged in
+    healthCardConflict for staff to review."""
+    from app.utils import health_card_key
 
-
-async def seed_dispositions():
-    """Ensure default dispositions exist in database"""
     try:
-        # Check if dispositions already exist
-        existing_count = await db.dispositions.count_documents({})
-        if existing_count > 0:
-            logging.info("✅ Dispositions already exist in database")
-            return
-
-        # Default dispositions with frequency flags
-        default_dispositions = [
-            # Most frequently used dispositions
-            {"name": "ACTIVE", "is_frequent": True, "is_default": True},
-            {"name": "BW RLTS", "is_frequent": True, "is_default": True},
-            {"name": "CONSULT REQ", "is_frequent": True, "is_default": True},
-            {"name": "DELIVERY", "is_frequent": True, "is_default": True},
-            {"name": "DISPENSING", "is_frequent": True, "is_default": True},
-            {"name": "PENDING", "is_frequent": True, "is_default": True},
-            {"name": "POCT NEG", "is_frequent": True, "is_default": True},
-            {"name": "PREVIOUSLY TX", "is_frequent": True, "is_default": True},
-            {"name": "SELF CURED", "is_frequent": True, "is_default": True},
-            {"name": "SOT", "is_frequent": True, "is_default": True},
-            # All other dispositions in alphabetical order
-            {"name": "ACTIVE-ALL", "is_frequent": False, "is_default": True},
-            {
-                "name": "ACTIVE-ALL-NC",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "ACTIVE-ALL-OK",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "ACTIVE-BRIDGE",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "ACTIVE-JAIL", "is_frequent": False, "is_default": True},
-            {"name": "ACTIVE-NC", "is_frequent": False, "is_default": True},
-            {"name": "ACTIVE-OK", "is_frequent": False, "is_default": True},
-            {"name": "BW ERROR", "is_frequent": False, "is_default": True},
-            {"name": "BW REQ", "is_frequent": False, "is_default": True},
-            {"name": "BW RLTS-P", "is_frequent": False, "is_default": True},
-            {"name": "COMPLETED", "is_frequent": False, "is_default": True},
-            {
-                "name": "CONSULT-LOCATE",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "CURED", "is_frequent": False, "is_default": True},
-            {"name": "DBS", "is_frequent": False, "is_default": True},
-            {"name": "DECEASED", "is_frequent": False, "is_default": True},
-            {"name": "DELETED", "is_frequent": False, "is_default": True},
-            {"name": "DISCONTINUED", "is_frequent": False, "is_default": True},
-            {"name": "DUPLICATE", "is_frequent": False, "is_default": True},
-            {"name": "EXTERNAL TX", "is_frequent": False, "is_default": True},
-            {"name": "HEALTH CARD", "is_frequent": False, "is_default": True},
-            {"name": "HIV (ACTIVE)", "is_frequent": False, "is_default": True},
-            {
-                "name": "HIV - DISCHARGED",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "HIV PATIENT", "is_frequent": False, "is_default": True},
-            {"name": "HOME VISIT", "is_frequent": False, "is_default": True},
-            {"name": "HOUSING", "is_frequent": False, "is_default": True},
-            {"name": "INACTIVE", "is_frequent": False, "is_default": True},
-            {"name": "JAIL", "is_frequent": False, "is_default": True},
-            {
-                "name": "LAB APPOINTMENT",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "LAB REQ", "is_frequent": False, "is_default": True},
-            {"name": "LOCATE", "is_frequent": False, "is_default": True},
-            {"name": "MD UPDATE", "is_frequent": False, "is_default": True},
-            {"name": "MISSING RNA", "is_frequent": False, "is_default": True},
-            {"name": "NOT READY", "is_frequent": False, "is_default": True},
-            {
-                "name": "POCT INCOMPLETE",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "REFUSED BW", "is_frequent": False, "is_default": True},
-            {"name": "REFUSED TX", "is_frequent": False, "is_default": True},
-            {
-                "name": "REIMBURSEMENT",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "REIMBURSEMENT (SAV)",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "RX", "is_frequent": False, "is_default": True},
-            {"name": "SOT-2 WEEKS", "is_frequent": False, "is_default": True},
-            {"name": "SOT-ALL", "is_frequent": False, "is_default": True},
-            {"name": "SOT-BRIDGED", "is_frequent": False, "is_default": True},
-            {"name": "SOT-CONSULT", "is_frequent": False, "is_default": True},
-            {"name": "SOT-HOLD", "is_frequent": False, "is_default": True},
-            {"name": "SOT-LOCATE", "is_frequent": False, "is_default": True},
-            {"name": "SOT-LOCATED", "is_frequent": False, "is_default": True},
-            {"name": "SOT-OW", "is_frequent": False, "is_default": True},
-            {
-                "name": "SOT-SCHEDULED",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {"name": "TRILLIUM", "is_frequent": False, "is_default": True},
-            {"name": "TX PENDING", "is_frequent": False, "is_default": True},
-            {"name": "UNABLE TO TX", "is_frequent": False, "is_default": True},
-            {"name": "WAIT", "is_frequent": False, "is_default": True},
-        ]
-
-        # Create disposition objects and insert them
-        disposition_objects = []
-        for disp_data in default_dispositions:
-            disposition_obj = Disposition(**disp_data)
-            disposition_dict = disposition_obj.dict()
-            disposition_dict["created_at"] = (
-                disposition_obj.created_at.isoformat()
+        pending = [
+            (
+                registration["id"],
+                health_card_key(
+                    registration.get("healthCard"),
+                    registration.get("healthCardVersion"),
+                ),
             )
-            disposition_dict["updated_at"] = (
-                disposition_obj.updated_at.isoformat()
+            async for registration in db.admin_registrations.find(
+                {"healthCardKey": {"$exists": False}},
+                {"_id": 0, "id": 1, "healthCard": 1, "healthCardVersion": 1},
             )
-            disposition_objects.append(disposition_dict)
+        ]
+        flagged = 0
+        for start in range(0, len(pending), 500):
+            flagged += await _store_health_card_keys(pending[start : start + 500])
 
-        # Insert all dispositions
-        if disposition_objects:
-            await db.dispositions.insert_many(disposition_objects)
+        if pending:
             logging.info(
-                f"✅ Seeded {len(disposition_objects)} default dispositions"
+                f"✅ Health card keys stored on {len(pending) - flagged} "
+                f"registrations, {flagged} flagged as sharing a card"
             )
-
     except Exception as e:
-        logging.error(f"❌ Error seeding dispositions: {str(e)}")
+        logging.error(f"❌ Health card key backfill failed: {str(e)}")
 
 
-async def seed_referral_sites():
-    """Ensure default referral sites exist in database"""
+async def backfill_activity_client_names():
+    """Copy client names and search tokens onto activities created before
+    they were stored there. Activities whose registration is gone get
+    blank names, so they are not picked up again on the next start."""
+    from app.search import tokenize
+    from app.utils import activity_client_fields
+
     try:
-        # Check if referral sites already exist
-        existing_count = await db.referral_sites.count_documents({})
-        if existing_count > 0:
-            logging.info("✅ Referral sites already exist in database")
+        pending = await db.activities.find(
+            {"client_name_tokens": {"$exists": False}},
+            {"_id": 1, "registration_id": 1, "description": 1},
+        ).to_list(None)
+        if not pending:
             return
 
-        # Default referral sites with frequency flags
-        default_referral_sites = [
-            # Most frequently used referral sites (you can adjust these)
-            {
-                "name": "Toronto - Outreach",
-                "is_frequent": True,
-                "is_default": True,
-            },
-            {
-                "name": "Hamilton - Wellington",
-                "is_frequent": True,
-                "is_default": True,
-            },
-            {"name": "London - LMP", "is_frequent": True, "is_default": True},
-            {
-                "name": "Ottawa - Outreach",
-                "is_frequent": True,
-                "is_default": True,
-            },
-            {
-                "name": "Windsor - Outreach",
-                "is_frequent": True,
-                "is_default": True,
-            },
-            # All other referral sites in alphabetical order
-            {
-                "name": "Barrie - City Centre Pharmacy",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Barrie - John Howard Society of Sir",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Brantford - Outreach",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Hamilton - Homewood Suit",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Kingston - Outreach",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "London - LMP (Night)",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Niagara - Community Health",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Niagara - Crysler House",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Niagara - Summer",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Orillia - Downtown Dispensary",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Orillia - John Howard Society",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Orillia - The Light House",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Toronto - Dixon Hall (Lakeshore)",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Toronto - Margaret's Drop-In",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Toronto - Renascent (Dundas)",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Toronto - Renascent (Whitby)",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Toronto - St. Felix Centre",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Windsor - Downtown Mission",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Windsor - Night",
-                "is_frequent": False,
-                "is_default": True,
-            },
-            {
-                "name": "Windsor - Salvation Army",
-                "is_frequent": False,
-                "is_default": True,
-            },
-        ]
+        for start in range(0, len(pending), 500):
+            batch = pending[start : start + 500]
+            names = {
+                registration["id"]: registration
+                async for registration in db.admin_registrations.find(
+                    {
+                        "id": {
+                            "$in": list(
+                                {
+                                    activity.get("registration_id")
+                                    for activity in batch
+                                }
+                            )
+                        }
+                    },
+                    {"_id": 0, "id": 1, "firstName": 1, "lastName": 1},
+                )
+            }
+            operations = []
+            for activity in batch:
+                registration = names.get(activity.get("registration_id"), {})
+                fields = activity_client_fields(
+                    registration.get("firstName"), registration.get("lastName")
+                )
+                fields["description_tokens"] = tokenize(
+                    activity.get("description")
+                )
+                operations.append(
+                    UpdateOne({"_id": activity["_id"]}, {"$set": fields})
+                )
+            await db.activities.bulk_write(operations, ordered=False)
 
-        # Create referral site objects and insert them
-        referral_site_objects = []
-        for site_data in default_referral_sites:
-            referral_site_obj = ReferralSite(**site_data)
-            referral_site_dict = referral_site_obj.dict()
-            referral_site_dict["created_at"] = (
-                referral_site_obj.created_at.isoformat()
-            )
-            referral_site_dict["updated_at"] = (
-                referral_site_obj.updated_at.isoformat()
-            )
-            referral_site_objects.append(referral_site_dict)
+        logging.info(
+            f"✅ Backfilled client names on {len(pending)} activities"
+        )
+    except Exception as e:
+        logging.error(f"Activity client name backfill failed: {str(e)}")
+
+
+# Default reference data - bump any of these and the next startup reseeds
+DEFAULT_CLINICAL_TEMPLATES = [
+    {
+        "id": "positive-default",
+        "name": "Positive",
+        "content": "Dx 10+ years ago and treated. RNA - no labs available. However, has had ongoing risk factors with sharing pipes and straws. Counselled regarding risk factors. Point of care test was completed for HCV and tested positive at approximately two minutes with a dark line. HIV testing came back negative. Collected a DBS specimen and advised that it will take approximately 7 to 10 days for results. Referral: none. Client does have a valid address and has also provided a phone number for results.",
+        "is_default": True,
+    },
+    {
+        "id": "negative-pipes-default",
+        "name": "Negative - Pipes",
+        "content": "",
+        "is_default": True,
+    },
+    {
+        "id": "negative-pipes-straws-default",
+        "name": "Negative - Pipes/Straws",
+        "content": "",
+        "is_default": True,
+    },
+    {
+        "id": "negative-pipes-straws-needles-default",
+        "name": "Negative - Pipes/Straws/Needles",
+        "content": "",
+        "is_default": True,
+    },
+]
+
+DEFAULT_NOTES_TEMPLATES = [
+    {
+        "id": "consultation-default",
+        "name": "Consultation",
+        "content": "",
+        "is_default": True,
+    },
+    {"id": "lab-default", "name": "Lab", "content": "", "is_default": True},
+    {
+        "id": "prescription-default",
+        "name": "Prescription",
+        "content": "",
+        "is_default": True,
+    },
+]
+
+DEFAULT_DISPOSITIONS = [
+    # Most frequently used dispositions
+    {"name": "ACTIVE", "is_frequent": True, "is_default": True},
+    {"name": "BW RLTS", "is_frequent": True, "is_default": True},
+    {"name": "CONSULT REQ", "is_frequent": True, "is_default": True},
+    {"name": "DELIVERY", "is_frequent": True, "is_default": True},
+    {"name": "DISPENSING", "is_frequent": True, "is_default": True},
+    {"name": "PENDING", "is_frequent": True, "is_default": True},
+    {"name": "POCT NEG", "is_frequent": True, "is_default": True},
+    {"name": "PREVIOUSLY TX", "is_frequent": True, "is_default": True},
+    {"name": "SELF CURED", "is_frequent": True, "is_default": True},
+    {"name": "SOT", "is_frequent": True, "is_default": True},
+    # All other dispositions in alphabetical order
+    {"name": "ACTIVE-ALL", "is_frequent": False, "is_default": True},
+    {
+        "name": "ACTIVE-ALL-NC",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "ACTIVE-ALL-OK",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "ACTIVE-BRIDGE",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "ACTIVE-JAIL", "is_frequent": False, "is_default": True},
+    {"name": "ACTIVE-NC", "is_frequent": False, "is_default": True},
+    {"name": "ACTIVE-OK", "is_frequent": False, "is_default": True},
+    {"name": "BW ERROR", "is_frequent": False, "is_default": True},
+    {"name": "BW REQ", "is_frequent": False, "is_default": True},
+    {"name": "BW RLTS-P", "is_frequent": False, "is_default": True},
+    {"name": "COMPLETED", "is_frequent": False, "is_default": True},
+    {
+        "name": "CONSULT-LOCATE",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "CURED", "is_frequent": False, "is_default": True},
+    {"name": "DBS", "is_frequent": False, "is_default": True},
+    {"name": "DECEASED", "is_frequent": False, "is_default": True},
+    {"name": "DELETED", "is_frequent": False, "is_default": True},
+    {"name": "DISCONTINUED", "is_frequent": False, "is_default": True},
+    {"name": "DUPLICATE", "is_frequent": False, "is_default": True},
+    {"name": "EXTERNAL TX", "is_frequent": False, "is_default": True},
+    {"name": "HEALTH CARD", "is_frequent": False, "is_default": True},
+    {"name": "HIV (ACTIVE)", "is_frequent": False, "is_default": True},
+    {
+        "name": "HIV - DISCHARGED",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "HIV PATIENT", "is_frequent": False, "is_default": True},
+    {"name": "HOME VISIT", "is_frequent": False, "is_default": True},
+    {"name": "HOUSING", "is_frequent": False, "is_default": True},
+    {"name": "INACTIVE", "is_frequent": False, "is_default": True},
+    {"name": "JAIL", "is_frequent": False, "is_default": True},
+    {
+        "name": "LAB APPOINTMENT",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "LAB REQ", "is_frequent": False, "is_default": True},
+    {"name": "LOCATE", "is_frequent": False, "is_default": True},
+    {"name": "MD UPDATE", "is_frequent": False, "is_default": True},
+    {"name": "MISSING RNA", "is_frequent": False, "is_default": True},
+    {"name": "NOT READY", "is_frequent": False, "is_default": True},
+    {
+        "name": "POCT INCOMPLETE",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "REFUSED BW", "is_frequent": False, "is_default": True},
+    {"name": "REFUSED TX", "is_frequent": False, "is_default": True},
+    {
+        "name": "REIMBURSEMENT",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "REIMBURSEMENT (SAV)",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "RX", "is_frequent": False, "is_default": True},
+    {"name": "SOT-2 WEEKS", "is_frequent": False, "is_default": True},
+    {"name": "SOT-ALL", "is_frequent": False, "is_default": True},
+    {"name": "SOT-BRIDGED", "is_frequent": False, "is_default": True},
+    {"name": "SOT-CONSULT", "is_frequent": False, "is_default": True},
+    {"name": "SOT-HOLD", "is_frequent": False, "is_default": True},
+    {"name": "SOT-LOCATE", "is_frequent": False, "is_default": True},
+    {"name": "SOT-LOCATED", "is_frequent": False, "is_default": True},
+    {"name": "SOT-OW", "is_frequent": False, "is_default": True},
+    {
+        "name": "SOT-SCHEDULED",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {"name": "TRILLIUM", "is_frequent": False, "is_default": True},
+    {"name": "TX PENDING", "is_frequent": False, "is_default": True},
+    {"name": "UNABLE TO TX", "is_frequent": False, "is_default": True},
+    {"name": "WAIT", "is_frequent": False, "is_default": True},
+]
+
+DEFAULT_REFERRAL_SITES = [
+    # Most frequently used referral sites (you can adjust these)
+    {
+        "name": "Toronto - Outreach",
+        "is_frequent": True,
+        "is_default": True,
+    },
+    {
+        "name": "Hamilton - Wellington",
+        "is_frequent": True,
+        "is_default": True,
+    },
+    {"name": "London - LMP", "is_frequent": True, "is_default": True},
+    {
+        "name": "Ottawa - Outreach",
+        "is_frequent": True,
+        "is_default": True,
+    },
+    {
+        "name": "Windsor - Outreach",
+        "is_frequent": True,
+        "is_default": True,
+    },
+    # All other referral sites in alphabetical order
+    {
+        "name": "Barrie - City Centre Pharmacy",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Barrie - John Howard Society of Sir",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Brantford - Outreach",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Hamilton - Homewood Suit",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Kingston - Outreach",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "London - LMP (Night)",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Niagara - Community Health",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Niagara - Crysler House",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Niagara - Summer",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Orillia - Downtown Dispensary",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Orillia - John Howard Society",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Orillia - The Light House",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Toronto - Dixon Hall (Lakeshore)",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Toronto - Margaret's Drop-In",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Toronto - Renascent (Dundas)",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Toronto - Renascent (Whitby)",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Toronto - St. Felix Centre",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Windsor - Downtown Mission",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Windsor - Night",
+        "is_frequent": False,
+        "is_default": True,
+    },
+    {
+        "name": "Windsor - Salvation Army",
+        "is_frequent": False,
+        "is_default": True,
+    },
+]
+
+
+def seed_version() -> str:
+    """Hash of all default reference data, stored once seeding succeeds"""
+    defaults = [
+        DEFAULT_CLINICAL_TEMPLATES,
+        DEFAULT_NOTES_TEMPLATES,
+        DEFAULT_DISPOSITIONS,
+        DEFAULT_REFERRAL_SITES,
+    ]
+    return hashlib.sha256(
+        json.dumps(defaults, sort_keys=True).encode()
+    ).hexdigest()
+
+
+async def insert_missing_by_name(collection, documents: list) -> int:
+    """Insert each document whose name is not in the collection yet,
+    leaving existing documents untouched. Returns the inserted count."""
+    if not documents:
+        return 0
+    operations = [
+        UpdateOne(
+            {"name": document["name"]},
+            {"$setOnInsert": document},
+            upsert=True,
+        )
+        for document in documents
+    ]
+    result = await collection.bulk_write(operations, ordered=False)
+    return result.upserted_count
 
-        # Insert all referral sites
-        if referral_site_objects:
-            await db.referral_sites.insert_many(referral_site_objects)
-            logging.info(
-                f"✅ Seeded {len(referral_site_objects)} default referral sites"
-            )
 
-    except Exception as e:
-        logging.error(f"❌ Error seeding referral sites: {str(e)}")
+def build_seed_documents(model, defaults: list) -> list:
+    """Run defaults through their model to fill ids and timestamps"""
+    documents = []
+    for default in defaults:
+        document = model(**default).dict()
+        document["created_at"] = document["created_at"].isoformat()
+        document["updated_at"] = document["updated_at"].isoformat()
+        documents.append(document)
+    return documents
+
+
+async def seed_clinical_templates():
+    """Ensure default clinical templates exist in database"""
+    inserted = await insert_missing_by_name(
+        db.clinical_templates,
+        build_seed_documents(ClinicalTemplate, DEFAULT_CLINICAL_TEMPLATES),
+    )
+    logging.info(f"✅ Clinical templates seeded ({inserted} added)")
+
+
+async def seed_notes_templates():
+    """Ensure default Notes templates exist in database"""
+    inserted = await insert_missing_by_name(
+        db.notes_templates,
+        build_seed_documents(NotesTemplate, DEFAULT_NOTES_TEMPLATES),
+    )
+    logging.info(f"✅ Notes templates seeded ({inserted} added)")
+
+
+async def seed_dispositions():
+    """Ensure default dispositions exist in database"""
+    # Only seed an empty collection so deleted defaults stay deleted
+    if await db.dispositions.count_documents({}, limit=1):
+        logging.info("✅ Dispositions already exist in database")
+        return
+    inserted = await insert_missing_by_name(
+        db.dispositions,
+        build_seed_documents(Disposition, DEFAULT_DISPOSITIONS),
+    )
+    logging.info(f"✅ Seeded {inserted} default dispositions")
+
+
+async def seed_referral_sites():
+    """Ensure default referral sites exist in database"""
+    # Only seed an empty collection so deleted defaults stay deleted
+    if await db.referral_sites.count_documents({}, limit=1):
+        logging.info("✅ Referral sites already exist in database")
+        return
+    inserted = await insert_missing_by_name(
+        db.referral_sites,
+        build_seed_documents(ReferralSite, DEFAULT_REFERRAL_SITES),
+    )
+    logging.info(f"✅ Seeded {inserted} default referral sites")
+
+
+async def seed_reference_data():
+    """Seed all default reference data concurrently, skipped entirely
+    when the defaults have not changed since the last successful run"""
+    version = seed_version()
+    meta = await db.app_meta.find_one({"_id": "seed_version"})
+    if meta and meta.get("hash") == version:
+        logging.info("✅ Reference data seed is up to date")
+        return
+
+    results = await asyncio.gather(
+        seed_clinical_templates(),
+        seed_notes_templates(),
+        seed_dispositions(),
+        seed_referral_sites(),
+        return_exceptions=True,
+    )
+    failures = [result for result in results if isinstance(result, Exception)]
+    for failure in failures:
+        logging.error(f"❌ Error seeding reference data: {str(failure)}")
+    if failures:
+        # Leave the stored version alone so the next startup retries
+        return
+
+    await db.app_meta.update_one(
+        {"_id": "seed_version"},
+        {"$set": {"hash": version, "updated_at": datetime.utcnow()}},
+        upsert=True,
+    )
+    logging.info("✅ Reference data seeded")
 
 
 async def backup_templates():
@@ -593,22 +874,42 @@ def validate_production_environment():
 
 
 # Initialize database on startup
-async def initialize_database():
-    """Initialize database with indexes and default data"""
+async def initialize_database(is_leader: bool = True):
+    """Critical startup path - only what must finish before serving"""
+    await client.admin.command("ping")
     await create_unique_indexes()
     await create_performance_indexes()  # Add performance indexes for dashboard optimization
-    await seed_clinical_templates()
-    await seed_notes_templates()
-    await seed_dispositions()
-    await seed_referral_sites()
-    await backup_templates()  # Backup after seeding
+
+    if not is_leader:
+        return
 
     # Restore client data if exists but database is empty
-    admin_count = await db.admin_registrations.count_documents({})
+    admin_count = await db.admin_registrations.count_documents({}, limit=1)
     if admin_count == 0:
         await restore_client_data_if_exists()
 
 
+async def run_background_startup():
+    """Startup work that can finish after the app is accepting traffic"""
+    try:
+        from app.cache import invalidate_reference_cache
+        from app.duplicates import ensure_duplicate_candidates
+        from app.rollups import ensure_rollups
+        from app.search import ensure_search_index
+
+        await seed_reference_data()
+        await invalidate_reference_cache()
+        await backfill_activity_client_names()
+        await backfill_health_card_keys()
+        await ensure_duplicate_candidates()
+        await ensure_search_index()
+        await ensure_rollups()
+        await backup_templates()  # Backup after seeding
+        logging.info("✅ Background startup tasks completed")
+    except Exception as e:
+        logging.error(f"❌ Background startup failed: {str(e)}")
+
+
 async def restore_client_data_if_exists():
     """Restore client data from backup if it exists"""
     try:
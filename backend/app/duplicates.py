@@ -0,0 +1,372 @@
+import asyncio
+import logging
+import re
+import unicodedata
+from datetime import datetime
+from itertools import combinations
+from pymongo import DeleteMany, UpdateOne
+
+from app.database import db
+from app.hooks import CLIENT_COLLECTION, register_write_hook
+
+
+CANDIDATE_COLLECTION = "duplicate_candidates"
+
+# Pairs scoring at least this are kept for review
+SCORE_THRESHOLD = 0.75
+
+# Blocks bigger than this are common keys (a shared clinic phone, a very
+# common surname and year) - they are skipped rather than compared n²
+MAX_BLOCK_SIZE = 200
+
+# Registration fields that make up the keys and the score
+MATCH_FIELDS = (
+    "firstName",
+    "lastName",
+    "aka",
+    "dob",
+    "phone1",
+    "phone2",
+    "healthCardKey",
+)
+MATCH_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    **{field: 1 for field in MATCH_FIELDS},
+}
+
+# The running full rebuild, if any
+_rebuild_task = None
+
+
+def _letters(value) -> str:
+    text = unicodedata.normalize("NFKD", str(value or ""))
+    return re.sub(r"[^a-z]", "", text.encode("ascii", "ignore").decode().lower())
+
+
+def _phone_suffixes(registration: dict) -> set:
+    """Last seven digits of each phone - area codes are often left off"""
+    suffixes = set()
+    for field in ("phone1", "phone2"):
+        digits = re.sub(r"\D", "", str(registration.get(field) or ""))
+        if len(digits) >= 7:
+            suffixes.add(digits[-7:])
+    return suffixes
+
+
+def _card_number(card_key: str) -> str:
+    """The card number without its version code, which changes on renewal"""
+    return re.sub(r"[A-Z]+$", "", card_key)
+
+
+def blocking_keys(registration: dict) -> list:
+    """Keys that a registration and its likely duplicates share. Only
+    registrations with a key in common are ever compared."""
+    from jellyfish import metaphone
+
+    first = _letters(registration.get("firstName"))
+    last = _letters(registration.get("lastName"))
+    dob = str(registration.get("dob") or "")[:10]
+
+    keys = set()
+    if last:
+        last_sound = metaphone(last)
+        if first:
+            keys.add(f"ln:{last_sound}|fi:{first[0]}")
+        if dob[:4].isdigit():
+            keys.add(f"ln:{last_sound}|y:{dob[:4]}")
+    if first and len(dob) == 10:
+        # Catches a changed or misspelled last name
+        keys.add(f"fn:{metaphone(first)}|dob:{dob}")
+    for suffix in _phone_suffixes(registration):
+        keys.add(f"ph:{suffix}")
+    return sorted(keys)
+
+
+def _dob_score(a: str, b: str) -> float:
+    a, b = str(a or "")[:10], str(b or "")[:10]
+    if not a or not b:
+        return 0.5
+    if a == b:
+        return 1.0
+    # Same year with day and month swapped, or same year and month
+    if a[:4] == b[:4] and (
+        (a[5:7], a[8:10]) == (b[8:10], b[5:7]) or a[5:7] == b[5:7]
+    ):
+        return 0.5
+    return 0.0
+
+
+def score_pair(a: dict, b: dict) -> tuple:
+    """Likelihood (0-1) that two registrations are the same person, and
+    the reasons behind it"""
+    from jellyfish import jaro_winkler_similarity
+
+    if a.get("healthCardKey") and a.get("healthCardKey") == b.get(
+        "healthCardKey"
+    ):
+        return 1.0, ["same health card"]
+
+    def names(registration, field):
+        values = [_letters(registration.get(field))]
+        if field == "firstName" and registration.get("aka"):
+            values.append(_letters(registration.get("aka")))
+        return [value for value in values if value]
+
+    def similarity(field):
+        pairs = [(x, y) for x in names(a, field) for y in names(b, field)]
+        if not pairs:
+            return 0.5
+        return max(jaro_winkler_similarity(x, y) for x, y in pairs)
+
+    first_score = similarity("firstName")
+    last_score = similarity("lastName")
+    dob_score = _dob_score(a.get("dob"), b.get("dob"))
+    phones_a, phones_b = _phone_suffixes(a), _phone_suffixes(b)
+    if phones_a and phones_b:
+        phone_score = 1.0 if phones_a & phones_b else 0.0
+    else:
+        phone_score = 0.5
+
+    score = (
+        0.35 * last_score
+        + 0.25 * first_score
+        + 0.25 * dob_score
+        + 0.15 * phone_score
+    )
+    # Two different health cards are almost always two different people
+    card_a, card_b = a.get("healthCardKey"), b.get("healthCardKey")
+    if card_a and card_b and _card_number(card_a) != _card_number(card_b):
+        score *= 0.5
+
+    reasons = []
+    if last_score >= 0.85:
+        reasons.append("similar last name")
+    if first_score >= 0.85:
+        reasons.append("similar first name")
+    if dob_score == 1.0:
+        reasons.append("same date of birth")
+    elif dob_score == 0.5 and a.get("dob") and b.get("dob"):
+        reasons.append("close date of birth")
+    if phone_score == 1.0:
+        reasons.append("same phone")
+    return round(score, 3), reasons
+
+
+def _candidate_update(a: dict, b: dict, score: float, reasons: list):
+    first, second = sorted((a["id"], b["id"]))
+    now = datetime.utcnow()
+    return UpdateOne(
+        {"_id": f"{first}|{second}"},
+        {
+            "$set": {"score": score, "reasons": reasons, "updated_at": now},
+            # A dismissed pair stays dismissed when it is scored again
+            "$setOnInsert": {
+                "ids": [first, second],
+                "status": "open",
+                "created_at": now,
+            },
+        },
+        upsert=True,
+    )
+
+
+async def create_duplicate_indexes():
+    await db.admin_registrations.create_index("dedupeKeys", background=True)
+    await db[CANDIDATE_COLLECTION].create_index("ids")
+    await db[CANDIDATE_COLLECTION].create_index([("status", 1), ("score", -1)])
+
+
+async def check_registration(registration_id: str) -> int:
+    """Refresh one registration's keys and its candidate pairs. Returns
+    the number of likely duplicates found."""
+    registration = await db.admin_registrations.find_one(
+        {"id": registration_id}, MATCH_PROJECTION
+    )
+    if registration is None:
+        return 0
+
+    keys = blocking_keys(registration)
+    await db.admin_registrations.update_one(
+        {"id": registration_id}, {"$set": {"dedupeKeys": keys}}
+    )
+
+    # Each block on its own, so one common key cannot crowd out the rest.
+    # Blocks over MAX_BLOCK_SIZE are skipped, as the full rebuild does.
+    operations = []
+    scored = set()
+    matched = set()
+    for key in keys:
+        block = await db.admin_registrations.find(
+            {"dedupeKeys": key, "id": {"$ne": registration_id}},
+            MATCH_PROJECTION,
+        ).to_list(MAX_BLOCK_SIZE)
+        if len(block) >= MAX_BLOCK_SIZE:
+            continue
+        for other in block:
+            if other["id"] in scored:
+                continue
+            scored.add(other["id"])
+            score, reasons = score_pair(registration, other)
+            if score >= SCORE_THRESHOLD:
+                operations.append(
+                    _candidate_update(registration, other, score, reasons)
+                )
+                matched.add(other["id"])
+
+    # Open pairs that no longer score high enough after an edit, and pairs
+    # with registrations that no longer share a key at all. Partners only
+    # met in a skipped block were not scored, so their pairs are kept.
+    partners = {
+        other_id
+        async for pair in db[CANDIDATE_COLLECTION].find(
+            {"ids": registration_id, "status": "open"}, {"ids": 1}
+        )
+        for other_id in pair["ids"]
+        if other_id != registration_id
+    }
+    unscored = partners - scored
+    if unscored:
+        still_blocked = {
+            other["id"]
+            async for other in db.admin_registrations.find(
+                {"id": {"$in": list(unscored)}, "dedupeKeys": {"$in": keys}},
+                {"_id": 0, "id": 1},
+            )
+        }
+        unscored -= still_blocked
+    stale = (scored - matched) | unscored
+    if stale:
+        operations.append(
+            DeleteMany(
+                {
+                    "status": "open",
+                    "_id": {
+                        "$in": [
+                            "|".join(sorted((registration_id, other_id)))
+                            for other_id in stale
+                        ]
+                    },
+                }
+            )
+        )
+    if operations:
+        await db[CANDIDATE_COLLECTION].bulk_write(operations, ordered=False)
+    return len(matched)
+
+
+async def check_write(event: dict):
+    """Write hook scoring new and edited registrations as they are saved"""
+    if event["collection"] != CLIENT_COLLECTION:
+        return
+    operation = event["operation"]
+    if operation == "drop":
+        await db[CANDIDATE_COLLECTION].delete_many({})
+    elif operation == "delete":
+        await db[CANDIDATE_COLLECTION].delete_many(
+            {"ids": {"$in": event["ids"]}}
+        )
+    elif operation in ("insert", "update"):
+        fields = event.get("fields")
+        if fields is not None and not set(fields) & set(MATCH_FIELDS):
+            return
+        for registration_id in event["ids"]:
+            await check_registration(registration_id)
+
+
+register_write_hook(check_write)
+
+
+async def rebuild_duplicate_candidates() -> dict:
+    """Key every registration, then score the pairs inside each block"""
+    started_at = datetime.utcnow()
+    await create_duplicate_indexes()
+
+    operations = []
+    keyed = 0
+    async for registration in db.admin_registrations.find(
+        {}, MATCH_PROJECTION
+    ).batch_size(500):
+        operations.append(
+            UpdateOne(
+                {"id": registration["id"]},
+                {"$set": {"dedupeKeys": blocking_keys(registration)}},
+            )
+        )
+        if len(operations) == 500:
+            await db.admin_registrations.bulk_write(operations, ordered=False)
+            keyed += len(operations)
+            operations = []
+    if operations:
+        await db.admin_registrations.bulk_write(operations, ordered=False)
+        keyed += len(operations)
+
+    # One group per key shared by more than one registration
+    pipeline = [
+        {"$match": {"dedupeKeys.0": {"$exists": True}}},
+        {"$project": MATCH_PROJECTION | {"dedupeKeys": 1}},
+        {"$unwind": "$dedupeKeys"},
+        {
+            "$group": {
+                "_id": "$dedupeKeys",
+                "registrations": {"$push": "$$ROOT"},
+                "size": {"$sum": 1},
+            }
+        },
+        {"$match": {"size": {"$gt": 1, "$lte": MAX_BLOCK_SIZE}}},
+    ]
+
+    scored = set()
+    operations = []
+    candidates = 0
+    async for block in db.admin_registrations.aggregate(
+        pipeline, allowDiskUse=True
+    ):
+        for a, b in combinations(block["registrations"], 2):
+            pair = tuple(sorted((a["id"], b["id"])))
+            if pair in scored:
+                continue
+            scored.add(pair)
+            score, reasons = score_pair(a, b)
+            if score >= SCORE_THRESHOLD:
+                operations.append(_candidate_update(a, b, score, reasons))
+                candidates += 1
+            if len(operations) == 500:
+                await db[CANDIDATE_COLLECTION].bulk_write(
+                    operations, ordered=False
+                )
+                operations = []
+    if operations:
+        await db[CANDIDATE_COLLECTION].bulk_write(operations, ordered=False)
+
+    # Open pairs this run did not score highly any more
+    stale = await db[CANDIDATE_COLLECTION].delete_many(
+        {"status": "open", "updated_at": {"$lt": started_at}}
+    )
+    counts = {
+        "registrations": keyed,
+        "pairs_scored": len(scored),
+        "candidates": candidates,
+        "removed": stale.deleted_count,
+    }
+    logging.info(f"👥 Duplicate candidates rebuilt: {counts}")
+    return counts
+
+
+def start_rebuild() -> bool:
+    """Run a full rebuild in the background unless one is running"""
+    global _rebuild_task
+    if _rebuild_task is not None and not _rebuild_task.done():
+        return False
+    _rebuild_task = asyncio.create_task(rebuild_duplicate_candidates())
+    return True
+
+
+async def ensure_duplicate_candidates():
+    """Run the full pass at startup while registrations are missing keys"""
+    await create_duplicate_indexes()
+    unkeyed = await db.admin_registrations.count_documents(
+        {"dedupeKeys": {"$exists": False}}, limit=1
+    )
+    if unkeyed:
+        await rebuild_duplicate_candidates()
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from datetime import datetime
+
+from app.bus import publish, register_handler
+from app.database import db
+from app.hooks import CLIENT_COLLECTION, register_write_hook
+
+
+# Event type for each announced write
+EVENT_TYPES = {
+    (CLIENT_COLLECTION, "insert"): "registration.created",
+    (CLIENT_COLLECTION, "update"): "registration.updated",
+    (CLIENT_COLLECTION, "finalize"): "registration.finalized",
+    (CLIENT_COLLECTION, "revert"): "registration.reverted",
+    (CLIENT_COLLECTION, "delete"): "registration.deleted",
+    (CLIENT_COLLECTION, "drop"): "resync",
+    ("activities", "insert"): "activity.added",
+    ("activities", "update"): "activity.updated",
+    ("activities", "delete"): "activity.deleted",
+}
+
+# The same fields the dashboard lists show, so a client can patch its
+# rows without refetching
+REGISTRATION_SUMMARY = {
+    "_id": 0,
+    "id": 1,
+    "firstName": 1,
+    "lastName": 1,
+    "regDate": 1,
+    "timestamp": 1,
+    "disposition": 1,
+    "referralSite": 1,
+    "status": 1,
+}
+ACTIVITY_SUMMARY = {
+    "_id": 0,
+    "id": 1,
+    "registration_id": 1,
+    "date": 1,
+    "time": 1,
+    "description": 1,
+    "client_name": 1,
+    "created_at": 1,
+}
+
+# Events waiting per connection before it is told to resync instead
+SUBSCRIBER_QUEUE_SIZE = 100
+
+# Keeps proxies from closing an idle stream
+HEARTBEAT_SECONDS = 15
+
+
+class EventBroker:
+    """Fans events out to every open stream in this worker"""
+
+    def __init__(self):
+        self.subscribers = set()
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self.subscribers.discard(queue)
+
+    def broadcast(self, event: dict):
+        for queue in self.subscribers:
+            try:
+                queue.put_nowait(event)
+            except asyncio.QueueFull:
+                # A slow client never holds events for everyone else - it
+                # drops its backlog and reloads instead
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait({"type": "resync"})
+
+
+broker = EventBroker()
+
+
+def _receive(*payloads: str):
+    for payload in payloads:
+        broker.broadcast(json.loads(payload))
+
+
+# Events travel between workers on the invalidation bus
+register_handler("live_events", _receive)
+
+
+async def publish_write(event: dict):
+    """Write hook turning client data writes into dashboard events"""
+    event_type = EVENT_TYPES.get((event["collection"], event["operation"]))
+    if event_type is None:
+        return
+
+    live_event = {
+        "type": event_type,
+        "ids": event["ids"],
+        "at": datetime.utcnow().isoformat() + "Z",
+    }
+    if event_type.startswith("registration.") and event_type != (
+        "registration.deleted"
+    ):
+        live_event["registrations"] = await db[CLIENT_COLLECTION].find(
+            {"id": {"$in": event["ids"]}}, REGISTRATION_SUMMARY
+        ).to_list(None)
+    elif event_type in ("activity.added", "activity.updated"):
+        live_event["activities"] = await db.activities.find(
+            {"id": {"$in": event["ids"]}}, ACTIVITY_SUMMARY
+        ).to_list(None)
+    elif event_type == "activity.deleted":
+        live_event["registration_id"] = event.get("registration_id")
+
+    await publish("live_events", json.dumps(live_event, default=str))
+
+
+register_write_hook(publish_write)
+
+
+def format_event(event: dict) -> str:
+    """One server-sent event frame"""
+    return f"event: {event['type']}\ndata: {json.dumps(event, default=str)}\n\n"
+
+
+async def stream_events(queue: asyncio.Queue):
+    """Server-sent event frames for one connection, with heartbeats"""
+    try:
+        # Clients wait this long before reconnecting
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = await asyncio.wait_for(
+                    queue.get(), timeout=HEARTBEAT_SECONDS
+                )
+            except asyncio.TimeoutError:
+                yield ": heartbeat\n\n"
+                continue
+            yield format_event(event)
+    finally:
+        broker.unsubscribe(queue)
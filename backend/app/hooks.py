@@ -0,0 +1,44 @@
+import logging
+
+
+# Registrations are announced under this collection; per-client records
+# under their own collection with a registration_id
+CLIENT_COLLECTION = "admin_registrations"
+
+# Async handlers called with every write event, in registration order
+_write_hooks = []
+
+
+def register_write_hook(handler):
+    """Register an async handler(event) run after each client data write
+
+    event is a dict with collection, operation (insert, update, delete,
+    finalize, revert or drop), ids of the written documents and, for
+    per-client records, registration_id."""
+    _write_hooks.append(handler)
+
+
+async def record_write(
+    collection: str,
+    operation: str,
+    ids: list,
+    registration_id: str = None,
+    **details,
+):
+    """Announce a committed write to every hook. Hook failures are logged
+    and never fail the request that made the write."""
+    event = {
+        "collection": collection,
+        "operation": operation,
+        "ids": list(ids),
+        "registration_id": registration_id,
+        **details,
+    }
+    for handler in _write_hooks:
+        try:
+            await handler(event)
+        except Exception as e:
+            logging.error(
+                f"❌ Write hook {handler.__name__} failed for "
+                f"{collection} {operation}: {e}"
+            )
@@ -0,0 +1,652 @@
+import asyncio
+import logging
+import math
+import os
+import tempfile
+import uuid
+from datetime import date, datetime
+
+import pytz
+from cachetools import LRUCache
+from pymongo.errors import DuplicateKeyError
+
+from app.database import db
+
+
+RECORD_COLLECTION = "legacy_records"
+JOB_COLLECTION = "legacy_upload_jobs"
+
+# app_meta entry naming the upload analytics read from. Only ever moved by
+# compare-and-set, so concurrent uploads cannot both replace the same one.
+CURRENT_UPLOAD_ID = "legacy_upload"
+
+# Rows parsed, normalized and written at a time
+CHUNK_ROWS = 5000
+
+# Bytes copied from the upload to disk at a time
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+
+PREVIEW_ROWS = 5
+
+# Running ingestion tasks, kept referenced until they finish
+_jobs = set()
+
+# Query frames of the most recently used uploads. Upload ids never get new
+# records, so entries only ever leave by eviction.
+FRAME_CACHE_SIZE = 3
+_frames = LRUCache(maxsize=FRAME_CACHE_SIZE)
+_frame_lock = asyncio.Lock()
+
+# Share of non-blank values that must parse for a column to be typed
+TYPED_COLUMN_SHARE = 0.95
+
+# Text columns with fewer distinct values than this share of rows are
+# stored as categories
+CATEGORY_SHARE = 0.5
+
+# Date bucket unit -> pandas period
+DATE_PERIODS = {
+    "day": "D",
+    "week": "W",
+    "month": "M",
+    "quarter": "Q",
+    "year": "Y",
+}
+
+
+async def save_upload(file) -> tuple:
+    """Copy an upload to a temporary file without holding it in memory.
+    Returns the path and its size in bytes."""
+    suffix = os.path.splitext(file.filename)[1].lower()
+    handle, path = tempfile.mkstemp(prefix="legacy-", suffix=suffix)
+    size = 0
+    try:
+        with os.fdopen(handle, "wb") as out:
+            while chunk := await file.read(UPLOAD_CHUNK_BYTES):
+                out.write(chunk)
+                size += len(chunk)
+    except Exception:
+        os.remove(path)
+        raise
+    return path, size
+
+
+def _column_names(header) -> list:
+    """Stripped, unique column names - blanks become "Unnamed: n" and
+    repeats get a ".n" suffix, as pandas names them"""
+    names = []
+    seen = {}
+    for position, value in enumerate(header):
+        name = str(value).strip() if value is not None else ""
+        if not name or name.lower() == "nan":
+            name = f"Unnamed: {position}"
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        else:
+            seen[name] = 0
+        names.append(name)
+    return names
+
+
+def _normalize_value(value):
+    """One cell as a plain JSON-friendly value. Blanks become "", whole
+    floats become ints (a column is float in one chunk and int in the next
+    depending on blanks) and dates become ISO strings."""
+    if value is None:
+        return ""
+    if hasattr(value, "item") and not isinstance(value, (str, bytes)):
+        value = value.item()  # numpy scalars
+    if isinstance(value, float):
+        if math.isnan(value):
+            return ""
+        if value.is_integer():
+            return int(value)
+        return value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    return value
+
+
+def _normalize_rows(columns: list, rows) -> list:
+    return [
+        {
+            column: _normalize_value(value)
+            for column, value in zip(columns, row)
+        }
+        for row in rows
+    ]
+
+
+def _read_csv(path: str, progress: dict):
+    import pandas as pd
+
+    with open(path, "rb") as handle:
+        reader = pd.read_csv(
+            handle, chunksize=CHUNK_ROWS, encoding="utf-8-sig"
+        )
+        for frame in reader:
+            columns = _column_names(frame.columns)
+            progress["bytes_read"] = handle.tell()
+            yield columns, _normalize_rows(
+                columns, frame.itertuples(index=False, name=None)
+            )
+
+
+def _read_xlsx(path: str, progress: dict):
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        rows = sheet.iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = _column_names(header)
+        if sheet.max_row:
+            progress["rows_total"] = sheet.max_row - 1
+
+        batch = []
+        for row in rows:
+            # Trailing formatted-but-empty rows are common in exports
+            if all(value is None or value == "" for value in row):
+                continue
+            batch.append(row)
+            if len(batch) == CHUNK_ROWS:
+                yield columns, _normalize_rows(columns, batch)
+                batch = []
+        if batch:
+            yield columns, _normalize_rows(columns, batch)
+    finally:
+        workbook.close()
+
+
+def _read_xls(path: str, progress: dict):
+    import pandas as pd
+
+    # The old binary format has no streaming reader, but it is capped at
+    # 65,536 rows
+    frame = pd.read_excel(path)
+    columns = _column_names(frame.columns)
+    progress["rows_total"] = len(frame)
+    for start in range(0, len(frame), CHUNK_ROWS):
+        chunk = frame.iloc[start : start + CHUNK_ROWS]
+        yield columns, _normalize_rows(
+            columns, chunk.itertuples(index=False, name=None)
+        )
+
+
+def read_chunks(path: str, filename: str, progress: dict):
+    """Normalized (columns, records) chunks of a spreadsheet. progress is
+    updated with bytes_read or rows_total when the reader knows them."""
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return _read_csv(path, progress)
+    if name.endswith(".xlsx"):
+        return _read_xlsx(path, progress)
+    return _read_xls(path, progress)
+
+
+async def create_job(filename: str, size: int) -> dict:
+    job = {
+        "_id": str(uuid.uuid4()),
+        "upload_id": str(uuid.uuid4()),
+        "filename": filename,
+        "status": "queued",
+        "bytes_total": size,
+        "rows_written": 0,
+        "percent": 0,
+        "preview": [],
+        "created_at": datetime.utcnow(),
+    }
+    await db[JOB_COLLECTION].insert_one(job)
+    return job
+
+
+async def ingest(job: dict, path: str):
+    """Parse the saved upload chunk by chunk into legacy_records, then make
+    it the current legacy upload"""
+    job_id, upload_id = job["_id"], job["upload_id"]
+    jobs = db[JOB_COLLECTION]
+    progress = {}
+    rows_written = 0
+    columns = []
+    try:
+        await jobs.update_one(
+            {"_id": job_id},
+            {"$set": {"status": "running", "started_at": datetime.utcnow()}},
+        )
+        chunks = read_chunks(path, job["filename"], progress)
+        while True:
+            # Parsing is CPU work - keep it off the event loop
+            chunk = await asyncio.to_thread(next, chunks, None)
+            if chunk is None:
+                break
+            columns, records = chunk
+            if not records:
+                continue
+
+            await db[RECORD_COLLECTION].insert_many(
+                [
+                    {
+                        "upload_id": upload_id,
+                        "row": rows_written + offset,
+                        "record": record,
+                    }
+                    for offset, record in enumerate(records)
+                ],
+                ordered=False,
+            )
+            update = {"rows_written": rows_written + len(records)}
+            if rows_written == 0:
+                update["preview"] = records[:PREVIEW_ROWS]
+                update["columns"] = columns
+            rows_written += len(records)
+
+            if progress.get("rows_total"):
+                done = rows_written / progress["rows_total"]
+            elif job["bytes_total"]:
+                done = progress.get("bytes_read", 0) / job["bytes_total"]
+            else:
+                done = 0
+            update["percent"] = min(99, int(done * 100))
+            await jobs.update_one({"_id": job_id}, {"$set": update})
+
+        # Only keep one upload at a time - swap in the new one
+        await db.legacy_data.insert_one(
+            {
+                "upload_id": upload_id,
+                "filename": job["filename"],
+                "upload_date": datetime.now(
+                    pytz.timezone("America/Toronto")
+                ).isoformat(),
+                "records_count": rows_written,
+                "columns": columns,
+            }
+        )
+        await _make_current(upload_id)
+        await _delete_orphans(job_id, upload_id)
+
+        await jobs.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": "completed",
+                    "percent": 100,
+                    "records_count": rows_written,
+                    "finished_at": datetime.utcnow(),
+                }
+            },
+        )
+        logging.info(
+            f"📥 Legacy upload {job['filename']} ingested: {rows_written} records"
+        )
+
+    except Exception as e:
+        logging.error(f"❌ Legacy upload {job['filename']} failed: {e}")
+        await db[RECORD_COLLECTION].delete_many({"upload_id": upload_id})
+        await jobs.update_one(
+            {"_id": job_id},
+            {
+                "$set": {
+                    "status": "failed",
+                    "error": str(e),
+                    "finished_at": datetime.utcnow(),
+                }
+            },
+        )
+    finally:
+        os.remove(path)
+
+
+async def _make_current(upload_id: str):
+    """Point the current upload at upload_id"""
+    meta = db.app_meta
+    while True:
+        pointer = await meta.find_one({"_id": CURRENT_UPLOAD_ID})
+        if pointer is None:
+            try:
+                await meta.insert_one(
+                    {"_id": CURRENT_UPLOAD_ID, "upload_id": upload_id}
+                )
+                return
+            except DuplicateKeyError:
+                continue  # Another upload got there first - re-read
+        result = await meta.update_one(
+            {"_id": CURRENT_UPLOAD_ID, "upload_id": pointer["upload_id"]},
+            {"$set": {"upload_id": upload_id}},
+        )
+        if result.matched_count:
+            return
+
+
+async def _delete_orphans(job_id: str, upload_id: str):
+    """Drop uploads and records that are neither current nor still being
+    ingested - replaced uploads and leftovers of interrupted ones"""
+    pointer = await db.app_meta.find_one({"_id": CURRENT_UPLOAD_ID})
+    active = await db[JOB_COLLECTION].distinct(
+        "upload_id",
+        {"status": {"$in": ["queued", "running"]}, "_id": {"$ne": job_id}},
+    )
+    keep = [pointer["upload_id"], *active]
+    await db.legacy_data.delete_many({"upload_id": {"$nin": keep}})
+    await db[RECORD_COLLECTION].delete_many({"upload_id": {"$nin": keep}})
+
+
+def start_ingest(job: dict, path: str):
+    task = asyncio.create_task(ingest(job, path))
+    _jobs.add(task)
+    task.add_done_callback(_jobs.discard)
+
+
+async def current_upload(projection: dict = None):
+    """The legacy upload analytics read from, or None. Before the first
+    pointer is stored that is the latest upload."""
+    pointer = await db.app_meta.find_one({"_id": CURRENT_UPLOAD_ID})
+    if pointer is not None:
+        return await db.legacy_data.find_one(
+            {"upload_id": pointer["upload_id"]}, projection
+        )
+    return await db.legacy_data.find_one(
+        {}, projection, sort=[("upload_date", -1)]
+    )
+
+
+async def load_legacy_records(upload: dict) -> list:
+    """All records of a legacy upload in file order. Uploads made before
+    records were stored separately still carry them inline."""
+    if "data" in upload:
+        return upload["data"]
+    return [
+        doc["record"]
+        async for doc in db[RECORD_COLLECTION]
+        .find({"upload_id": upload["upload_id"]}, {"_id": 0, "record": 1})
+        .sort("row", 1)
+        .batch_size(CHUNK_ROWS)
+    ]
+
+
+def legacy_job_response(job: dict) -> dict:
+    status = job["status"]
+    if status == "completed":
+        message = (
+            f"Successfully uploaded {job['records_count']} records from "
+            f"{job['filename']}"
+        )
+    elif status == "failed":
+        message = f"Failed to process file: {job.get('error')}"
+    else:
+        message = f"Processing {job['filename']}"
+    return {
+        "job_id": job["_id"],
+        "upload_id": job["upload_id"],
+        "filename": job["filename"],
+        "status": status,
+        "percent": job.get("percent", 0),
+        "rows_written": job.get("rows_written", 0),
+        "records_count": job.get("records_count"),
+        "preview": job.get("preview", []),
+        "message": message,
+        "error": job.get("error"),
+    }
+
+
+def build_frame(records: list):
+    """A typed, columnar frame of legacy records. Mostly-numeric columns
+    become numbers, mostly-date columns datetimes and repetitive text
+    columns categories; blanks become missing values."""
+    import pandas as pd
+
+    frame = pd.DataFrame.from_records(records)
+    for column in frame.columns:
+        series = frame[column]
+        if not (
+            pd.api.types.is_object_dtype(series)
+            or pd.api.types.is_string_dtype(series)
+        ):
+            continue
+        blank = series.isna() | (series.astype(str).str.strip() == "")
+        values = series[~blank]
+        if values.empty:
+            continue
+
+        numbers = pd.to_numeric(values, errors="coerce")
+        if numbers.notna().mean() >= TYPED_COLUMN_SHARE:
+            frame[column] = pd.to_numeric(series.where(~blank), errors="coerce")
+            continue
+
+        try:
+            sample = pd.to_datetime(
+                values.head(200).astype(str), errors="coerce", format="mixed"
+            )
+            if sample.notna().mean() >= TYPED_COLUMN_SHARE:
+                frame[column] = pd.to_datetime(
+                    series.where(~blank), errors="coerce", format="mixed"
+                )
+                continue
+        except (ValueError, TypeError):
+            pass  # Mixed time zones and the like stay text
+
+        text = series.astype(str)
+        if text.nunique() <= len(text) * CATEGORY_SHARE:
+            frame[column] = text.astype("category")
+        else:
+            frame[column] = text
+    return frame
+
+
+async def get_frame(upload_id: str):
+    """The cached query frame of a legacy upload, built on first use"""
+    frame = _frames.get(upload_id)
+    if frame is None:
+        async with _frame_lock:
+            frame = _frames.get(upload_id)
+            if frame is None:
+                upload = await db.legacy_data.find_one(
+                    {"upload_id": upload_id}
+                )
+                if upload is None:
+                    raise LookupError(f"Legacy upload {upload_id} not found")
+                records = await load_legacy_records(upload)
+                frame = await asyncio.to_thread(build_frame, records)
+                _frames[upload_id] = frame
+                logging.info(
+                    f"📊 Legacy frame built for {upload_id}: {len(frame)} rows"
+                )
+    return frame
+
+
+def _column_type(series) -> str:
+    import pandas as pd
+
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return "date"
+    if pd.api.types.is_numeric_dtype(series):
+        return "number"
+    return "text"
+
+
+def describe_frame(frame) -> list:
+    return [
+        {"name": column, "type": _column_type(frame[column])}
+        for column in frame.columns
+    ]
+
+
+def _coerce(series, value):
+    """A filter value in the column's type"""
+    import pandas as pd
+
+    column_type = _column_type(series)
+    try:
+        if column_type == "date":
+            return pd.Timestamp(value)
+        if column_type == "number":
+            return float(value)
+    except (ValueError, TypeError):
+        raise ValueError(
+            f"{value!r} is not a valid {column_type} for {series.name}"
+        )
+    return str(value)
+
+
+def _filter_mask(frame, query_filter: dict):
+    column, op = query_filter["column"], query_filter["op"]
+    value = query_filter.get("value")
+    series = frame[column]
+
+    if op in ("blank", "not_blank"):
+        blank = series.isna() | (series.astype(str) == "")
+        return blank if op == "blank" else ~blank
+    if value is None:
+        raise ValueError(f"Filter {op} on {column} needs a value")
+    if _column_type(series) == "text":
+        # Categories have no order - compare text columns as strings
+        series = series.astype(str)
+    if op == "contains":
+        return series.astype(str).str.contains(
+            str(value), case=False, regex=False, na=False
+        )
+    if op in ("in", "not_in", "between"):
+        if not isinstance(value, list):
+            raise ValueError(f"Filter {op} on {column} needs a list")
+        values = [_coerce(series, item) for item in value]
+        if op == "between":
+            if len(values) != 2:
+                raise ValueError(
+                    f"Filter between on {column} needs two values"
+                )
+            return series.between(values[0], values[1])
+        matched = series.isin(values)
+        return matched if op == "in" else ~matched
+
+    value = _coerce(series, value)
+    return {
+        "eq": lambda: series == value,
+        "ne": lambda: series != value,
+        "gt": lambda: series > value,
+        "gte": lambda: series >= value,
+        "lt": lambda: series < value,
+        "lte": lambda: series <= value,
+    }[op]()
+
+
+def run_query(frame, query: dict) -> dict:
+    """Filter, group, bucket, aggregate and rank the frame. Raises
+    ValueError for queries that do not fit its columns."""
+    import pandas as pd
+
+    def check(column):
+        if column not in frame.columns:
+            raise ValueError(f"Unknown column: {column}")
+        return column
+
+    mask = pd.Series(True, index=frame.index)
+    for query_filter in query["filters"]:
+        check(query_filter["column"])
+        mask &= _filter_mask(frame, query_filter)
+    data = frame[mask]
+
+    keys = [data[check(column)] for column in query["group_by"]]
+    bucket = query.get("date_bucket")
+    if bucket:
+        dates = data[check(bucket["column"])]
+        if _column_type(dates) != "date":
+            raise ValueError(f"{bucket['column']} is not a date column")
+        # Rows without a date have no bucket to go in
+        data = data[dates.notna()]
+        keys = [key[dates.notna()] for key in keys]
+        periods = dates[dates.notna()].dt.to_period(
+            DATE_PERIODS[bucket["unit"]]
+        )
+        keys.append(
+            periods.astype(str).rename(
+                f"{bucket['column']}_{bucket['unit']}"
+            )
+        )
+
+    aggregates = query["aggregates"]
+    if keys and not aggregates:
+        aggregates = [{"op": "count", "column": None, "name": None}]
+
+    if not aggregates:
+        # Plain rows
+        columns = [check(column) for column in query["columns"]] or list(
+            frame.columns
+        )
+        result = data[columns]
+    else:
+        values = {}
+        for aggregate in aggregates:
+            op, column = aggregate["op"], aggregate.get("column")
+            name = aggregate.get("name") or (
+                op if op == "count" else f"{op}_{column}"
+            )
+            if op != "count":
+                if column is None:
+                    raise ValueError(f"Aggregate {op} needs a column")
+                if op in ("sum", "mean") and _column_type(
+                    frame[check(column)]
+                ) != "number":
+                    raise ValueError(f"{column} is not a number column")
+            values[name] = (op, check(column) if column else None)
+            if op in ("min", "max") and _column_type(data[column]) == "text":
+                # Alphabetical, over non-blank values - categories have no
+                # order of their own
+                text = data[column].astype(str)
+                data = data.assign(**{column: text.where(text != "")})
+
+        if keys:
+            grouped = data.groupby(keys, observed=True, sort=False)
+            result = pd.DataFrame(
+                {
+                    name: grouped.size()
+                    if op == "count"
+                    else grouped[column].agg(op)
+                    for name, (op, column) in values.items()
+                }
+            ).reset_index()
+        else:
+            result = pd.DataFrame(
+                [
+                    {
+                        name: (
+                            len(data) if op == "count" else data[column].agg(op)
+                        )
+                        for name, (op, column) in values.items()
+                    }
+                ]
+            )
+
+    total_rows = len(result)
+    order_by = query.get("order_by")
+    if order_by is None and aggregates:
+        # Time series read in time order, everything else biggest first
+        order_by = keys[-1].name if bucket else next(iter(values))
+        descending = query["descending"] if not bucket else False
+    else:
+        descending = query["descending"]
+    if order_by is not None:
+        if order_by not in result.columns:
+            raise ValueError(f"Unknown order_by: {order_by}")
+        if descending and pd.api.types.is_numeric_dtype(result[order_by]):
+            # Top-k without sorting everything
+            result = result.nlargest(query["top"], order_by)
+        else:
+            result = result.sort_values(order_by, ascending=not descending)
+    result = result.head(query["top"])
+
+    return {
+        "total_records": len(frame),
+        "matched_records": int(mask.sum()),
+        "total_rows": total_rows,
+        "columns": list(result.columns),
+        "rows": [
+            {
+                column: _normalize_value(None if pd.isna(value) else value)
+                for column, value in row.items()
+            }
+            for row in result.to_dict("records")
+        ],
+    }
@@ -1,10 +1,28 @@
-from fastapi import FastAPI
-from app.database import initialize_database
+import asyncio
+import logging
+from fastapi import FastAPI, Response
+from app.database import initialize_database, run_background_startup
 from fastapi.middleware.cors import CORSMiddleware
 from app.router import api_router
 from contextlib import asynccontextmanager
-from app.database import client
+from app.config import settings
+from app.database import client, db
+from app.bus import (
+    WORKER_ID,
+    acquire_leadership,
+    run_invalidation_listener,
+    run_leader_election,
+)
+from app.monitoring import command_monitor, pool_monitor
+from app.notifications import run_digest_sender
 from app.utils import verify_production_protection
+from app.metrics import (
+    METRICS_CONTENT_TYPE,
+    MULTIPROC_DIR,
+    MetricsMiddleware,
+    render_metrics,
+    run_snapshot_writer,
+)
 
 
 @asynccontextmanager
@@ -14,8 +32,33 @@ async def lifespan(app: FastAPI):
         raise RuntimeError(
             "Production protection required - server startup aborted"
         )
-    await initialize_database()
+    command_monitor.attach(asyncio.get_running_loop(), db)
+
+    # With several workers only one runs restores, seeding and backups
+    is_leader = await acquire_leadership()
+    logging.info(
+        f"👷 Worker {WORKER_ID} started"
+        + (" as startup leader" if is_leader else "")
+    )
+    await initialize_database(is_leader)
+
+    # Seeding and backups run once the app is already serving requests, in
+    # whichever worker holds the lease - a new leader takes them over
+    leader_work = [run_background_startup]
+    if settings.notification_mode == "digest":
+        leader_work.append(run_digest_sender)
+
+    tasks = [
+        asyncio.create_task(run_invalidation_listener()),
+        asyncio.create_task(run_leader_election(leader_work)),
+    ]
+    if MULTIPROC_DIR:
+        tasks.append(asyncio.create_task(run_snapshot_writer()))
     yield
+    for task in tasks:
+        task.cancel()
+    # Lets the election give the lease up before the client closes
+    await asyncio.gather(*tasks, return_exceptions=True)
     client.close()
 
 
@@ -33,6 +76,9 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Outermost so the recorded latency covers CORS handling too
+app.add_middleware(MetricsMiddleware)
+
 
 # Include routers
 app.include_router(api_router)
@@ -41,3 +87,11 @@ app.include_router(api_router)
 @app.get("/health")
 def health_check():
     return {"status": "ok"}
+
+
+@app.get("/metrics", include_in_schema=False)
+def metrics():
+    return Response(
+        content=render_metrics() + pool_monitor.render(),
+        media_type=METRICS_CONTENT_TYPE,
+    )
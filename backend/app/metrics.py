@@ -0,0 +1,311 @@
+import asyncio
+import json
+import os
+import time
+import uuid
+from bisect import bisect_left
+from collections import defaultdict
+
+
+# Latency buckets in seconds and response size buckets in bytes
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
+
+# Prometheus text exposition format
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Requests that matched no route share one label to keep cardinality bounded
+UNMATCHED_ROUTE = "<unmatched>"
+
+# With several workers (uvicorn --workers) each one writes its metrics to a
+# file here and a scrape of any worker sums them all, as prometheus_client's
+# multiprocess mode does. Clear the directory before the server starts.
+# Unset, a scrape only sees the worker that answered it.
+MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+SNAPSHOT_INTERVAL_SECONDS = 5
+
+# Unique even when a restarted worker reuses a pid, so a dead worker's
+# counts are never overwritten
+SNAPSHOT_NAME = f"worker-{os.getpid()}-{uuid.uuid4().hex[:8]}.json"
+
+
+class Histogram:
+    """Fixed-bucket histogram. Only ever touched from the event loop
+    thread, so plain integer increments need no lock."""
+
+    __slots__ = ("buckets", "counts", "total", "count")
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.total = 0.0
+        self.count = 0
+
+    def merge(self, counts, total, count):
+        for index, bucket_count in enumerate(counts):
+            self.counts[index] += bucket_count
+        self.total += total
+        self.count += count
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.total += value
+        self.count += 1
+
+    def render(self, name, labels):
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets, self.counts):
+            cumulative += bucket_count
+            lines.append(
+                f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}'
+            )
+        lines.append(f'{name}_bucket{{{labels},le="+Inf"}} {self.count}')
+        lines.append(f"{name}_sum{{{labels}}} {self.total}")
+        lines.append(f"{name}_count{{{labels}}} {self.count}")
+        return lines
+
+
+# (method, route) -> histogram or gauge, (method, route, status) -> count
+request_latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+response_size = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+request_count = defaultdict(int)
+in_flight = defaultdict(int)
+
+
+# (routes, route count) the tables were built from, exact paths -> their
+# routes, and the routes with path parameters. Entries keep the route's
+# position so matches resolve in router order, as the router does.
+_route_tables = (None, 0, {}, [])
+
+
+def _tables(app) -> tuple:
+    global _route_tables
+    routes = app.router.routes
+    if _route_tables[0] is not routes or _route_tables[1] != len(routes):
+        exact, parameterized = {}, []
+        for position, route in enumerate(routes):
+            if not hasattr(route, "path_regex"):
+                continue
+            if "{" in route.path:
+                parameterized.append(
+                    (
+                        position,
+                        route.path.split("{", 1)[0],
+                        route.path_regex,
+                        route.methods,
+                        route.path,
+                    )
+                )
+            else:
+                exact.setdefault(route.path, []).append(
+                    (position, route.methods)
+                )
+        _route_tables = (routes, len(routes), exact, parameterized)
+    return _route_tables[2], _route_tables[3]
+
+
+def match_route(scope) -> str:
+    """The path template of the route a request will be routed to, matched
+    the way the router does. The router only stores the route on the scope
+    once the request reaches it, too late to count it as in flight."""
+    method, path = scope["method"], scope["path"]
+    exact, parameterized = _tables(scope["app"])
+
+    # Positions of the first full and partial (wrong method) matches
+    unmatched = len(scope["app"].router.routes)
+    full_at = partial_at = unmatched
+    partial = None
+    for position, methods in exact.get(path, ()):
+        if methods is None or method in methods:
+            full_at = position
+            break
+        if partial is None:
+            partial_at, partial = position, path
+
+    for position, prefix, path_regex, methods, route_path in parameterized:
+        if position > full_at:
+            break
+        if not path.startswith(prefix) or not path_regex.match(path):
+            continue
+        if methods is None or method in methods:
+            return route_path
+        if position < partial_at:
+            partial_at, partial = position, route_path
+
+    if full_at < unmatched:
+        return path
+    return partial or UNMATCHED_ROUTE
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording per-route-template request metrics"""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status_code = 500
+        body_size = 0
+
+        async def send_wrapper(message):
+            nonlocal status_code, body_size
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            elif message["type"] == "http.response.body":
+                body_size += len(message.get("body", b""))
+            await send(message)
+
+        flight_key = (method, match_route(scope))
+        in_flight[flight_key] += 1
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            duration = time.perf_counter() - start
+            in_flight[flight_key] -= 1
+
+            # The router stores the matched route on the scope, giving the
+            # path template (/api/admin-registration/{registration_id})
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or UNMATCHED_ROUTE
+
+            request_latency[(method, route_path)].observe(duration)
+            response_size[(method, route_path)].observe(body_size)
+            request_count[(method, route_path, status_code)] += 1
+
+
+def _histograms(histograms) -> list:
+    return [
+        [list(key), list(histogram.counts), histogram.total, histogram.count]
+        for key, histogram in list(histograms.items())
+    ]
+
+
+def snapshot() -> dict:
+    """This worker's metrics as JSON-ready lists"""
+    return {
+        "pid": os.getpid(),
+        "request_latency": _histograms(request_latency),
+        "response_size": _histograms(response_size),
+        "request_count": [
+            [list(key), count] for key, count in list(request_count.items())
+        ],
+        "in_flight": [
+            [list(key), count] for key, count in list(in_flight.items())
+        ],
+    }
+
+
+def write_snapshot(data: dict):
+    """Replace this worker's file in the shared directory"""
+    path = os.path.join(MULTIPROC_DIR, SNAPSHOT_NAME)
+    with open(path + ".tmp", "w") as out:
+        json.dump(data, out)
+    os.replace(path + ".tmp", path)
+
+
+async def run_snapshot_writer():
+    """Keep this worker's file current until cancelled"""
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+    try:
+        while True:
+            await asyncio.to_thread(write_snapshot, snapshot())
+            await asyncio.sleep(SNAPSHOT_INTERVAL_SECONDS)
+    finally:
+        write_snapshot(snapshot())  # Counts up to shutdown still add up
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _worker_snapshots() -> list:
+    """This worker's live metrics plus every other worker's last file"""
+    snapshots = [snapshot()]
+    if not MULTIPROC_DIR or not os.path.isdir(MULTIPROC_DIR):
+        return snapshots
+    for name in os.listdir(MULTIPROC_DIR):
+        if name == SNAPSHOT_NAME or not name.endswith(".json"):
+            continue
+        try:
+            with open(os.path.join(MULTIPROC_DIR, name)) as source:
+                snapshots.append(json.load(source))
+        except (OSError, ValueError):
+            continue  # Removed or half-written - the next scrape has it
+    return snapshots
+
+
+def _merged() -> tuple:
+    """Metrics summed over every worker. Counts of workers that have
+    exited are kept so counters never go backwards; their in-flight
+    requests are not."""
+    latency = defaultdict(lambda: Histogram(LATENCY_BUCKETS))
+    sizes = defaultdict(lambda: Histogram(SIZE_BUCKETS))
+    counts = defaultdict(int)
+    flights = defaultdict(int)
+    for index, data in enumerate(_worker_snapshots()):
+        for key, bucket_counts, total, count in data["request_latency"]:
+            latency[tuple(key)].merge(bucket_counts, total, count)
+        for key, bucket_counts, total, count in data["response_size"]:
+            sizes[tuple(key)].merge(bucket_counts, total, count)
+        for key, count in data["request_count"]:
+            counts[tuple(key)] += count
+        if index == 0 or _is_running(data["pid"]):
+            for key, count in data["in_flight"]:
+                flights[tuple(key)] += count
+    return latency, sizes, counts, flights
+
+
+def render_metrics() -> str:
+    """Render every metric in the Prometheus text exposition format"""
+    request_latency, response_size, request_count, in_flight = _merged()
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route_path), histogram in list(request_latency.items()):
+        labels = f'method="{method}",route="{route_path}"'
+        lines.extend(histogram.render("http_request_duration_seconds", labels))
+
+    lines += [
+        "# HELP http_response_size_bytes Response body size by route",
+        "# TYPE http_response_size_bytes histogram",
+    ]
+    for (method, route_path), histogram in list(response_size.items()):
+        labels = f'method="{method}",route="{route_path}"'
+        lines.extend(histogram.render("http_response_size_bytes", labels))
+
+    lines += [
+        "# HELP http_requests_total Requests by route and status code",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route_path, status_code), count in list(
+        request_count.items()
+    ):
+        lines.append(
+            f'http_requests_total{{method="{method}",route="{route_path}",'
+            f'status="{status_code}"}} {count}'
+        )
+
+    lines += [
+        "# HELP http_requests_in_flight Requests currently being served",
+        "# TYPE http_requests_in_flight gauge",
+    ]
+    for (method, route_path), count in list(in_flight.items()):
+        labels = f'method="{method}",route="{route_path}"'
+        lines.append(f"http_requests_in_flight{{{labels}}} {count}")
+
+    return "\n".join(lines) + "\n"
+
@@ -0,0 +1,102 @@
+import importlib.util
+import logging
+import os
+
+
+# Wire compressors in order of preference and the module each one needs
+COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+class MongoSettings:
+    """Connection profile shared by the API and the maintenance scripts
+
+    Kept free of other app imports so scripts can build a client without
+    the API's own configuration (Anthropic key, SMTP, ...)."""
+
+    def __init__(self):
+        self.url = os.getenv("MONGO_URL", "mongodb://localhost:27017")
+        self.db_name = os.getenv("DB_NAME", "my420_ca_db")
+        self.app_name = os.getenv("MONGO_APP_NAME", "my420-api")
+
+        # pool
+        self.max_pool_size = int(os.getenv("MONGO_MAX_POOL_SIZE", "50"))
+        self.min_pool_size = int(os.getenv("MONGO_MIN_POOL_SIZE", "5"))
+        self.wait_queue_timeout_ms = int(
+            os.getenv("MONGO_WAIT_QUEUE_TIMEOUT_MS", "5000")
+        )
+        self.max_idle_time_ms = int(
+            os.getenv("MONGO_MAX_IDLE_TIME_MS", "300000")
+        )
+
+        # timeouts
+        self.connect_timeout_ms = int(
+            os.getenv("MONGO_CONNECT_TIMEOUT_MS", "10000")
+        )
+        # No socket timeout unless a deployment sets one - a full rollup
+        # or duplicate rebuild aggregation can outlast any fixed limit
+        socket_timeout_ms = os.getenv("MONGO_SOCKET_TIMEOUT_MS")
+        self.socket_timeout_ms = (
+            int(socket_timeout_ms) if socket_timeout_ms else None
+        )
+        self.server_selection_timeout_ms = int(
+            os.getenv("MONGO_SERVER_SELECTION_TIMEOUT_MS", "10000")
+        )
+
+        # wire compression - the server picks the first one it supports
+        self.compressors = os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib")
+
+    def available_compressors(self) -> list:
+        """Configured compressors whose Python module is installed"""
+        available = []
+        for name in self.compressors.split(","):
+            name = name.strip()
+            module = COMPRESSOR_MODULES.get(name)
+            if module and importlib.util.find_spec(module):
+                available.append(name)
+            elif name:
+                logging.info(f"MongoDB compressor {name} unavailable, skipped")
+        return available
+
+    def client_options(self, app_name: str = None) -> dict:
+        options = {
+            "appname": app_name or self.app_name,
+            "maxPoolSize": self.max_pool_size,
+            "minPoolSize": self.min_pool_size,
+            "waitQueueTimeoutMS": self.wait_queue_timeout_ms,
+            "maxIdleTimeMS": self.max_idle_time_ms,
+            "connectTimeoutMS": self.connect_timeout_ms,
+            "serverSelectionTimeoutMS": self.server_selection_timeout_ms,
+        }
+        if self.socket_timeout_ms:
+            options["socketTimeoutMS"] = self.socket_timeout_ms
+        compressors = self.available_compressors()
+        if compressors:
+            options["compressors"] = compressors
+        return options
+
+
+def create_client(
+    mongo_settings: MongoSettings,
+    url: str = None,
+    app_name: str = None,
+    event_listeners: list = None,
+):
+    """Motor client for the API"""
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    return AsyncIOMotorClient(
+        url or mongo_settings.url,
+        event_listeners=event_listeners or [],
+        **mongo_settings.client_options(app_name),
+    )
+
+
+def create_sync_client(
+    mongo_settings: MongoSettings, url: str = None, app_name: str = None
+):
+    """Blocking pymongo client for scripts and worker processes"""
+    import pymongo
+
+    return pymongo.MongoClient(
+        url or mongo_settings.url, **mongo_settings.client_options(app_name)
+    )
@@ -0,0 +1,381 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from pymongo import monitoring
+
+from app.config import settings
+from app.metrics import Histogram
+
+
+# Commands that carry a query worth recording, and where its filter lives
+FILTER_FIELDS = {
+    "find": "filter",
+    "count": "query",
+    "distinct": "query",
+    "findAndModify": "query",
+    "aggregate": "pipeline",
+}
+EXPLAINABLE_COMMANDS = ("find", "aggregate")
+
+# Driver housekeeping that would only add noise
+IGNORED_COMMANDS = {
+    "hello",
+    "isMaster",
+    "ismaster",
+    "ping",
+    "endSessions",
+    "saslStart",
+    "saslContinue",
+    "explain",
+}
+
+SLOW_OPERATION_BUFFER_SIZE = 200
+
+# Connection checkout wait in seconds
+CHECKOUT_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+
+
+def query_shape(value):
+    """Replace literal values with their type so queries that only differ
+    in parameters share one shape, e.g. {"id": "<str>"}"""
+    if isinstance(value, dict):
+        return {key: query_shape(item) for key, item in value.items()}
+    if isinstance(value, list):
+        # Keep operator lists ($and, pipelines) but collapse value lists
+        if value and all(isinstance(item, dict) for item in value):
+            return [query_shape(item) for item in value]
+        return "<list>"
+    return f"<{type(value).__name__}>"
+
+
+def summarize_plan(plan: dict) -> str:
+    """Flatten a winning plan into e.g. FETCH > IXSCAN(id_1)"""
+    stages = []
+    while plan:
+        stage = plan.get("stage", "?")
+        if plan.get("indexName"):
+            stage = f"{stage}({plan['indexName']})"
+        stages.append(stage)
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [{}])[0]
+    return " > ".join(stages)
+
+
+class CommandMonitor(monitoring.CommandListener):
+    """Records per-collection command latency and slow operations
+
+    The driver calls these hooks from its own threads, so all shared
+    state is guarded by a lock."""
+
+    def __init__(self, slow_ms: int, explain_sample_rate: float):
+        self.slow_ms = slow_ms
+        self.explain_sample_rate = explain_sample_rate
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._stats = defaultdict(
+            lambda: {
+                "count": 0,
+                "failures": 0,
+                "total_ms": 0.0,
+                "max_ms": 0.0,
+            }
+        )
+        self._slow_operations = deque(maxlen=SLOW_OPERATION_BUFFER_SIZE)
+        self._explains = {}
+        self._loop = None
+        self._db = None
+
+    def attach(self, loop, db):
+        """Enable explain capture - needs the app's event loop and database"""
+        self._loop = loop
+        self._db = db
+
+    def started(self, event):
+        if event.command_name in IGNORED_COMMANDS:
+            return
+        command = event.command
+        collection = command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+
+        filter_field = FILTER_FIELDS.get(event.command_name)
+        query = command.get(filter_field) if filter_field else None
+        if event.command_name in ("update", "delete"):
+            statements = command.get(
+                "updates" if event.command_name == "update" else "deletes"
+            )
+            if statements:
+                query = statements[0].get("q")
+
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (
+                collection,
+                query,
+            )
+
+    def succeeded(self, event):
+        self._finish(event, failed=False)
+
+    def failed(self, event):
+        self._finish(event, failed=True)
+
+    def _finish(self, event, failed):
+        with self._lock:
+            pending = self._pending.pop(
+                (event.connection_id, event.request_id), None
+            )
+        if pending is None:
+            return
+        collection, query = pending
+        duration_ms = event.duration_micros / 1000
+        shape = query_shape(query) if query is not None else None
+
+        with self._lock:
+            stats = self._stats[(collection, event.command_name)]
+            stats["count"] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+            if failed:
+                stats["failures"] += 1
+
+            if duration_ms < self.slow_ms:
+                return
+
+            self._slow_operations.append(
+                {
+                    "at": datetime.utcnow().isoformat(),
+                    "collection": collection,
+                    "command": event.command_name,
+                    "duration_ms": round(duration_ms, 2),
+                    "failed": failed,
+                    "shape": shape,
+                }
+            )
+            shape_key = f"{collection}.{event.command_name}:{shape}"
+            should_explain = (
+                event.command_name in EXPLAINABLE_COMMANDS
+                and shape_key not in self._explains
+                and self._loop is not None
+                and random.random() < self.explain_sample_rate
+            )
+            if should_explain:
+                # Reserve the slot so concurrent slow runs explain once
+                self._explains[shape_key] = None
+
+        if should_explain:
+            asyncio.run_coroutine_threadsafe(
+                self._explain(
+                    shape_key, collection, event.command_name, query
+                ),
+                self._loop,
+            )
+
+    async def _explain(self, shape_key, collection, command_name, query):
+        if command_name == "find":
+            command = {"find": collection, "filter": query or {}}
+        else:
+            command = {
+                "aggregate": collection,
+                "pipeline": query,
+                "cursor": {},
+            }
+        try:
+            result = await self._db.command(
+                {"explain": command, "verbosity": "queryPlanner"}
+            )
+            planner = result.get("queryPlanner") or (
+                result.get("stages") or [{}]
+            )[0].get("$cursor", {}).get("queryPlanner", {})
+            winning_plan = planner.get("winningPlan", {})
+            explain = {
+                "captured_at": datetime.utcnow().isoformat(),
+                "plan": summarize_plan(winning_plan),
+                "rejected_plans": len(planner.get("rejectedPlans", [])),
+            }
+        except Exception as e:
+            explain = {"error": str(e)}
+            logging.warning(f"Explain failed for {shape_key}: {e}")
+        with self._lock:
+            self._explains[shape_key] = explain
+
+    def snapshot(self) -> dict:
+        """Current statistics, slowest commands first"""
+        with self._lock:
+            commands = [
+                {
+                    "collection": collection,
+                    "command": command_name,
+                    "count": stats["count"],
+                    "failures": stats["failures"],
+                    "total_ms": round(stats["total_ms"], 2),
+                    "avg_ms": round(stats["total_ms"] / stats["count"], 2),
+                    "max_ms": round(stats["max_ms"], 2),
+                }
+                for (collection, command_name), stats in self._stats.items()
+            ]
+            slow_operations = list(reversed(self._slow_operations))
+            explains = {
+                shape_key: explain
+                for shape_key, explain in self._explains.items()
+                if explain is not None
+            }
+
+        commands.sort(key=lambda item: item["total_ms"], reverse=True)
+        return {
+            "slow_threshold_ms": self.slow_ms,
+            "explain_sample_rate": self.explain_sample_rate,
+            "commands": commands,
+            "slow_operations": slow_operations,
+            "explains": explains,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self._slow_operations.clear()
+            self._explains.clear()
+
+
+class PoolMonitor(monitoring.ConnectionPoolListener):
+    """Tracks connection pool size, checkouts and checkout wait time
+
+    pymongo does not report how long a checkout waited, so the start time
+    is kept per thread - a checkout starts and finishes on one thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._open = defaultdict(int)
+        self._checked_out = defaultdict(int)
+        self._checkouts = defaultdict(int)
+        self._checkout_failures = defaultdict(int)
+        self._pool_clears = defaultdict(int)
+        self._wait = defaultdict(lambda: Histogram(CHECKOUT_WAIT_BUCKETS))
+
+    @staticmethod
+    def _server(event):
+        host, port = event.address
+        return f"{host}:{port}"
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        with self._lock:
+            self._pool_clears[self._server(event)] += 1
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        with self._lock:
+            self._open[self._server(event)] += 1
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        with self._lock:
+            self._open[self._server(event)] -= 1
+
+    def connection_check_out_started(self, event):
+        self._local.started = time.perf_counter()
+
+    def connection_check_out_failed(self, event):
+        self._observe_wait(event)
+        with self._lock:
+            self._checkout_failures[(self._server(event), event.reason)] += 1
+
+    def connection_checked_out(self, event):
+        self._observe_wait(event)
+        with self._lock:
+            server = self._server(event)
+            self._checkouts[server] += 1
+            self._checked_out[server] += 1
+
+    def connection_checked_in(self, event):
+        with self._lock:
+            self._checked_out[self._server(event)] -= 1
+
+    def _observe_wait(self, event):
+        started = getattr(self._local, "started", None)
+        if started is None:
+            return
+        self._local.started = None
+        with self._lock:
+            self._wait[self._server(event)].observe(
+                time.perf_counter() - started
+            )
+
+    def render(self) -> str:
+        """Pool metrics in the Prometheus text exposition format"""
+        with self._lock:
+            lines = [
+                "# HELP mongodb_pool_connections Open pool connections",
+                "# TYPE mongodb_pool_connections gauge",
+            ]
+            for server, count in self._open.items():
+                lines.append(
+                    f'mongodb_pool_connections{{server="{server}"}} {count}'
+                )
+            lines += [
+                "# HELP mongodb_pool_checked_out Connections in use",
+                "# TYPE mongodb_pool_checked_out gauge",
+            ]
+            for server, count in self._checked_out.items():
+                lines.append(
+                    f'mongodb_pool_checked_out{{server="{server}"}} {count}'
+                )
+            lines += [
+                "# HELP mongodb_pool_checkouts_total Connection checkouts",
+                "# TYPE mongodb_pool_checkouts_total counter",
+            ]
+            for server, count in self._checkouts.items():
+                lines.append(
+                    f'mongodb_pool_checkouts_total{{server="{server}"}} {count}'
+                )
+            lines += [
+                "# HELP mongodb_pool_checkout_failures_total Failed checkouts "
+                "(timeout = pool exhausted)",
+                "# TYPE mongodb_pool_checkout_failures_total counter",
+            ]
+            for (server, reason), count in self._checkout_failures.items():
+                lines.append(
+                    "mongodb_pool_checkout_failures_total"
+                    f'{{server="{server}",reason="{reason}"}} {count}'
+                )
+            lines += [
+                "# HELP mongodb_pool_clears_total Pool clears after errors",
+                "# TYPE mongodb_pool_clears_total counter",
+            ]
+            for server, count in self._pool_clears.items():
+                lines.append(
+                    f'mongodb_pool_clears_total{{server="{server}"}} {count}'
+                )
+            lines += [
+                "# HELP mongodb_pool_checkout_wait_seconds Time waiting for "
+                "a pool connection",
+                "# TYPE mongodb_pool_checkout_wait_seconds histogram",
+            ]
+            for server, histogram in self._wait.items():
+                lines.extend(
+                    histogram.render(
+                        "mongodb_pool_checkout_wait_seconds",
+                        f'server="{server}"',
+                    )
+                )
+        return "\n".join(lines) + "\n"
+
+
+command_monitor = CommandMonitor(
+    slow_ms=settings.slow_query_ms,
+    explain_sample_rate=settings.explain_sample_rate,
+)
+
+pool_monitor = PoolMonitor()
@@ -0,0 +1,256 @@
+import asyncio
+import base64
+import io
+import logging
+import uuid
+from collections import defaultdict
+from datetime import datetime
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+
+from app.config import settings
+from app.database import db
+from app.utils import attach_photo, build_email_message, deliver_messages
+
+
+OUTBOX_COLLECTION = "notification_outbox"
+
+# Sent notifications are kept a week for troubleshooting
+SENT_RETENTION_SECONDS = 7 * 24 * 3600
+
+# Digest photos only need to identify the client
+DIGEST_PHOTO_MAX_PX = 480
+DIGEST_PHOTO_QUALITY = 70
+
+
+def downscale_photo(photo_base64: str) -> str:
+    """Shrink a base64 photo to a small JPEG thumbnail, returned as base64.
+    Returns None if the photo cannot be decoded."""
+    from PIL import Image
+
+    try:
+        if photo_base64.startswith("data:"):
+            photo_base64 = photo_base64.split(",", 1)[1]
+        image = Image.open(io.BytesIO(base64.b64decode(photo_base64)))
+        image.thumbnail((DIGEST_PHOTO_MAX_PX, DIGEST_PHOTO_MAX_PX))
+        output = io.BytesIO()
+        image.convert("RGB").save(
+            output, "JPEG", quality=DIGEST_PHOTO_QUALITY, optimize=True
+        )
+        return base64.b64encode(output.getvalue()).decode()
+    except Exception as e:
+        logging.warning(f"Could not downscale photo: {e}")
+        return None
+
+
+def is_immediate(kind: str) -> bool:
+    return (
+        settings.notification_mode != "digest"
+        or kind in settings.notification_immediate_types
+    )
+
+
+async def notify_batch(kind: str, notifications: list) -> bool:
+    """Send notifications of one kind now, or queue them for the next
+    digest. Each notification is a dict with recipient, subject, body and
+    optionally photo and reply_to."""
+    if not notifications:
+        return True
+
+    if is_immediate(kind):
+        messages = [
+            build_email_message(
+                notification["recipient"],
+                notification["subject"],
+                notification["body"],
+                notification.get("photo"),
+                notification.get("reply_to"),
+            )
+            for notification in notifications
+        ]
+        try:
+            failed = await asyncio.to_thread(deliver_messages, messages)
+            return not failed
+        except Exception as e:
+            logging.error(f"Failed to send {kind} email: {str(e)}")
+            return False
+
+    created_at = datetime.utcnow()
+    documents = []
+    for notification in notifications:
+        photo = notification.get("photo")
+        if photo:
+            # Decoding and resizing is CPU work - keep it off the event loop
+            photo = await asyncio.to_thread(downscale_photo, photo)
+        documents.append(
+            {
+                "id": str(uuid.uuid4()),
+                "kind": kind,
+                "recipient": notification["recipient"],
+                "subject": notification["subject"],
+                "body": notification["body"],
+                "reply_to": notification.get("reply_to"),
+                "photo": photo or None,
+                "created_at": created_at,
+                "sent_at": None,
+                "claimed_by": None,
+            }
+        )
+    try:
+        await db[OUTBOX_COLLECTION].insert_many(documents)
+        logging.info(f"📥 Queued {len(documents)} {kind} notification(s)")
+        return True
+    except Exception as e:
+        logging.error(f"Failed to queue {kind} notification: {str(e)}")
+        return False
+
+
+async def notify(
+    kind: str,
+    recipient: str,
+    subject: str,
+    body: str,
+    photo: str = None,
+    reply_to: str = None,
+) -> bool:
+    return await notify_batch(
+        kind,
+        [
+            {
+                "recipient": recipient,
+                "subject": subject,
+                "body": body,
+                "photo": photo,
+                "reply_to": reply_to,
+            }
+        ],
+    )
+
+
+def build_digest_message(recipient: str, notifications: list):
+    """One email with a section per notification and their photos"""
+    counts = defaultdict(int)
+    for notification in notifications:
+        counts[notification["kind"]] += 1
+    summary = ", ".join(f"{count} {kind}" for kind, count in counts.items())
+
+    first = notifications[0]["created_at"].strftime("%Y-%m-%d %H:%M")
+    last = notifications[-1]["created_at"].strftime("%H:%M")
+    sections = [
+        f"my420.ca notification digest - {len(notifications)} notifications "
+        f"({summary})",
+        f"Received {first} - {last} UTC",
+    ]
+
+    photos = []
+    for number, notification in enumerate(notifications, start=1):
+        heading = (
+            f"{number}. {notification['subject']} "
+            f"({notification['kind']}, "
+            f"{notification['created_at'].strftime('%H:%M')})"
+        )
+        if notification.get("reply_to"):
+            heading += f" - reply to {notification['reply_to']}"
+        if notification.get("photo"):
+            filename = f"{number:02d}_photo.jpg"
+            photos.append((notification["photo"], filename))
+            heading += f" - photo: {filename}"
+        sections.append(f"{'=' * 70}\n{heading}\n{'=' * 70}")
+        sections.append(notification["body"].strip())
+
+    msg = MIMEMultipart()
+    msg["From"] = settings.smtp_username or recipient
+    msg["To"] = recipient
+    msg["Subject"] = f"my420.ca digest - {summary}"
+    msg.attach(MIMEText("\n\n".join(sections), "plain"))
+    for photo, filename in photos:
+        attach_photo(msg, photo, filename)
+    return msg
+
+
+async def send_digests() -> int:
+    """Send every queued notification as one email per recipient"""
+    batch_id = str(uuid.uuid4())
+    outbox = db[OUTBOX_COLLECTION]
+
+    # Claim first so an overlapping run never sends the same notification
+    await outbox.update_many(
+        {"sent_at": None, "claimed_by": None}, {"$set": {"claimed_by": batch_id}}
+    )
+    by_recipient = defaultdict(list)
+    async for notification in outbox.find({"claimed_by": batch_id}).sort(
+        "created_at", 1
+    ):
+        by_recipient[notification["recipient"]].append(notification)
+    if not by_recipient:
+        return 0
+
+    digests = list(by_recipient.values())
+    try:
+        messages = [
+            build_digest_message(recipient, notifications)
+            for recipient, notifications in by_recipient.items()
+        ]
+        failed = await asyncio.to_thread(deliver_messages, messages)
+    except Exception as e:
+        # Release the claim so the next run retries
+        await outbox.update_many(
+            {"claimed_by": batch_id}, {"$set": {"claimed_by": None}}
+        )
+        logging.error(f"❌ Notification digest failed: {str(e)}")
+        return 0
+
+    # Digests that did not go out are released for the next run
+    if failed:
+        await outbox.update_many(
+            {
+                "_id": {
+                    "$in": [
+                        notification["_id"]
+                        for index in failed
+                        for notification in digests[index]
+                    ]
+                }
+            },
+            {"$set": {"claimed_by": None}},
+        )
+        logging.error(
+            f"❌ {len(failed)} of {len(digests)} notification digest(s) failed"
+        )
+
+    await outbox.update_many(
+        {"claimed_by": batch_id}, {"$set": {"sent_at": datetime.utcnow()}}
+    )
+    count = sum(
+        len(notifications)
+        for index, notifications in enumerate(digests)
+        if index not in failed
+    )
+    logging.info(
+        f"📧 Sent {len(digests) - len(failed)} digest(s) covering "
+        f"{count} notifications"
+    )
+    return count
+
+
+async def run_digest_sender():
+    """Flush the outbox every digest window until cancelled"""
+    await db[OUTBOX_COLLECTION].create_index("claimed_by")
+    await db[OUTBOX_COLLECTION].create_index(
+        "sent_at", expireAfterSeconds=SENT_RETENTION_SECONDS
+    )
+    # Claims left by a worker that died mid-send
+    await db[OUTBOX_COLLECTION].update_many(
+        {"sent_at": None, "claimed_by": {"$ne": None}},
+        {"$set": {"claimed_by": None}},
+    )
+    logging.info(
+        f"📬 Notification digests every "
+        f"{settings.notification_digest_minutes} minutes"
+    )
+    while True:
+        await asyncio.sleep(settings.notification_digest_minutes * 60)
+        try:
+            await send_digests()
+        except Exception as e:
+            logging.error(f"❌ Notification digest run failed: {str(e)}")
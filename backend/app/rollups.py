@@ -0,0 +1,338 @@
+import asyncio
+import json
+import logging
+from collections import Counter
+from datetime import datetime
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+from app.database import db
+from app.hooks import CLIENT_COLLECTION, register_write_hook
+
+
+ROLLUP_COLLECTION = "registration_rollups"
+
+# The cell each registration is currently counted in, kept apart from the
+# registration so a delete can still find what to take away
+MEMBER_COLLECTION = "registration_rollup_members"
+
+# Cube dimensions - day is the registration date, the rest are
+# registration fields of the same name
+DIMENSIONS = (
+    "day",
+    "referralSite",
+    "disposition",
+    "physician",
+    "testType",
+    "status",
+    "province",
+)
+FIELD_DIMENSIONS = DIMENSIONS[1:]
+
+# Date levels a query can roll day up to, stored on each cell as a prefix
+# of the YYYY-MM-DD day
+DATE_LEVELS = {"day": 10, "month": 7, "year": 4}
+
+SOURCE_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "regDate": 1,
+    **{field: 1 for field in FIELD_DIMENSIONS},
+}
+
+REBUILD_BATCH_SIZE = 500
+
+# The running full rebuild, if any
+_rebuild_task = None
+
+
+def rollup_cell(registration: dict) -> dict:
+    """The dimension values a registration is counted under. Blank values
+    are grouped as None."""
+    day = str(registration.get("regDate") or "")[:10]
+    cell = {"day": day or None}
+    for field in FIELD_DIMENSIONS:
+        value = str(registration.get(field) or "").strip()
+        cell[field] = value or None
+    return cell
+
+
+def cell_id(cell: dict) -> str:
+    return json.dumps([cell[dimension] for dimension in DIMENSIONS])
+
+
+def _cell_document(cell: dict) -> dict:
+    day = cell["day"]
+    return {
+        **cell,
+        **{
+            level: day[:length] if day else None
+            for level, length in DATE_LEVELS.items()
+            if level != "day"
+        },
+    }
+
+
+def _count_update(cell: dict, delta: int) -> UpdateOne:
+    return UpdateOne(
+        {"_id": cell_id(cell)},
+        {
+            "$inc": {"count": delta},
+            "$set": {"updated_at": datetime.utcnow()},
+            "$setOnInsert": _cell_document(cell),
+        },
+        upsert=True,
+    )
+
+
+async def create_rollup_indexes():
+    await db[ROLLUP_COLLECTION].create_index("day")
+    await db[ROLLUP_COLLECTION].create_index("updated_at")
+    await db[MEMBER_COLLECTION].create_index("updated_at")
+
+
+async def _move_member(registration_id: str, cell) -> tuple:
+    """Point a registration's member entry at its new cell (None when it is
+    gone). Returns the (old, new) cells that changed, or (None, None). The
+    compare-and-swap keeps two workers from counting one write twice."""
+    members = db[MEMBER_COLLECTION]
+    new_key = cell_id(cell) if cell else None
+    while True:
+        member = await members.find_one({"_id": registration_id})
+        if member is None:
+            if cell is None:
+                return None, None
+            try:
+                await members.insert_one(
+                    {
+                        "_id": registration_id,
+                        "key": new_key,
+                        "cell": cell,
+                        "updated_at": datetime.utcnow(),
+                    }
+                )
+                return None, cell
+            except DuplicateKeyError:
+                continue  # Another worker got there first - re-read
+        if member["key"] == new_key:
+            return None, None
+        if cell is None:
+            result = await members.delete_one(
+                {"_id": registration_id, "key": member["key"]}
+            )
+        else:
+            result = await members.update_one(
+                {"_id": registration_id, "key": member["key"]},
+                {
+                    "$set": {
+                        "key": new_key,
+                        "cell": cell,
+                        "updated_at": datetime.utcnow(),
+                    }
+                },
+            )
+        changed = (
+            result.deleted_count if cell is None else result.modified_count
+        )
+        if changed:
+            return member["cell"], cell
+
+
+async def apply_changes(changes: list):
+    """Move counts for (old cell, new cell) pairs and drop emptied cells"""
+    operations = []
+    emptied = []
+    for old, new in changes:
+        if old is not None:
+            operations.append(_count_update(old, -1))
+            emptied.append(cell_id(old))
+        if new is not None:
+            operations.append(_count_update(new, 1))
+    if not operations:
+        return
+    await db[ROLLUP_COLLECTION].bulk_write(operations, ordered=False)
+    if emptied:
+        await db[ROLLUP_COLLECTION].delete_many(
+            {"_id": {"$in": emptied}, "count": {"$lte": 0}}
+        )
+
+
+async def rollup_write(event: dict):
+    """Write hook moving registrations between rollup cells"""
+    if event["collection"] != CLIENT_COLLECTION:
+        return
+    operation = event["operation"]
+    if operation == "drop":
+        await db[ROLLUP_COLLECTION].delete_many({})
+        await db[MEMBER_COLLECTION].delete_many({})
+        return
+
+    fields = event.get("fields")
+    if fields is not None and not set(fields) & set(
+        ("regDate", *FIELD_DIMENSIONS)
+    ):
+        return
+
+    ids = event["ids"]
+    if operation == "delete":
+        registrations = {}
+    else:
+        registrations = {
+            registration["id"]: registration
+            async for registration in db[CLIENT_COLLECTION].find(
+                {"id": {"$in": ids}}, SOURCE_PROJECTION
+            )
+        }
+
+    changes = []
+    for registration_id in ids:
+        registration = registrations.get(registration_id)
+        cell = rollup_cell(registration) if registration else None
+        changes.append(await _move_member(registration_id, cell))
+    await apply_changes(changes)
+
+
+register_write_hook(rollup_write)
+
+
+async def rebuild_rollups() -> dict:
+    """Recount every cell and member entry from the registrations"""
+    started_at = datetime.utcnow()
+    await create_rollup_indexes()
+
+    counts = Counter()
+    cells = {}
+    members = []
+    registrations = 0
+    async for registration in db[CLIENT_COLLECTION].find(
+        {"id": {"$exists": True}}, SOURCE_PROJECTION
+    ).batch_size(REBUILD_BATCH_SIZE):
+        cell = rollup_cell(registration)
+        key = cell_id(cell)
+        counts[key] += 1
+        cells[key] = cell
+        members.append(
+            ReplaceOne(
+                {"_id": registration["id"]},
+                {
+                    "_id": registration["id"],
+                    "key": key,
+                    "cell": cell,
+                    "updated_at": datetime.utcnow(),
+                },
+                upsert=True,
+            )
+        )
+        if len(members) == REBUILD_BATCH_SIZE:
+            await db[MEMBER_COLLECTION].bulk_write(members, ordered=False)
+            registrations += len(members)
+            members = []
+    if members:
+        await db[MEMBER_COLLECTION].bulk_write(members, ordered=False)
+        registrations += len(members)
+
+    now = datetime.utcnow()
+    operations = [
+        ReplaceOne(
+            {"_id": key},
+            {
+                "_id": key,
+                **_cell_document(cells[key]),
+                "count": count,
+                "updated_at": now,
+            },
+            upsert=True,
+        )
+        for key, count in counts.items()
+    ]
+    for start in range(0, len(operations), REBUILD_BATCH_SIZE):
+        await db[ROLLUP_COLLECTION].bulk_write(
+            operations[start : start + REBUILD_BATCH_SIZE], ordered=False
+        )
+
+    # Cells and members this run did not write have no registrations left
+    await db[ROLLUP_COLLECTION].delete_many({"updated_at": {"$lt": started_at}})
+    await db[MEMBER_COLLECTION].delete_many({"updated_at": {"$lt": started_at}})
+
+    result = {"registrations": registrations, "cells": len(counts)}
+    logging.info(f"🧊 Registration rollups rebuilt: {result}")
+    return result
+
+
+def start_rebuild() -> bool:
+    """Run a full rebuild in the background unless one is running"""
+    global _rebuild_task
+    if _rebuild_task is not None and not _rebuild_task.done():
+        return False
+    _rebuild_task = asyncio.create_task(rebuild_rollups())
+    return True
+
+
+async def ensure_rollups():
+    """Rebuild at startup when the members do not match the registrations
+    (first run, or a restore that bypassed the write hooks)"""
+    await create_rollup_indexes()
+    members = await db[MEMBER_COLLECTION].count_documents({})
+    registrations = await db[CLIENT_COLLECTION].count_documents({})
+    if members != registrations:
+        await rebuild_rollups()
+
+
+async def query_rollups(
+    group_by: list,
+    date_level: str = "month",
+    slices: dict = None,
+    from_date: str = None,
+    to_date: str = None,
+    limit: int = 1000,
+) -> dict:
+    """Roll the cube up to the group_by dimensions, over the cells matching
+    every slice. slices maps a dimension to the values to keep."""
+    match = {"count": {"$gt": 0}}
+    for dimension, values in (slices or {}).items():
+        match[dimension] = {"$in": values}
+    if from_date or to_date:
+        match["day"] = {}
+        if from_date:
+            match["day"]["$gte"] = from_date
+        if to_date:
+            match["day"]["$lte"] = to_date
+
+    group_id = {}
+    for dimension in group_by:
+        if dimension == "day":
+            group_id[date_level] = f"${date_level}"
+        else:
+            group_id[dimension] = f"${dimension}"
+
+    pipeline = [
+        {"$match": match},
+        # No dimensions at all rolls everything up into one total
+        {"$group": {"_id": group_id or None, "count": {"$sum": "$count"}}},
+        {"$sort": {"count": -1, "_id": 1}},
+        {
+            "$facet": {
+                "total": [
+                    {"$group": {"_id": None, "count": {"$sum": "$count"}}}
+                ],
+                "cells_total": [{"$count": "count"}],
+                "cells": [{"$limit": limit}],
+            }
+        },
+    ]
+    facets = await db[ROLLUP_COLLECTION].aggregate(pipeline).to_list(1)
+    facet = facets[0]
+
+    cells = []
+    for row in facet["cells"]:
+        cell = {**(row["_id"] or {}), "count": row["count"]}
+        cells.append(cell)
+
+    return {
+        "group_by": list(group_id),
+        "total": facet["total"][0]["count"] if facet["total"] else 0,
+        "cells_total": (
+            facet["cells_total"][0]["count"] if facet["cells_total"] else 0
+        ),
+        "cells": cells,
+    }
@@ -5,7 +5,7 @@ from fastapi import (
     File,
     Response,
 )
-from fastapi.responses import FileResponse
+from fastapi.responses import FileResponse, StreamingResponse
 import os
 import logging
 from pydantic import ValidationError
@@ -14,11 +14,13 @@ import uuid
 from datetime import datetime, date, timedelta
 import pytz
 import base64
-import io
+import json
+import re
 import asyncio
-import pandas as pd
 import subprocess
 import bcrypt
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 from app.config import logger, settings
 from app.auth import (
     generate_email_code,
@@ -28,18 +30,64 @@ from app.auth import (
     send_2fa_email,
     verify_email_code_hash,
 )
+from app.cache import get_reference_data, invalidate_reference_cache
+from app.cascade import (
+    delete_registrations,
+    delete_registrations_matching,
+    drop_client_data,
+)
 from app.database import (
     backup_client_data,
+    bulk_upsert_by_name,
     is_test_data,
     db,
     validate_production_environment,
 )
+from app.duplicates import (
+    CANDIDATE_COLLECTION,
+    start_rebuild as start_duplicate_rebuild,
+)
+from app.events import broker, stream_events
+from app.hooks import record_write
+from app.legacy import (
+    JOB_COLLECTION as LEGACY_JOB_COLLECTION,
+    create_job,
+    current_upload,
+    describe_frame,
+    get_frame as get_legacy_frame,
+    legacy_job_response,
+    load_legacy_records,
+    run_query,
+    save_upload,
+    start_ingest,
+)
+from app.monitoring import command_monitor
+from app.notifications import is_immediate, notify, notify_batch
+from app.rollups import (
+    DATE_LEVELS as ROLLUP_DATE_LEVELS,
+    DIMENSIONS as ROLLUP_DIMENSIONS,
+    query_rollups,
+    start_rebuild as start_rollup_rebuild,
+)
+from app.search import (
+    SEARCH_TYPES,
+    search,
+    start_rebuild as start_search_rebuild,
+    tokenize,
+)
+from app.templating import (
+    CLIENT_FIELD_PROJECTION,
+    render_many,
+    validate_template,
+)
 from app.schema import (
     ActivityCreate,
     ActivityRecord,
     ActivityUpdate,
     AdminRegistration,
     AdminRegistrationCreate,
+    AdminRegistrationPatch,
+    BulkRegistrationStatusRequest,
     ChartRequest,
     ChartResponse,
     ChatQuery,
@@ -60,10 +108,11 @@ from app.schema import (
     DispositionUpdate,
     EmailTwoFactorSetupResponse,
     EmailTwoFactorVerifyRequest,
-    ExcelUploadResponse,
     InteractionCreate,
     InteractionRecord,
     InteractionUpdate,
+    LegacyQuery,
+    LegacyUploadJob,
     MedicationCreate,
     MedicationRecord,
     MedicationUpdate,
@@ -76,10 +125,12 @@ from app.schema import (
     ReferralSite,
     ReferralSiteCreate,
     ReferralSiteUpdate,
+    REQUIRED_REGISTRATION_FIELDS,
     ShareAttachmentRequest,
     ShareAttachmentResponse,
     TestRecord,
     TestRecordCreate,
+    TemplateRenderRequest,
     TestRecordUpdate,
     UserCreate,
     UserRegistration,
@@ -88,20 +139,28 @@ from app.schema import (
 )
 from app.utils import (
     analyze_query,
+    build_contact_email,
+    build_finalization_email,
+    build_registration_email,
     generate_monthly_trend_chart,
     generate_disposition_bar_chart,
     generate_yearly_comparison_chart,
     get_registration_stats,
     process_clinical_template,
-    send_contact_email,
-    send_email,
-    send_registration_email,
+    activity_client_fields,
+    build_snippet,
+    health_card_key,
+    search_terms,
+    sync_activity_client_names,
 )
 
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
+# Background email sends, kept referenced until they finish
+_email_tasks = set()
+
 
 # Process clinical summary template with client data
 @api_router.post("/process-clinical-template")
@@ -113,7 +172,7 @@ async def process_clinical_template_endpoint(request: dict):
 
         # Process the template with client data
         processed_content = process_clinical_template(
-            template_content, client_data
+            template_content, client_data, request.get("syntax", "text")
         )
 
         return {
@@ -128,14 +187,88 @@ async def process_clinical_template_endpoint(request: dict):
         )
 
 
+async def template_update_errors(collection, template_id: str, update) -> list:
+    """Validate the content and syntax a template will have after an update,
+    taking whichever of the two the update leaves out from the stored one"""
+    if update.content is None and update.syntax is None:
+        return []
+    existing = await collection.find_one(
+        {"id": template_id}, {"_id": 0, "content": 1, "syntax": 1}
+    ) or {}
+    return validate_template(
+        (
+            update.content
+            if update.content is not None
+            else existing.get("content", "")
+        ),
+        update.syntax or existing.get("syntax", "text"),
+    )
+
+
+# Reference collection holding each template type
+TEMPLATE_COLLECTIONS = {
+    "clinical": "clinical_templates",
+    "notes": "notes_templates",
+}
+
+
+@api_router.post("/render-templates", response_model=dict)
+async def render_templates(request: TemplateRenderRequest):
+    """Render one clinical or notes template for many clients at once"""
+    try:
+        templates = await get_reference_data(
+            TEMPLATE_COLLECTIONS[request.template_type]
+        )
+        template = next(
+            (item for item in templates if item.get("id") == request.template_id),
+            None,
+        )
+        if template is None:
+            raise HTTPException(status_code=404, detail="Template not found")
+
+        registrations = await db.admin_registrations.find(
+            {"id": {"$in": request.registration_ids}}, CLIENT_FIELD_PROJECTION
+        ).to_list(len(request.registration_ids))
+
+        rendered = render_many(
+            template.get("content", ""),
+            registrations,
+            template_id=template["id"],
+            updated_at=template.get("updated_at"),
+            syntax=template.get("syntax", "text"),
+        )
+        found = {registration["id"] for registration in registrations}
+        return {
+            "template_id": template["id"],
+            "template_name": template.get("name"),
+            "rendered": [
+                {"registration_id": registration["id"], "content": content}
+                for registration, content in zip(registrations, rendered)
+            ],
+            "missing": [
+                registration_id
+                for registration_id in request.registration_ids
+                if registration_id not in found
+            ],
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error rendering templates: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Template rendering failed: {str(e)}"
+        )
+
+
 @api_router.post("/generate-chart", response_model=ChartResponse)
 async def generate_chart(request: ChartRequest):
     """Generate charts for legacy data analysis"""
+    import pandas as pd
+
     try:
         # Get legacy data
-        legacy_upload = await db.legacy_data.find_one(
-            {}, sort=[("upload_date", -1)]
-        )
+        legacy_upload = await current_upload()
 
         if not legacy_upload:
             raise HTTPException(
@@ -143,7 +276,7 @@ async def generate_chart(request: ChartRequest):
                 detail="No legacy data found for chart generation",
             )
 
-        records = legacy_upload["data"]
+        records = await load_legacy_records(legacy_upload)
 
         # Prepare data based on chart type
         if request.chart_type == "monthly_trend":
@@ -245,64 +378,31 @@ async def download_chart(filename: str):
         raise HTTPException(status_code=404, detail="Chart file not found")
 
 
-@api_router.post("/upload-legacy-data", response_model=ExcelUploadResponse)
+@api_router.post("/upload-legacy-data", response_model=LegacyUploadJob)
 async def upload_legacy_data(file: UploadFile = File(...)):
-    """Upload Excel file with legacy patient data for Claude analysis"""
+    """Upload an Excel or CSV file with legacy patient data for Claude
+    analysis. The file is ingested in the background - poll the returned
+    job for progress."""
     try:
         # Validate file type
-        if not file.filename.endswith((".xlsx", ".xls", ".csv")):
+        if not file.filename.lower().endswith((".xlsx", ".xls", ".csv")):
             raise HTTPException(
                 status_code=400,
                 detail="Please upload an Excel (.xlsx, .xls) or CSV (.csv) file",
             )
 
-        # Read file content
-        content = await file.read()
-
-        # Parse Excel/CSV file
-        if file.filename.endswith(".csv"):
-            df = pd.read_csv(io.StringIO(content.decode("utf-8")))
-        else:
-            df = pd.read_excel(io.BytesIO(content))
-
-        # Clean and process data
-        df = df.fillna("")  # Replace NaN with empty strings
-        df.columns = (
-            df.columns.str.strip()
-        )  # Remove whitespace from column names
-
-        # Convert to records for storage
-        records = df.to_dict("records")
-
-        # Generate upload ID
-        upload_id = str(uuid.uuid4())
-
-        # Store in MongoDB
-        legacy_data = {
-            "upload_id": upload_id,
-            "filename": file.filename,
-            "upload_date": datetime.now(
-                pytz.timezone("America/Toronto")
-            ).isoformat(),
-            "records_count": len(records),
-            "columns": list(df.columns),
-            "data": records,
-        }
-
-        # Replace existing legacy data (only keep one upload at a time)
-        await db.legacy_data.delete_many({})  # Clear previous data
-        await db.legacy_data.insert_one(legacy_data)
+        path, size = await save_upload(file)
+        try:
+            job = await create_job(file.filename, size)
+        except Exception:
+            os.remove(path)
+            raise
+        start_ingest(job, path)
 
-        # Create preview (first 5 records)
-        preview = records[:5] if len(records) > 5 else records
-
-        return ExcelUploadResponse(
-            message=f"Successfully uploaded {len(records)} records from {file.filename}",
-            records_count=len(records),
-            preview=preview,
-            upload_id=upload_id,
-        )
+        return legacy_job_response(job)
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Excel upload error: {str(e)}")
         raise HTTPException(
@@ -310,14 +410,23 @@ async def upload_legacy_data(file: UploadFile = File(...)):
         )
 
 
+@api_router.get("/upload-legacy-data/{job_id}", response_model=LegacyUploadJob)
+async def get_legacy_upload_job(job_id: str):
+    """Progress of a legacy data upload"""
+    job = await db[LEGACY_JOB_COLLECTION].find_one({"_id": job_id})
+    if not job:
+        raise HTTPException(status_code=404, detail="Upload job not found")
+    return legacy_job_response(job)
+
+
 @api_router.get("/legacy-data-analysis")
 async def get_legacy_data_for_analysis():
     """Get detailed legacy data for AI analysis"""
+    import pandas as pd
+
     try:
         # Get latest upload
-        legacy_upload = await db.legacy_data.find_one(
-            {}, sort=[("upload_date", -1)]
-        )
+        legacy_upload = await current_upload()
 
         if not legacy_upload:
             raise HTTPException(
@@ -325,7 +434,7 @@ async def get_legacy_data_for_analysis():
                 detail="No legacy data found. Please upload an Excel file first.",
             )
 
-        records = legacy_upload["data"]
+        records = await load_legacy_records(legacy_upload)
 
         # Detailed monthly analysis
         monthly_data = {}
@@ -425,11 +534,11 @@ async def get_legacy_data_for_analysis():
 @api_router.get("/legacy-data-summary", response_model=DataSummaryResponse)
 async def get_legacy_data_summary():
     """Get summary of uploaded legacy data"""
+    import pandas as pd
+
     try:
         # Get latest upload
-        legacy_upload = await db.legacy_data.find_one(
-            {}, sort=[("upload_date", -1)]
-        )
+        legacy_upload = await current_upload()
 
         if not legacy_upload:
             raise HTTPException(
@@ -437,7 +546,7 @@ async def get_legacy_data_summary():
                 detail="No legacy data found. Please upload an Excel file first.",
             )
 
-        records = legacy_upload["data"]
+        records = await load_legacy_records(legacy_upload)
 
         # Basic analytics
         total_records = len(records)
@@ -497,39 +606,31 @@ async def get_legacy_data_summary():
 
 
 @api_router.post("/query-legacy-data")
-async def query_legacy_data(query: dict):
-    """Allow 420 AI to query the full legacy dataset"""
+async def query_legacy_data(query: LegacyQuery):
+    """Answer a structured question about the legacy dataset: filters,
+    group-by, date buckets, count/sum/mean/min/max and top-k. With no
+    grouping or aggregates the matching rows themselves are returned."""
     try:
         # Get latest upload
-        legacy_upload = await db.legacy_data.find_one(
-            {}, sort=[("upload_date", -1)]
-        )
+        legacy_upload = await current_upload({"_id": 0, "upload_id": 1})
 
         if not legacy_upload:
             raise HTTPException(status_code=404, detail="No legacy data found")
 
-        records = legacy_upload["data"]
-
-        # Convert to DataFrame for analysis
-        df = pd.DataFrame(records)
+        frame = await get_legacy_frame(legacy_upload["upload_id"])
+        try:
+            result = await asyncio.to_thread(run_query, frame, query.dict())
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
 
-        # Return the full dataset info that AI can work with
         return {
-            "total_records": len(records),
-            "columns": list(df.columns),
-            "data_sample": records[:10],  # First 10 records for context
-            "full_data_available": True,
-            "unique_values": {
-                col: (
-                    list(df[col].unique())[:20]
-                    if df[col].dtype == "object"
-                    else f"Numeric range: {df[col].min()} - {df[col].max()}"
-                )
-                for col in df.columns
-                if col in ["Disposition", "Site", "Type", "Province", "Gender"]
-            },
+            "upload_id": legacy_upload["upload_id"],
+            "schema": describe_frame(frame),
+            **result,
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         logging.error(f"Query legacy data error: {str(e)}")
         raise HTTPException(
@@ -540,6 +641,8 @@ async def query_legacy_data(query: dict):
 @api_router.post("/claude-chat", response_model=ClaudeChatResponse)
 async def claude_chat(request: ClaudeChatRequest):
     """Claude AI chat endpoint for admin analytics with legacy data access and chart generation"""
+    import pandas as pd
+
     try:
         # Get comprehensive legacy data for analysis
         legacy_context = ""
@@ -547,11 +650,9 @@ async def claude_chat(request: ClaudeChatRequest):
         chart_image_url = None
 
         try:
-            legacy_upload = await db.legacy_data.find_one(
-                {}, sort=[("upload_date", -1)]
-            )
+            legacy_upload = await current_upload()
             if legacy_upload:
-                records = legacy_upload["data"]
+                records = await load_legacy_records(legacy_upload)
                 total_records = len(records)
 
                 # Simple disposition count with year breakdown
@@ -1493,6 +1594,7 @@ async def create_attachment_share(request: ShareAttachmentRequest):
         # Store attachment data temporarily with TTL
         share_data = {
             "id": share_id,
+            "registration_id": request.registration_id,
             "attachment_data": request.attachment_data,
             "created_at": datetime.utcnow(),
             "expires_at": expires_at,
@@ -1669,8 +1771,11 @@ async def register_for_testing(registration: UserRegistrationCreate):
         registration_dict = registration.dict()
         registration_obj = UserRegistration(**registration_dict)
 
-        # Send registration email to support team
-        email_sent = send_registration_email(registration_dict)
+        # Send (or queue for the digest) registration email to support team
+        subject, body = build_registration_email(registration_dict)
+        email_sent = await notify(
+            "registration", settings.support_email, subject, body
+        )
 
         if not email_sent:
             logging.warning(
@@ -1767,12 +1872,53 @@ async def admin_register_for_testing(registration: AdminRegistrationCreate):
             elif isinstance(value, datetime):
                 admin_data[key] = value.isoformat()
 
+        # A client is identified by health card; clients without one by
+        # name and date of birth
+        card_key = health_card_key(
+            admin_data.get("healthCard"), admin_data.get("healthCardVersion")
+        )
+        admin_data["healthCardKey"] = card_key
+        duplicate_query = (
+            {"healthCardKey": card_key}
+            if card_key
+            else {
+                "firstName": admin_data.get("firstName"),
+                "lastName": admin_data.get("lastName"),
+                "dob": admin_data.get("dob"),
+                "healthCardKey": None,
+            }
+        )
+
+        existing = await db.admin_registrations.find_one(
+            duplicate_query, {"_id": 0, "id": 1, "status": 1}
+        )
+        if existing:
+            logging.warning(
+                f"DUPLICATE BLOCKED: {registration.firstName} {registration.lastName} "
+                f"matches {existing['id']} by "
+                f"{'health card' if card_key else 'name and date of birth'}"
+            )
+            return {
+                "message": "Registration already exists - using existing record",
+                "registration_id": existing["id"],
+                "status": existing.get("status", "pending_review"),
+                "duplicate_prevented": True,
+                "duplicate_match": "health_card" if card_key else "name_dob",
+            }
+
         try:
-            # Store in MongoDB - unique index will prevent duplicates
+            # Store in MongoDB - the health card index blocks a concurrent
+            # duplicate
             result = await db.admin_registrations.insert_one(admin_data)
             logging.info(
                 f"Admin registration saved for review - ID: {admin_registration.id}"
             )
+            await record_write(
+                "admin_registrations",
+                "insert",
+                [admin_registration.id],
+                status="pending_review",
+            )
 
             # Return response immediately
             response_data = {
@@ -1794,10 +1940,7 @@ async def admin_register_for_testing(registration: AdminRegistrationCreate):
             ):
                 # Find existing registration and return it
                 existing = await db.admin_registrations.find_one(
-                    {
-                        "firstName": registration.firstName,
-                        "lastName": registration.lastName,
-                    }
+                    duplicate_query, {"_id": 0, "id": 1, "status": 1}
                 )
                 if existing:
                     logging.warning(
@@ -1808,6 +1951,9 @@ async def admin_register_for_testing(registration: AdminRegistrationCreate):
                         "registration_id": existing["id"],
                         "status": existing.get("status", "pending_review"),
                         "duplicate_prevented": True,
+                        "duplicate_match": (
+                            "health_card" if card_key else "name_dob"
+                        ),
                     }
             raise db_error
 
@@ -1861,6 +2007,58 @@ async def get_pending_admin_registrations():
         )
 
 
+@api_router.get("/admin-registrations/lookup", response_model=dict)
+async def lookup_registration_by_health_card(
+    health_card: str, version: str = ""
+):
+    """Find the client holding a health card. Without a version code every
+    version of the card matches."""
+    try:
+        card_key = health_card_key(health_card, version)
+        if not card_key:
+            raise HTTPException(
+                status_code=400, detail="Enter a full health card number"
+            )
+
+        if version:
+            key_query = card_key
+        else:
+            # Anchored, so the health card index still serves it
+            key_query = {"$regex": f"^{re.escape(card_key)}"}
+        matches = await db.admin_registrations.find(
+            {
+                "$or": [
+                    {"healthCardKey": key_query},
+                    {"healthCardConflict": key_query},
+                ]
+            },
+            {
+                "_id": 0,
+                "id": 1,
+                "firstName": 1,
+                "lastName": 1,
+                "dob": 1,
+                "healthCard": 1,
+                "healthCardVersion": 1,
+                "status": 1,
+            },
+        ).to_list(10)
+
+        return {
+            "found": bool(matches),
+            "registration_id": matches[0]["id"] if len(matches) == 1 else None,
+            "matches": matches,
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Health card lookup failed: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail="Failed to look up health card"
+        )
+
+
 @api_router.get("/admin-registration/{registration_id}", response_model=dict)
 async def get_admin_registration_by_id(registration_id: str):
     """Get specific admin registration by ID for editing"""
@@ -1927,11 +2125,29 @@ async def update_admin_registration(
         registration_dict["status"] = (
             "pending_review"  # Keep as pending_review
         )
+        registration_dict["version"] = existing.get("version", 0) + 1
 
-        # Update in MongoDB
-        result = await db.admin_registrations.replace_one(
-            {"id": registration_id}, registration_dict
+        card_key = health_card_key(
+            registration_dict.get("healthCard"),
+            registration_dict.get("healthCardVersion"),
         )
+        if card_key and card_key == existing.get("healthCardConflict"):
+            # Still sharing its card with another registration
+            registration_dict["healthCardKey"] = None
+            registration_dict["healthCardConflict"] = card_key
+        else:
+            registration_dict["healthCardKey"] = card_key
+
+        # Update in MongoDB
+        try:
+            result = await db.admin_registrations.replace_one(
+                {"id": registration_id}, registration_dict
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409,
+                detail="This health card belongs to another client",
+            )
 
         if result.modified_count == 0:
             raise HTTPException(
@@ -1939,6 +2155,20 @@ async def update_admin_registration(
                 detail="Registration not found or no changes made",
             )
 
+        # Keep the client name stored on activities in step with a rename
+        new_name = (
+            registration_dict.get("firstName"),
+            registration_dict.get("lastName"),
+        )
+        if new_name != (existing.get("firstName"), existing.get("lastName")):
+            await sync_activity_client_names(registration_id, *new_name)
+        await record_write(
+            "admin_registrations",
+            "update",
+            [registration_id],
+            status="pending_review",
+        )
+
         logging.info(f"Admin registration updated - ID: {registration_id}")
         return {
             "message": "Registration updated successfully",
@@ -1957,67 +2187,164 @@ async def update_admin_registration(
         )
 
 
-@api_router.delete(
-    "/admin-registration/{registration_id}", response_model=dict
-)
-async def delete_admin_registration(registration_id: str):
-    """Delete an admin registration and all associated data"""
+@api_router.patch("/admin-registration/{registration_id}", response_model=dict)
+async def patch_admin_registration(
+    registration_id: str, patch: AdminRegistrationPatch
+):
+    """Apply only the supplied fields of a registration - null clears a
+    field. Unlike PUT this leaves the photo, attachments and finalization
+    data alone unless they are sent."""
     try:
-        # Find the existing registration
-        existing = await db.admin_registrations.find_one(
-            {"id": registration_id}
-        )
+        changes = patch.dict(exclude_unset=True)
+        expected_version = changes.pop("version", None)
 
-        if not existing:
+        cleared = {field for field, value in changes.items() if value is None}
+        if cleared & REQUIRED_REGISTRATION_FIELDS:
             raise HTTPException(
-                status_code=404, detail="Registration not found"
+                status_code=422,
+                detail=f"Cannot clear required fields: "
+                f"{', '.join(sorted(cleared & REQUIRED_REGISTRATION_FIELDS))}",
             )
 
-        # Delete all associated data to prevent orphaned records
-        deletion_counts = {}
+        # Dates are stored as ISO strings
+        for field in ("dob", "regDate"):
+            if isinstance(changes.get(field), date):
+                changes[field] = changes[field].isoformat()
 
-        # Delete activities
-        activities_result = await db.activities.delete_many(
-            {"registration_id": registration_id}
-        )
-        deletion_counts["activities"] = activities_result.deleted_count
+        update = {"$inc": {"version": 1}}
+        to_set = {
+            field: value for field, value in changes.items() if value is not None
+        }
+        to_unset = {field: "" for field in cleared}
 
-        # Delete test records
-        tests_result = await db.test_records.delete_many(
-            {"registration_id": registration_id}
-        )
-        deletion_counts["test_records"] = tests_result.deleted_count
+        if {"healthCard", "healthCardVersion"} & set(changes):
+            card = await db.admin_registrations.find_one(
+                {"id": registration_id},
+                {"_id": 0, "healthCard": 1, "healthCardVersion": 1},
+            ) or {}
+            card.update(
+                {
+                    field: changes[field]
+                    for field in ("healthCard", "healthCardVersion")
+                    if field in changes
+                }
+            )
+            to_set["healthCardKey"] = health_card_key(
+                card.get("healthCard"), card.get("healthCardVersion")
+            )
+            # The edited card is checked afresh by the unique index
+            to_unset["healthCardConflict"] = ""
 
-        # Delete notes records
-        notes_result = await db.notes_records.delete_many(
-            {"registration_id": registration_id}
+        if to_set:
+            update["$set"] = to_set
+        if to_unset:
+            update["$unset"] = to_unset
+
+        query = {"id": registration_id}
+        if expected_version is not None:
+            # Documents saved before versioning have no version field
+            query["version"] = (
+                {"$in": [0, None]} if expected_version == 0 else expected_version
+            )
+
+        # Only the version and the changed fields come back - never the
+        # photo or attachments, which can run to megabytes
+        projection = {field: 1 for field in changes if field != "photo"}
+        projection.update(
+            {
+                "_id": 0,
+                "id": 1,
+                "version": 1,
+                "status": 1,
+                "firstName": 1,
+                "lastName": 1,
+            }
         )
-        deletion_counts["notes_records"] = notes_result.deleted_count
 
-        # Delete medications
-        medications_result = await db.medications.delete_many(
-            {"registration_id": registration_id}
+        try:
+            registration = await db.admin_registrations.find_one_and_update(
+                query,
+                update,
+                projection=projection,
+                return_document=ReturnDocument.AFTER,
+            )
+        except DuplicateKeyError:
+            raise HTTPException(
+                status_code=409,
+                detail="This health card belongs to another client",
+            )
+
+        if registration is None:
+            exists = await db.admin_registrations.count_documents(
+                {"id": registration_id}, limit=1
+            )
+            if not exists:
+                raise HTTPException(
+                    status_code=404, detail="Registration not found"
+                )
+            raise HTTPException(
+                status_code=409,
+                detail="Registration was changed by someone else - reload and try again",
+            )
+
+        if "firstName" in changes or "lastName" in changes:
+            await sync_activity_client_names(
+                registration_id,
+                registration.get("firstName"),
+                registration.get("lastName"),
+            )
+
+        await record_write(
+            "admin_registrations",
+            "update",
+            [registration_id],
+            status=registration.get("status"),
+            fields=sorted(changes),
         )
-        deletion_counts["medications"] = medications_result.deleted_count
 
-        # Delete interactions
-        interactions_result = await db.interactions.delete_many(
-            {"registration_id": registration_id}
+        logging.info(
+            f"Admin registration patched - ID: {registration_id}, "
+            f"fields: {', '.join(sorted(changes)) or 'none'}"
         )
-        deletion_counts["interactions"] = interactions_result.deleted_count
+        return {
+            "message": "Registration updated successfully",
+            "registration_id": registration_id,
+            "version": registration.get("version"),
+            "registration": registration,
+        }
 
-        # Delete dispensing records
-        dispensing_result = await db.dispensing.delete_many(
-            {"registration_id": registration_id}
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(
+            f"Error patching admin registration {registration_id}: {str(e)}"
+        )
+        raise HTTPException(
+            status_code=500, detail="Failed to update registration"
         )
-        deletion_counts["dispensing"] = dispensing_result.deleted_count
 
-        # Delete the registration itself
-        result = await db.admin_registrations.delete_one(
-            {"id": registration_id}
+
+@api_router.delete(
+    "/admin-registration/{registration_id}", response_model=dict
+)
+async def delete_admin_registration(registration_id: str):
+    """Delete an admin registration and all associated data"""
+    try:
+        # Find the existing registration
+        existing = await db.admin_registrations.find_one(
+            {"id": registration_id}, {"_id": 1}
         )
 
-        if result.deleted_count == 0:
+        if not existing:
+            raise HTTPException(
+                status_code=404, detail="Registration not found"
+            )
+
+        # Delete all associated data to prevent orphaned records
+        deletion_counts = await delete_registrations([registration_id])
+        registration_deleted = deletion_counts.pop("admin_registrations")
+
+        if registration_deleted == 0:
             raise HTTPException(
                 status_code=404, detail="Registration not found"
             )
@@ -2105,135 +2432,72 @@ async def finalize_admin_registration(registration_id: str):
     try:
         logging.info(f"FORCE FINALIZE: Starting for {registration_id}")
 
-        # Find the registration
-        registration_data = await db.admin_registrations.find_one(
-            {"id": registration_id}
+        # Update database FIRST - the status guard makes a concurrent
+        # finalize of the same registration a no-op
+        toronto_tz = pytz.timezone("America/Toronto")
+        finalized_time = datetime.now(toronto_tz).isoformat()
+
+        registration_data = await db.admin_registrations.find_one_and_update(
+            {"id": registration_id, "status": "pending_review"},
+            {"$set": {"status": "completed", "finalized_at": finalized_time}},
+            projection={"_id": 0},
         )
 
         if not registration_data:
-            logging.error(
-                f"FORCE FINALIZE ERROR: Registration {registration_id} not found"
-            )
-            raise HTTPException(
-                status_code=404, detail="Registration not found"
+            exists = await db.admin_registrations.count_documents(
+                {"id": registration_id}, limit=1
             )
-
-        if registration_data.get("status") != "pending_review":
+            if not exists:
+                logging.error(
+                    f"FORCE FINALIZE ERROR: Registration {registration_id} not found"
+                )
+                raise HTTPException(
+                    status_code=404, detail="Registration not found"
+                )
             logging.error(
                 f"FORCE FINALIZE ERROR: Registration {registration_id} not pending review"
             )
             raise HTTPException(
                 status_code=400, detail="Registration is not pending review"
             )
-
-        # Update database FIRST
-        toronto_tz = pytz.timezone("America/Toronto")
-        finalized_time = datetime.now(toronto_tz).isoformat()
-
-        await db.admin_registrations.update_one(
-            {"id": registration_id},
-            {"$set": {"status": "completed", "finalized_at": finalized_time}},
-        )
         logging.info(
             f"FORCE FINALIZE: Database updated to completed for {registration_id}"
         )
+        await record_write(
+            "admin_registrations",
+            "finalize",
+            [registration_id],
+            status="completed",
+        )
 
-        # FORCE EMAIL SENDING - SYNCHRONOUSLY, NO BACKGROUND THREADS
+        # Notify support - an email failure never undoes the finalization
         email_sent = False
         email_error = None
+        photo_data = None
 
         try:
-            # CRITICAL: Get support email from environment
-            # env_support_email = os.environ.get("SUPPORT_EMAIL")
-            # fallback_email = "420pharmacyprogram@gmail.com"
-            # support_email = (
-            #     env_support_email if env_support_email else fallback_email
-            # )
-            # logging.info(
-            #     f"FORCE EMAIL: Environment SUPPORT_EMAIL = {os.environ.get('SUPPORT_EMAIL', 'NOT SET')}"
-            # )
-            # logging.error(
-            #     f"🚨 EMAIL DEBUG - Raw env var: {repr(os.environ.get('SUPPORT_EMAIL'))}"
-            # )
-            # logging.error(
-            #     f"🚨 EMAIL DEBUG - Env support_email: {env_support_email}"
-            # )
-
             support_email = settings.support_email
-
-            subject = f"New Registration - {registration_data.get('firstName')} {registration_data.get('lastName')}"
-
-            # EXTENSIVE LOGGING FOR DEBUGGING
-            logging.error(
-                f"🚨 EMAIL DEBUG - Final support_email: {support_email}"
+            subject, email_body, photo_data = build_finalization_email(
+                registration_data
             )
-            logging.error(f"🚨 EMAIL DEBUG - Will send to: {support_email}")
 
             logging.info(
                 f"FORCE EMAIL: Sending to {support_email} for {registration_id}"
             )
-            logging.info(
-                f"FORCE EMAIL: Resolved support_email = {support_email}"
-            )
-
-            email_body = f"""
-Registration Date: {registration_data.get('regDate') or 'Not provided'}
-
-PATIENT INFORMATION:
-• Name: {registration_data.get('firstName')} {registration_data.get('lastName')}
-• Date of Birth: {registration_data.get('dob') or 'Not provided'}
-• Age: {registration_data.get('age') or 'Not provided'}
-• Gender: {registration_data.get('gender') or 'Not provided'}
-• Health Card: {registration_data.get('healthCard') or 'Not provided'}
-• Health Card Version: {registration_data.get('healthCardVersion') or 'Not provided'}
-
-CONTACT INFORMATION:
-• Phone 1: {registration_data.get('phone1') or 'Not provided'}
-• Phone 2: {registration_data.get('phone2') or 'Not provided'}
-• Email: {registration_data.get('email') or 'Not provided'}
-• Address: {registration_data.get('address') or 'Not provided'}
-• City: {registration_data.get('city') or 'Not provided'}
-• Province: {registration_data.get('province')}
-• Postal Code: {registration_data.get('postalCode') or 'Not provided'}
-
-OTHER INFORMATION:
-• Patient Consent: {registration_data.get('patientConsent')}
-• Disposition: {registration_data.get('disposition') or 'Not provided'}
-• Referral Site: {registration_data.get('referralSite') or 'Not provided'}
-• Physician: {registration_data.get('physician') or 'Not specified'}
-• Language: {registration_data.get('language')}
-
-ADDITIONAL NOTES:
-• Special Attention: {registration_data.get('specialAttention') or 'None'}
-• Instructions: {registration_data.get('instructions') or 'None'}
-• Clinical Summary: {registration_data.get('summaryTemplate') or 'None provided'}
-"""
-
-            # Include photos up to reasonable size for email
-            photo_data = None
-            if registration_data.get("photo"):
-                photo_size = len(registration_data["photo"])
-                if photo_size < 2 * 1024 * 1024:  # Include photos under 2MB
-                    photo_data = registration_data["photo"]
-                    logging.info(
-                        f"FORCE EMAIL: Including photo ({photo_size} bytes)"
-                    )
-                else:
-                    logging.info(
-                        f"FORCE EMAIL: Photo too large ({photo_size} bytes), skipping to ensure email delivery"
-                    )
 
-            # SEND EMAIL DIRECTLY - NO ASYNC, NO THREADING
-            await send_email(
-                to_email=support_email,
-                subject=subject,
-                body=email_body,
-                photo_base64=photo_data,
+            # Sent now, or queued for the digest in digest mode
+            email_sent = await notify(
+                "finalization",
+                support_email,
+                subject,
+                email_body,
+                photo=photo_data,
             )
+            if not email_sent:
+                raise RuntimeError("Email delivery failed")
 
-            email_sent = True
             logging.info(
-                f"FORCE EMAIL SUCCESS: Email sent successfully for {registration_id}"
+                f"FORCE EMAIL SUCCESS: Email handed off for {registration_id}"
             )
 
         except Exception as email_error_exc:
@@ -2244,12 +2508,20 @@ ADDITIONAL NOTES:
             # Don't fail the entire operation - registration is still finalized
 
         # Return detailed response
+        email_queued = email_sent and not is_immediate("finalization")
+        if email_queued:
+            email_outcome = "and email queued for the digest"
+        elif email_sent:
+            email_outcome = "and email sent"
+        else:
+            email_outcome = "but email failed"
         response = {
-            "message": f"Registration finalized {'and email sent' if email_sent else 'but email failed'}",
+            "message": f"Registration finalized {email_outcome}",
             "registration_id": registration_id,
             "status": "completed",
             "finalized_at": finalized_time,
             "email_sent": email_sent,
+            "email_queued": email_queued,
             "email_error": email_error,
             "photo_attached": bool(photo_data and len(photo_data) > 0),
         }
@@ -2270,62 +2542,322 @@ ADDITIONAL NOTES:
         )
 
 
+async def transition_registrations(
+    registration_ids: list, from_status: str, update: dict, marker: tuple
+) -> list:
+    """Move the registrations currently in from_status with one guarded
+    update_many and report an outcome per id. marker is a (field, value)
+    pair set by update that is unique to this call, so the registrations
+    this update changed can be told apart from ones changed concurrently."""
+    current = {
+        doc["id"]: doc.get("status")
+        async for doc in db.admin_registrations.find(
+            {"id": {"$in": registration_ids}}, {"_id": 0, "id": 1, "status": 1}
+        )
+    }
+    await db.admin_registrations.update_many(
+        {"id": {"$in": registration_ids}, "status": from_status}, update
+    )
+    field, value = marker
+    moved = {
+        doc["id"]
+        async for doc in db.admin_registrations.find(
+            {"id": {"$in": registration_ids}, field: value},
+            {"_id": 0, "id": 1},
+        )
+    }
+
+    results = []
+    for registration_id in registration_ids:
+        if registration_id in moved:
+            outcome = "updated"
+        elif registration_id not in current:
+            outcome = "not_found"
+        else:
+            outcome = "skipped"
+        results.append(
+            {
+                "registration_id": registration_id,
+                "outcome": outcome,
+                "status": current.get(registration_id),
+            }
+        )
+    return results
+
+
+async def send_finalization_emails(registration_ids: list, finalized_at: str):
+    """Send (or queue for the digest) the support notification for each
+    finalized registration together"""
+    try:
+        notifications = []
+        async for registration_data in db.admin_registrations.find(
+            {"id": {"$in": registration_ids}, "finalized_at": finalized_at},
+            {"_id": 0},
+        ):
+            subject, body, photo_data = build_finalization_email(
+                registration_data
+            )
+            notifications.append(
+                {
+                    "recipient": settings.support_email,
+                    "subject": subject,
+                    "body": body,
+                    "photo": photo_data,
+                }
+            )
+        await notify_batch("finalization", notifications)
+    except Exception as e:
+        logging.error(f"❌ Finalization emails failed: {str(e)}")
+
+
+@api_router.post("/admin-registrations/finalize", response_model=dict)
+async def finalize_admin_registrations(
+    request: BulkRegistrationStatusRequest,
+):
+    """Finalize many pending registrations in one update. Notification
+    emails go out together in the background."""
+    try:
+        registration_ids = list(dict.fromkeys(request.registration_ids))
+        finalized_time = datetime.now(
+            pytz.timezone("America/Toronto")
+        ).isoformat()
+
+        results = await transition_registrations(
+            registration_ids,
+            "pending_review",
+            {"$set": {"status": "completed", "finalized_at": finalized_time}},
+            ("finalized_at", finalized_time),
+        )
+        finalized_ids = [
+            result["registration_id"]
+            for result in results
+            if result["outcome"] == "updated"
+        ]
+        for result in results:
+            if result["outcome"] == "updated":
+                result["status"] = "completed"
+
+        if finalized_ids:
+            await record_write(
+                "admin_registrations",
+                "finalize",
+                finalized_ids,
+                status="completed",
+            )
+            task = asyncio.create_task(
+                send_finalization_emails(finalized_ids, finalized_time)
+            )
+            _email_tasks.add(task)
+            task.add_done_callback(_email_tasks.discard)
+
+        logging.info(
+            f"Bulk finalize: {len(finalized_ids)}/{len(registration_ids)} finalized"
+        )
+        return {
+            "message": f"{len(finalized_ids)} registrations finalized",
+            "finalized_at": finalized_time,
+            "finalized_count": len(finalized_ids),
+            "emails_queued": len(finalized_ids),
+            "results": results,
+        }
+
+    except Exception as e:
+        logging.error(f"Bulk finalize failed: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to finalize: {str(e)}"
+        )
+
+
+@api_router.get("/admin-registrations/duplicates", response_model=dict)
+async def get_duplicate_candidates(
+    status: str = "open", min_score: float = 0.0, page: int = 1, page_size: int = 20
+):
+    """Likely duplicate registration pairs, most likely first"""
+    try:
+        query = {"status": status}
+        if min_score:
+            query["score"] = {"$gte": min_score}
+        page = max(1, page)
+        page_size = max(1, min(page_size, 100))
+
+        total = await db[CANDIDATE_COLLECTION].count_documents(query)
+        candidates = (
+            await db[CANDIDATE_COLLECTION]
+            .find(query)
+            .sort([("score", -1), ("_id", 1)])
+            .skip((page - 1) * page_size)
+            .limit(page_size)
+            .to_list(page_size)
+        )
+
+        # Both sides of every pair on the page in one query
+        registration_ids = {
+            registration_id
+            for candidate in candidates
+            for registration_id in candidate["ids"]
+        }
+        registrations = {
+            registration["id"]: registration
+            async for registration in db.admin_registrations.find(
+                {"id": {"$in": list(registration_ids)}},
+                {
+                    "_id": 0,
+                    "id": 1,
+                    "firstName": 1,
+                    "lastName": 1,
+                    "aka": 1,
+                    "dob": 1,
+                    "phone1": 1,
+                    "healthCard": 1,
+                    "status": 1,
+                    "regDate": 1,
+                },
+            )
+        }
+
+        return {
+            "candidates": [
+                {
+                    "id": candidate["_id"],
+                    "score": candidate["score"],
+                    "reasons": candidate.get("reasons", []),
+                    "status": candidate["status"],
+                    "registrations": [
+                        registrations.get(registration_id, {"id": registration_id})
+                        for registration_id in candidate["ids"]
+                    ],
+                }
+                for candidate in candidates
+            ],
+            "total": total,
+            "page": page,
+            "page_size": page_size,
+            "total_pages": (total + page_size - 1) // page_size,
+        }
+
+    except Exception as e:
+        logging.error(f"Error loading duplicate candidates: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail="Failed to load duplicate candidates"
+        )
+
+
+@api_router.post("/admin-registrations/duplicates/rebuild", response_model=dict)
+async def rebuild_duplicates():
+    """Re-key every registration and rescore all pairs in the background"""
+    started = start_duplicate_rebuild()
+    return {
+        "message": (
+            "Duplicate scan started"
+            if started
+            else "Duplicate scan already running"
+        ),
+        "started": started,
+    }
+
+
+@api_router.post(
+    "/admin-registrations/duplicates/{candidate_id}/dismiss",
+    response_model=dict,
+)
+async def dismiss_duplicate_candidate(candidate_id: str):
+    """Mark a pair as two different people so it is not suggested again"""
+    result = await db[CANDIDATE_COLLECTION].update_one(
+        {"_id": candidate_id},
+        {"$set": {"status": "dismissed", "dismissed_at": datetime.utcnow()}},
+    )
+    if result.matched_count == 0:
+        raise HTTPException(status_code=404, detail="Duplicate pair not found")
+    return {"message": "Duplicate pair dismissed", "id": candidate_id}
+
+
 @api_router.delete("/admin-registrations-cleanup", response_model=dict)
-async def cleanup_duplicate_registrations():
+async def cleanup_duplicate_registrations(dry_run: bool = False):
     """Cleanup duplicate admin registrations - keep only latest per person"""
     try:
-        # Get all registrations
-        all_registrations = await db.admin_registrations.find().to_list(1000)
-
-        # Group by firstName + lastName combination
-        grouped = {}
-        for reg in all_registrations:
-            key = f"{reg.get('firstName', '').lower().strip()}_{reg.get('lastName', '').lower().strip()}"
-            if key not in grouped:
-                grouped[key] = []
-            grouped[key].append(reg)
-
-        deleted_count = 0
+        # Group server-side on the normalized name so only ids travel back,
+        # never photos or attachments
+        name_key = {
+            "$concat": [
+                {
+                    "$toLower": {
+                        "$trim": {"input": {"$ifNull": ["$firstName", ""]}}
+                    }
+                },
+                "_",
+                {
+                    "$toLower": {
+                        "$trim": {"input": {"$ifNull": ["$lastName", ""]}}
+                    }
+                },
+            ]
+        }
+        pipeline = [
+            {
+                "$project": {
+                    "_id": 0,
+                    "id": 1,
+                    "firstName": 1,
+                    "lastName": 1,
+                    "timestamp": 1,
+                    "name_key": name_key,
+                }
+            },
+            {"$sort": {"timestamp": -1}},
+            {
+                "$group": {
+                    "_id": "$name_key",
+                    "ids": {"$push": "$id"},
+                    "firstName": {"$first": "$firstName"},
+                    "lastName": {"$first": "$lastName"},
+                }
+            },
+        ]
+
         kept_count = 0
+        to_delete = []
+        duplicate_groups = []
 
-        # For each group, keep only the latest registration
-        for key, registrations in grouped.items():
-            if len(registrations) > 1:
-                # Sort by timestamp (newest first)
-                sorted_regs = sorted(
-                    registrations,
-                    key=lambda x: x.get("timestamp", ""),
-                    reverse=True,
+        async for group in db.admin_registrations.aggregate(
+            pipeline, allowDiskUse=True
+        ):
+            kept_count += 1
+            if len(group["ids"]) > 1:
+                # Newest registration first - keep it, drop the rest
+                to_delete.extend(group["ids"][1:])
+                duplicate_groups.append(
+                    {
+                        "name": f"{group.get('firstName')} {group.get('lastName')}",
+                        "kept_id": group["ids"][0],
+                        "deleted_ids": group["ids"][1:],
+                    }
                 )
 
-                # Keep the first (newest) registration
-                to_keep = sorted_regs[0]
-                to_delete = sorted_regs[1:]
-
-                # Delete the older duplicates
-                for reg in to_delete:
-                    await db.admin_registrations.delete_one(
-                        {"id": reg.get("id")}
-                    )
-                    deleted_count += 1
-                    logging.info(
-                        f"Deleted duplicate registration: {reg.get('firstName')} {reg.get('lastName')} - ID: {reg.get('id')}"
-                    )
+        if dry_run:
+            logging.info(
+                f"Cleanup dry run - Would delete: {len(to_delete)}, Would keep: {kept_count}"
+            )
+            return {
+                "message": "Duplicate cleanup dry run - nothing was deleted",
+                "dry_run": True,
+                "deleted_count": len(to_delete),
+                "kept_count": kept_count,
+                "duplicates": duplicate_groups,
+                "details": f"Would remove {len(to_delete)} duplicate registrations, keep {kept_count} unique registrations",
+            }
 
-                kept_count += 1
-                logging.info(
-                    f"Kept latest registration: {to_keep.get('firstName')} {to_keep.get('lastName')} - ID: {to_keep.get('id')}"
-                )
-            else:
-                kept_count += 1
+        deletion_counts = await delete_registrations(to_delete)
+        deleted_count = deletion_counts["admin_registrations"]
 
         logging.info(
             f"Cleanup completed - Deleted: {deleted_count}, Kept: {kept_count}"
         )
         return {
             "message": "Duplicate cleanup completed",
+            "dry_run": False,
             "deleted_count": deleted_count,
             "kept_count": kept_count,
+            "deletion_summary": deletion_counts,
             "details": f"Removed {deleted_count} duplicate registrations, kept {kept_count} unique registrations",
         }
 
@@ -2339,17 +2871,16 @@ async def cleanup_duplicate_registrations():
 @api_router.delete(
     "/admin-registrations-keep-latest-today", response_model=dict
 )
-async def keep_only_latest_today_registration():
+async def keep_only_latest_today_registration(dry_run: bool = False):
     """Delete all registrations except the most recent one from today"""
     try:
         from datetime import date
 
         today_str = date.today().isoformat()
 
-        # Get all registrations
-        all_registrations = await db.admin_registrations.find().to_list(1000)
+        total_count = await db.admin_registrations.count_documents({})
 
-        if not all_registrations:
+        if not total_count:
             return {
                 "message": "No registrations found",
                 "deleted_count": 0,
@@ -2357,70 +2888,81 @@ async def keep_only_latest_today_registration():
                 "details": "Database is empty",
             }
 
-        # Find registrations from today
-        today_registrations = []
-        other_registrations = []
-
-        for reg in all_registrations:
-            reg_date = reg.get("regDate", "")
-            if reg_date == today_str:
-                today_registrations.append(reg)
-            else:
-                other_registrations.append(reg)
+        # Newest registration from today, without any blob fields
+        to_keep = await db.admin_registrations.find_one(
+            {"regDate": today_str},
+            {
+                "_id": 0,
+                "id": 1,
+                "firstName": 1,
+                "lastName": 1,
+                "regDate": 1,
+                "timestamp": 1,
+            },
+            sort=[("timestamp", -1)],
+        )
 
-        if not today_registrations:
+        if not to_keep:
             # No registrations from today, delete everything
-            deleted_count = len(all_registrations)
-            for reg in all_registrations:
-                await db.admin_registrations.delete_one({"id": reg.get("id")})
-                logging.info(
-                    f"Deleted registration: {reg.get('firstName')} {reg.get('lastName')} - ID: {reg.get('id')}"
-                )
+            if dry_run:
+                return {
+                    "message": "Dry run - no registrations from today found, all would be deleted",
+                    "dry_run": True,
+                    "deleted_count": total_count,
+                    "kept_count": 0,
+                    "details": f"Would delete all {total_count} registrations (none are from today)",
+                }
+
+            deletion_counts = await delete_registrations_matching({})
+            deleted_count = deletion_counts["admin_registrations"]
 
             return {
                 "message": "No registrations from today found - deleted all registrations",
+                "dry_run": False,
                 "deleted_count": deleted_count,
                 "kept_count": 0,
+                "deletion_summary": deletion_counts,
                 "details": f"Deleted all {deleted_count} registrations (none were from today)",
-            }
-
-        # Sort today's registrations by timestamp (newest first)
-        today_registrations.sort(
-            key=lambda x: x.get("timestamp", ""), reverse=True
-        )
+            }
 
-        # Keep the first (newest) registration from today
-        to_keep = today_registrations[0]
-        to_delete = (
-            today_registrations[1:] + other_registrations
-        )  # Delete other today registrations + all older registrations
+        kept_registration = {
+            "id": to_keep.get("id"),
+            "name": f"{to_keep.get('firstName')} {to_keep.get('lastName')}",
+            "regDate": to_keep.get("regDate"),
+            "timestamp": to_keep.get("timestamp"),
+        }
 
-        deleted_count = 0
+        # Delete other today registrations + all older registrations
+        delete_query = {"id": {"$ne": to_keep.get("id")}}
 
-        # Delete all except the latest from today
-        for reg in to_delete:
-            await db.admin_registrations.delete_one({"id": reg.get("id")})
-            deleted_count += 1
-            reg_date = reg.get("regDate", "unknown")
-            logging.info(
-                f"Deleted registration from {reg_date}: {reg.get('firstName')} {reg.get('lastName')} - ID: {reg.get('id')}"
+        if dry_run:
+            would_delete = await db.admin_registrations.count_documents(
+                delete_query
             )
+            return {
+                "message": "Dry run - nothing was deleted",
+                "dry_run": True,
+                "deleted_count": would_delete,
+                "kept_count": 1,
+                "details": f"Would delete {would_delete} registrations, keep 1 registration from today ({today_str})",
+                "kept_registration": kept_registration,
+            }
+
+        deletion_counts = await delete_registrations_matching(delete_query)
+        deleted_count = deletion_counts["admin_registrations"]
 
         logging.info(
-            f"Kept latest registration from today: {to_keep.get('firstName')} {to_keep.get('lastName')} - ID: {to_keep.get('id')}"
+            f"Kept latest registration from today: {kept_registration['name']} - ID: {kept_registration['id']}"
         )
 
         return {
             "message": "Cleanup completed - kept only the latest registration from today",
+            "dry_run": False,
             "deleted_count": deleted_count,
             "kept_count": 1,
+            "deletion_summary": deletion_counts,
             "details": f"Deleted {deleted_count} registrations, kept 1 registration from today ({today_str})",
-            "kept_registration": {
-                "id": to_keep.get("id"),
-                "name": f"{to_keep.get('firstName')} {to_keep.get('lastName')}",
-                "regDate": to_keep.get("regDate"),
-                "timestamp": to_keep.get("timestamp"),
-            },
+            "kept_registration": kept_registration,
         }
 
     except Exception as e:
@@ -2451,8 +2993,15 @@ async def submit_contact_message(message: ContactMessageCreate):
         message_dict = message.dict()
         message_obj = ContactMessage(**message_dict)
 
-        # Send contact email to support team
-        email_sent = send_contact_email(message_dict)
+        # Send (or queue for the digest) contact email to support team
+        subject, body = build_contact_email(message_dict)
+        email_sent = await notify(
+            "contact",
+            settings.support_email,
+            subject,
+            body,
+            reply_to=message_dict.get("email"),
+        )
 
         if not email_sent:
             logging.warning(
@@ -2497,7 +3046,7 @@ async def get_contact_messages():
 async def get_all_templates():
     """Get all clinical summary templates"""
     try:
-        templates = await db.clinical_templates.find().to_list(1000)
+        templates = await get_reference_data("clinical_templates")
         return [ClinicalTemplate(**template) for template in templates]
     except Exception as e:
         logging.error(f"Error fetching templates: {str(e)}")
@@ -2509,6 +3058,10 @@ async def get_all_templates():
 @api_router.post("/clinical-templates", response_model=ClinicalTemplate)
 async def create_template(template: ClinicalTemplateCreate):
     """Create a new clinical summary template"""
+    template_errors = validate_template(template.content, template.syntax)
+    if template_errors:
+        raise HTTPException(status_code=400, detail=template_errors)
+
     try:
         template_dict = template.dict()
         template_obj = ClinicalTemplate(**template_dict)
@@ -2519,6 +3072,7 @@ async def create_template(template: ClinicalTemplateCreate):
         template_data["updated_at"] = template_obj.updated_at.isoformat()
 
         result = await db.clinical_templates.insert_one(template_data)
+        await invalidate_reference_cache("clinical_templates")
 
         if result.inserted_id:
             logging.info(f"Template created successfully: {template_obj.name}")
@@ -2528,6 +3082,8 @@ async def create_template(template: ClinicalTemplateCreate):
                 status_code=500, detail="Failed to create template"
             )
 
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Template already exists")
     except Exception as e:
         logging.error(f"Error creating template: {str(e)}")
         raise HTTPException(
@@ -2542,6 +3098,12 @@ async def update_template(
     template_id: str, template_update: ClinicalTemplateUpdate
 ):
     """Update an existing clinical summary template"""
+    template_errors = await template_update_errors(
+        db.clinical_templates, template_id, template_update
+    )
+    if template_errors:
+        raise HTTPException(status_code=400, detail=template_errors)
+
     try:
         # Find the existing template
         existing_template = await db.clinical_templates.find_one(
@@ -2559,6 +3121,7 @@ async def update_template(
         result = await db.clinical_templates.update_one(
             {"id": template_id}, {"$set": update_data}
         )
+        await invalidate_reference_cache("clinical_templates")
 
         if result.modified_count > 0:
             # Return the updated template
@@ -2571,6 +3134,8 @@ async def update_template(
                 status_code=500, detail="Failed to update template"
             )
 
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Template name already exists")
     except Exception as e:
         logging.error(f"Error updating template: {str(e)}")
         raise HTTPException(
@@ -2583,6 +3148,7 @@ async def delete_template(template_id: str):
     """Delete a clinical summary template"""
     try:
         result = await db.clinical_templates.delete_one({"id": template_id})
+        await invalidate_reference_cache("clinical_templates")
 
         if result.deleted_count > 0:
             logging.info(f"Template deleted successfully: {template_id}")
@@ -2601,47 +3167,39 @@ async def delete_template(template_id: str):
 async def save_all_templates(templates: dict):
     """Save all templates from frontend (migration from localStorage)"""
     try:
-        saved_count = 0
+        template_documents = []
 
         for template_name, template_content in templates.items():
             if template_name and template_content:
-                # Check if template already exists
-                existing = await db.clinical_templates.find_one(
-                    {"name": template_name}
+                template_obj = ClinicalTemplate(
+                    name=template_name, content=template_content
                 )
+                template_data = template_obj.dict()
+                template_data["created_at"] = (
+                    template_obj.created_at.isoformat()
+                )
+                template_data["updated_at"] = (
+                    template_obj.updated_at.isoformat()
+                )
+                template_documents.append(template_data)
 
-                if existing:
-                    # Update existing template
-                    await db.clinical_templates.update_one(
-                        {"name": template_name},
-                        {
-                            "$set": {
-                                "content": template_content,
-                                "updated_at": datetime.utcnow().isoformat(),
-                            }
-                        },
-                    )
-                else:
-                    # Create new template
-                    template_obj = ClinicalTemplate(
-                        name=template_name, content=template_content
-                    )
-                    template_data = template_obj.dict()
-                    template_data["created_at"] = (
-                        template_obj.created_at.isoformat()
-                    )
-                    template_data["updated_at"] = (
-                        template_obj.updated_at.isoformat()
-                    )
-
-                    await db.clinical_templates.insert_one(template_data)
-
-                saved_count += 1
+        # Single round trip - new templates are inserted, existing ones
+        # only get their content refreshed
+        inserted_count, updated_count = await bulk_upsert_by_name(
+            db.clinical_templates, template_documents, ["content"]
+        )
+        await invalidate_reference_cache("clinical_templates")
 
-        logging.info(f"Saved {saved_count} templates to database")
+        saved_count = len(template_documents)
+        logging.info(
+            f"Saved {saved_count} templates to database "
+            f"(inserted: {inserted_count}, updated: {updated_count})"
+        )
         return {
             "message": f"Successfully saved {saved_count} templates",
             "count": saved_count,
+            "inserted_count": inserted_count,
+            "updated_count": updated_count,
         }
 
     except Exception as e:
@@ -2654,7 +3212,7 @@ async def save_all_templates(templates: dict):
 async def get_all_notes_templates():
     """Get all Notes templates"""
     try:
-        templates = await db.notes_templates.find().to_list(1000)
+        templates = await get_reference_data("notes_templates")
         return [NotesTemplate(**template) for template in templates]
     except Exception as e:
         logging.error(f"Error fetching Notes templates: {str(e)}")
@@ -2666,6 +3224,10 @@ async def get_all_notes_templates():
 @api_router.post("/notes-templates", response_model=NotesTemplate)
 async def create_notes_template(template: NotesTemplateCreate):
     """Create a new Notes template"""
+    template_errors = validate_template(template.content, template.syntax)
+    if template_errors:
+        raise HTTPException(status_code=400, detail=template_errors)
+
     try:
         template_dict = template.dict()
         template_obj = NotesTemplate(**template_dict)
@@ -2676,6 +3238,7 @@ async def create_notes_template(template: NotesTemplateCreate):
         template_data["updated_at"] = template_obj.updated_at.isoformat()
 
         result = await db.notes_templates.insert_one(template_data)
+        await invalidate_reference_cache("notes_templates")
 
         if result.inserted_id:
             logging.info(
@@ -2687,6 +3250,8 @@ async def create_notes_template(template: NotesTemplateCreate):
                 status_code=500, detail="Failed to create Notes template"
             )
 
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Notes template already exists")
     except Exception as e:
         logging.error(f"Error creating Notes template: {str(e)}")
         raise HTTPException(
@@ -2699,6 +3264,12 @@ async def update_notes_template(
     template_id: str, template_update: NotesTemplateUpdate
 ):
     """Update an existing Notes template"""
+    template_errors = await template_update_errors(
+        db.notes_templates, template_id, template_update
+    )
+    if template_errors:
+        raise HTTPException(status_code=400, detail=template_errors)
+
     try:
         # Find the existing template
         existing_template = await db.notes_templates.find_one(
@@ -2718,6 +3289,7 @@ async def update_notes_template(
         result = await db.notes_templates.update_one(
             {"id": template_id}, {"$set": update_data}
         )
+        await invalidate_reference_cache("notes_templates")
 
         if result.modified_count > 0:
             # Return the updated template
@@ -2730,6 +3302,8 @@ async def update_notes_template(
                 status_code=500, detail="Failed to update Notes template"
             )
 
+    except DuplicateKeyError:
+        raise HTTPException(status_code=400, detail="Notes template name already exists")
     except Exception as e:
         logging.error(f"Error updating Notes template: {str(e)}")
         raise HTTPException(
@@ -2742,6 +3316,7 @@ async def delete_notes_template(template_id: str):
     """Delete a Notes template"""
     try:
         result = await db.notes_templates.delete_one({"id": template_id})
+        await invalidate_reference_cache("notes_templates")
 
         if result.deleted_count > 0:
             logging.info(f"Notes template deleted successfully: {template_id}")
@@ -2762,49 +3337,39 @@ async def delete_notes_template(template_id: str):
 async def save_all_notes_templates(templates: dict):
     """Save all Notes templates from frontend"""
     try:
-        saved_count = 0
+        template_documents = []
 
         for template_name, template_content in templates.items():
             if (
                 template_name and template_content is not None
             ):  # Allow empty content
-                # Check if template already exists
-                existing = await db.notes_templates.find_one(
-                    {"name": template_name}
+                template_obj = NotesTemplate(
+                    name=template_name, content=template_content
                 )
+                template_data = template_obj.dict()
+                template_data["created_at"] = (
+                    template_obj.created_at.isoformat()
+                )
+                template_data["updated_at"] = (
+                    template_obj.updated_at.isoformat()
+                )
+                template_documents.append(template_data)
 
-                if existing:
-                    # Update existing template
-                    await db.notes_templates.update_one(
-                        {"name": template_name},
-                        {
-                            "$set": {
-                                "content": template_content,
-                                "updated_at": datetime.utcnow().isoformat(),
-                            }
-                        },
-                    )
-                else:
-                    # Create new template
-                    template_obj = NotesTemplate(
-                        name=template_name, content=template_content
-                    )
-                    template_data = template_obj.dict()
-                    template_data["created_at"] = (
-                        template_obj.created_at.isoformat()
-                    )
-                    template_data["updated_at"] = (
-                        template_obj.updated_at.isoformat()
-                    )
-
-                    await db.notes_templates.insert_one(template_data)
-
-                saved_count += 1
+        inserted_count, updated_count = await bulk_upsert_by_name(
+            db.notes_templates, template_documents, ["content"]
+        )
+        await invalidate_reference_cache("notes_templates")
 
-        logging.info(f"Saved {saved_count} Notes templates to database")
+        saved_count = len(template_documents)
+        logging.info(
+            f"Saved {saved_count} Notes templates to database "
+            f"(inserted: {inserted_count}, updated: {updated_count})"
+        )
         return {
             "message": f"Successfully saved {saved_count} Notes templates",
             "count": saved_count,
+            "inserted_count": inserted_count,
+            "updated_count": updated_count,
         }
 
     except Exception as e:
@@ -2819,7 +3384,7 @@ async def save_all_notes_templates(templates: dict):
 async def get_all_dispositions():
     """Get all dispositions"""
     try:
-        dispositions = await db.dispositions.find().to_list(1000)
+        dispositions = await get_reference_data("dispositions")
         return [Disposition(**disposition) for disposition in dispositions]
     except Exception as e:
         logging.error(f"Error fetching dispositions: {str(e)}")
@@ -2847,6 +3412,7 @@ async def create_disposition(disposition: DispositionCreate):
         disposition_data["updated_at"] = disposition_obj.updated_at.isoformat()
 
         result = await db.dispositions.insert_one(disposition_data)
+        await invalidate_reference_cache("dispositions")
 
         if result.inserted_id:
             logging.info(
@@ -2900,6 +3466,7 @@ async def update_disposition(
         result = await db.dispositions.update_one(
             {"id": disposition_id}, {"$set": update_data}
         )
+        await invalidate_reference_cache("dispositions")
 
         if result.modified_count > 0:
             # Get updated disposition
@@ -2937,6 +3504,7 @@ async def delete_disposition(disposition_id: str):
             )
 
         result = await db.dispositions.delete_one({"id": disposition_id})
+        await invalidate_reference_cache("dispositions")
 
         if result.deleted_count > 0:
             logging.info(f"Disposition deleted successfully: {disposition_id}")
@@ -2957,46 +3525,37 @@ async def delete_disposition(disposition_id: str):
 async def save_all_dispositions(dispositions: List[DispositionCreate]):
     """Save all dispositions from frontend"""
     try:
-        saved_count = 0
+        disposition_documents = []
 
         for disposition_data in dispositions:
             if disposition_data.name:
-                # Check if disposition already exists
-                existing = await db.dispositions.find_one(
-                    {"name": disposition_data.name}
+                disposition_obj = Disposition(**disposition_data.dict())
+                disposition_dict = disposition_obj.dict()
+                disposition_dict["created_at"] = (
+                    disposition_obj.created_at.isoformat()
                 )
+                disposition_dict["updated_at"] = (
+                    disposition_obj.updated_at.isoformat()
+                )
+                disposition_documents.append(disposition_dict)
 
-                if existing:
-                    # Update existing disposition
-                    await db.dispositions.update_one(
-                        {"name": disposition_data.name},
-                        {
-                            "$set": {
-                                "is_frequent": disposition_data.is_frequent,
-                                "is_default": disposition_data.is_default,
-                                "updated_at": datetime.utcnow().isoformat(),
-                            }
-                        },
-                    )
-                else:
-                    # Create new disposition
-                    disposition_obj = Disposition(**disposition_data.dict())
-                    disposition_dict = disposition_obj.dict()
-                    disposition_dict["created_at"] = (
-                        disposition_obj.created_at.isoformat()
-                    )
-                    disposition_dict["updated_at"] = (
-                        disposition_obj.updated_at.isoformat()
-                    )
-
-                    await db.dispositions.insert_one(disposition_dict)
-
-                saved_count += 1
+        inserted_count, updated_count = await bulk_upsert_by_name(
+            db.dispositions,
+            disposition_documents,
+            ["is_frequent", "is_default"],
+        )
+        await invalidate_reference_cache("dispositions")
 
-        logging.info(f"Saved {saved_count} dispositions to database")
+        saved_count = len(disposition_documents)
+        logging.info(
+            f"Saved {saved_count} dispositions to database "
+            f"(inserted: {inserted_count}, updated: {updated_count})"
+        )
         return {
             "message": f"Successfully saved {saved_count} dispositions",
             "count": saved_count,
+            "inserted_count": inserted_count,
+            "updated_count": updated_count,
         }
 
     except Exception as e:
@@ -3011,7 +3570,7 @@ async def save_all_dispositions(dispositions: List[DispositionCreate]):
 async def get_all_referral_sites():
     """Get all referral sites"""
     try:
-        referral_sites = await db.referral_sites.find().to_list(1000)
+        referral_sites = await get_reference_data("referral_sites")
         return [ReferralSite(**site) for site in referral_sites]
     except Exception as e:
         logging.error(f"Error fetching referral sites: {str(e)}")
@@ -3045,6 +3604,7 @@ async def create_referral_site(referral_site: ReferralSiteCreate):
         )
 
         result = await db.referral_sites.insert_one(referral_site_data)
+        await invalidate_reference_cache("referral_sites")
 
         if result.inserted_id:
             logging.info(
@@ -3102,6 +3662,7 @@ async def update_referral_site(
         result = await db.referral_sites.update_one(
             {"id": referral_site_id}, {"$set": update_data}
         )
+        await invalidate_reference_cache("referral_sites")
 
         if result.modified_count > 0:
             # Get updated referral site
@@ -3141,6 +3702,7 @@ async def delete_referral_site(referral_site_id: str):
             )
 
         result = await db.referral_sites.delete_one({"id": referral_site_id})
+        await invalidate_reference_cache("referral_sites")
 
         if result.deleted_count > 0:
             logging.info(
@@ -3163,48 +3725,37 @@ async def delete_referral_site(referral_site_id: str):
 async def save_all_referral_sites(referral_sites: List[ReferralSiteCreate]):
     """Save all referral sites from frontend"""
     try:
-        saved_count = 0
+        referral_site_documents = []
 
         for referral_site_data in referral_sites:
             if referral_site_data.name:
-                # Check if referral site already exists
-                existing = await db.referral_sites.find_one(
-                    {"name": referral_site_data.name}
+                referral_site_obj = ReferralSite(**referral_site_data.dict())
+                referral_site_dict = referral_site_obj.dict()
+                referral_site_dict["created_at"] = (
+                    referral_site_obj.created_at.isoformat()
                 )
+                referral_site_dict["updated_at"] = (
+                    referral_site_obj.updated_at.isoformat()
+                )
+                referral_site_documents.append(referral_site_dict)
 
-                if existing:
-                    # Update existing referral site
-                    await db.referral_sites.update_one(
-                        {"name": referral_site_data.name},
-                        {
-                            "$set": {
-                                "is_frequent": referral_site_data.is_frequent,
-                                "is_default": referral_site_data.is_default,
-                                "updated_at": datetime.utcnow().isoformat(),
-                            }
-                        },
-                    )
-                else:
-                    # Create new referral site
-                    referral_site_obj = ReferralSite(
-                        **referral_site_data.dict()
-                    )
-                    referral_site_dict = referral_site_obj.dict()
-                    referral_site_dict["created_at"] = (
-                        referral_site_obj.created_at.isoformat()
-                    )
-                    referral_site_dict["updated_at"] = (
-                        referral_site_obj.updated_at.isoformat()
-                    )
-
-                    await db.referral_sites.insert_one(referral_site_dict)
-
-                saved_count += 1
+        inserted_count, updated_count = await bulk_upsert_by_name(
+            db.referral_sites,
+            referral_site_documents,
+            ["is_frequent", "is_default"],
+        )
+        await invalidate_reference_cache("referral_sites")
 
-        logging.info(f"Saved {saved_count} referral sites to database")
+        saved_count = len(referral_site_documents)
+        logging.info(
+            f"Saved {saved_count} referral sites to database "
+            f"(inserted: {inserted_count}, updated: {updated_count})"
+        )
         return {
             "message": f"Successfully saved {saved_count} referral sites",
             "count": saved_count,
+            "inserted_count": inserted_count,
+            "updated_count": updated_count,
         }
 
     except Exception as e:
@@ -3306,6 +3857,9 @@ async def add_test_record(registration_id: str, test_data: TestRecordCreate):
 
         # Insert into database
         result = await db.test_records.insert_one(test_data)
+        await record_write(
+            "test_records", "insert", [test_record.id], registration_id
+        )
 
         logger.info(
             f"Test record added - ID: {test_record.id}, Registration: {registration_id}, Type: {test_record.test_type}"
@@ -3379,6 +3933,9 @@ async def update_test_record(
                 status_code=404,
                 detail="Test record not found or no changes made",
             )
+        await record_write(
+            "test_records", "update", [test_id], registration_id
+        )
 
         logger.info(f"Test record updated - ID: {test_id}")
 
@@ -3406,6 +3963,9 @@ async def delete_test_record(registration_id: str, test_id: str):
             raise HTTPException(
                 status_code=404, detail="Test record not found"
             )
+        await record_write(
+            "test_records", "delete", [test_id], registration_id
+        )
 
         logger.info(f"Test record deleted - ID: {test_id}")
 
@@ -3441,6 +4001,9 @@ async def save_note(registration_id: str, note: NotesCreate):
 
         note_dict = note_record.dict()
         await db.notes_records.insert_one(note_dict)
+        await record_write(
+            "notes_records", "insert", [note_record.id], registration_id
+        )
 
         logger.info(f"Note created for registration ID: {registration_id}")
         return {
@@ -3457,33 +4020,53 @@ async def save_note(registration_id: str, note: NotesCreate):
         )
 
 
+# Notes are served newest first, a page at a time
+NOTES_PAGE_SIZE = 50
+NOTES_MAX_PAGE_SIZE = 200
+
+
 @api_router.get("/admin-registration/{registration_id}/notes")
-async def get_notes(registration_id: str):
-    """Get all notes for a registration"""
+async def get_notes(
+    registration_id: str, limit: int = NOTES_PAGE_SIZE, before: str = ""
+):
+    """Get a page of notes for a registration, newest first. Pass the
+    returned next_cursor as `before` to get the next page."""
     try:
         # Check if registration exists
         registration = await db.admin_registrations.find_one(
-            {"id": registration_id}
+            {"id": registration_id}, {"_id": 1}
         )
         if not registration:
             raise HTTPException(
                 status_code=404, detail="Registration not found"
             )
 
-        # Get all notes for this registration, sorted by created_at descending
-        notes_cursor = db.notes_records.find(
-            {"registration_id": registration_id}
-        )
-        notes = await notes_cursor.to_list(length=None)
+        limit = max(1, min(limit, NOTES_MAX_PAGE_SIZE))
+        query = {"registration_id": registration_id}
+        if before:
+            # Cursor is "<created_at>|<id>" of the last note already shown
+            created_at, _, note_id = before.rpartition("|")
+            if not created_at:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+            query["$or"] = [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "id": {"$lt": note_id}},
+            ]
 
-        # Remove MongoDB _id and return notes
-        for note in notes:
-            note.pop("_id", None)
+        # Served from the (registration_id, created_at, id) index
+        notes = (
+            await db.notes_records.find(query, {"_id": 0})
+            .sort([("created_at", -1), ("id", -1)])
+            .limit(limit + 1)
+            .to_list(length=limit + 1)
+        )
 
-        # Sort by created_at descending (newest first)
-        notes.sort(key=lambda x: x.get("created_at", ""), reverse=True)
+        next_cursor = None
+        if len(notes) > limit:
+            notes = notes[:limit]
+            next_cursor = f"{notes[-1]['created_at']}|{notes[-1]['id']}"
 
-        return {"notes": notes}
+        return {"notes": notes, "next_cursor": next_cursor}
 
     except HTTPException:
         raise
@@ -3494,6 +4077,136 @@ async def get_notes(registration_id: str):
         )
 
 
+@api_router.get("/notes/search")
+async def search_notes(
+    q: str,
+    template_type: str = "",
+    from_date: str = "",
+    to_date: str = "",
+    limit: int = 50,
+):
+    """Full-text search across every client's notes, best matches first,
+    with a highlighted snippet of each note"""
+    try:
+        if not q.strip():
+            raise HTTPException(
+                status_code=400, detail="Search text is required"
+            )
+
+        query = {"$text": {"$search": q}}
+        if template_type:
+            query["templateType"] = template_type
+        if from_date or to_date:
+            query["noteDate"] = {}
+            if from_date:
+                query["noteDate"]["$gte"] = from_date
+            if to_date:
+                query["noteDate"]["$lte"] = to_date
+
+        limit = max(1, min(limit, NOTES_MAX_PAGE_SIZE))
+        score = {"$meta": "textScore"}
+        notes = (
+            await db.notes_records.find(
+                query,
+                {
+                    "_id": 0,
+                    "id": 1,
+                    "registration_id": 1,
+                    "noteDate": 1,
+                    "noteTime": 1,
+                    "noteText": 1,
+                    "templateType": 1,
+                    "created_at": 1,
+                    "score": score,
+                },
+            )
+            .sort([("score", score)])
+            .limit(limit)
+            .to_list(length=limit)
+        )
+
+        # Client names for all matched notes in one query
+        registration_ids = list({note["registration_id"] for note in notes})
+        clients = {
+            client["id"]: client
+            async for client in db.admin_registrations.find(
+                {"id": {"$in": registration_ids}},
+                {"_id": 0, "id": 1, "firstName": 1, "lastName": 1},
+            )
+        }
+
+        terms = search_terms(q)
+        results = []
+        for note in notes:
+            client = clients.get(note["registration_id"], {})
+            note_text = note.pop("noteText", "")
+            note.update(build_snippet(note_text, terms))
+            note["client_name"] = (
+                f"{client.get('firstName', '')} {client.get('lastName', '')}"
+            ).strip()
+            results.append(note)
+
+        return {"query": q, "count": len(results), "results": results}
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error searching notes: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error searching notes: {str(e)}"
+        )
+
+
+@api_router.get("/search")
+async def global_search(
+    q: str, page: int = 1, page_size: int = 20, types: str = ""
+):
+    """Search clients, notes, activities, interactions and tests at once.
+    Results are grouped by client, best match first. types is an optional
+    comma-separated list of client, note, activity, interaction, test."""
+    try:
+        if not tokenize(q):
+            raise HTTPException(
+                status_code=400, detail="Search text is required"
+            )
+        type_filter = [t.strip() for t in types.split(",") if t.strip()]
+        unknown = set(type_filter) - set(SEARCH_TYPES.values())
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown search type: {', '.join(sorted(unknown))}",
+            )
+
+        return await search(
+            q,
+            page=max(1, page),
+            page_size=max(1, min(page_size, 100)),
+            types=type_filter,
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error in global search: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Error searching: {str(e)}"
+        )
+
+
+@api_router.post("/search/rebuild")
+async def rebuild_search():
+    """Rebuild the global search index from scratch in the background"""
+    started = start_search_rebuild()
+    return {
+        "message": (
+            "Search index rebuild started"
+            if started
+            else "Search index rebuild already running"
+        ),
+        "started": started,
+    }
+
+
 @api_router.put("/admin-registration/{registration_id}/note/{note_id}")
 async def update_note(registration_id: str, note_id: str, note: NotesUpdate):
     """Update an existing note"""
@@ -3522,6 +4235,9 @@ async def update_note(registration_id: str, note_id: str, note: NotesUpdate):
             {"id": note_id, "registration_id": registration_id},
             {"$set": update_data},
         )
+        await record_write(
+            "notes_records", "update", [note_id], registration_id
+        )
 
         logger.info(
             f"Note {note_id} updated for registration ID: {registration_id}"
@@ -3557,6 +4273,9 @@ async def delete_note(registration_id: str, note_id: str):
 
         if result.deleted_count == 0:
             raise HTTPException(status_code=404, detail="Note not found")
+        await record_write(
+            "notes_records", "delete", [note_id], registration_id
+        )
 
         logger.info(
             f"Note {note_id} deleted for registration ID: {registration_id}"
@@ -3781,6 +4500,9 @@ async def save_interaction(
 
         # Save to database
         await db.interactions.insert_one(interaction_record.dict())
+        await record_write(
+            "interactions", "insert", [interaction_record.id], registration_id
+        )
 
         return {
             "message": "Interaction saved successfully",
@@ -3869,6 +4591,9 @@ async def update_interaction(
             {"id": interaction_id, "registration_id": registration_id},
             {"$set": update_data},
         )
+        await record_write(
+            "interactions", "update", [interaction_id], registration_id
+        )
 
         return {"message": "Interaction updated successfully"}
 
@@ -3909,6 +4634,9 @@ async def delete_interaction(registration_id: str, interaction_id: str):
         await db.interactions.delete_one(
             {"id": interaction_id, "registration_id": registration_id}
         )
+        await record_write(
+            "interactions", "delete", [interaction_id], registration_id
+        )
 
         return {"message": "Interaction deleted successfully"}
 
@@ -4094,20 +4822,28 @@ async def save_activity(registration_id: str, activity: ActivityCreate):
     try:
         # Check if registration exists
         registration = await db.admin_registrations.find_one(
-            {"id": registration_id}
+            {"id": registration_id}, {"_id": 0, "firstName": 1, "lastName": 1}
         )
         if not registration:
             raise HTTPException(
                 status_code=404, detail="Registration not found"
             )
 
-        # Create activity record
+        # Create activity record with the client name stored for search
         activity_record = ActivityRecord(
-            registration_id=registration_id, **activity.dict()
+            registration_id=registration_id,
+            **activity.dict(),
+            **activity_client_fields(
+                registration.get("firstName"), registration.get("lastName")
+            ),
+            description_tokens=tokenize(activity.description),
         )
 
         # Save to database
         await db.activities.insert_one(activity_record.dict())
+        await record_write(
+            "activities", "insert", [activity_record.id], registration_id
+        )
 
         return {
             "message": "Activity saved successfully",
@@ -4189,12 +4925,17 @@ async def update_activity(
         update_data = {
             k: v for k, v in activity.dict().items() if v is not None
         }
+        if activity.description is not None:
+            update_data["description_tokens"] = tokenize(activity.description)
         update_data["updated_at"] = datetime.now(pytz.timezone("US/Eastern"))
 
         await db.activities.update_one(
             {"id": activity_id, "registration_id": registration_id},
             {"$set": update_data},
         )
+        await record_write(
+            "activities", "update", [activity_id], registration_id
+        )
 
         return {"message": "Activity updated successfully"}
 
@@ -4233,6 +4974,9 @@ async def delete_activity(registration_id: str, activity_id: str):
         await db.activities.delete_one(
             {"id": activity_id, "registration_id": registration_id}
         )
+        await record_write(
+            "activities", "delete", [activity_id], registration_id
+        )
 
         return {"message": "Activity deleted successfully"}
 
@@ -4245,58 +4989,109 @@ async def delete_activity(registration_id: str, activity_id: str):
         )
 
 
-@api_router.get("/admin-activities")
-async def get_all_activities():
-    """Get all activities across all registrations for admin dashboard"""
-    try:
-        # Get all activities and join with registration data
-        activities_cursor = db.activities.find({}).sort("created_at", -1)
-        activities = await activities_cursor.to_list(length=None)
+# Activities per cursor batch - each batch costs one registration lookup
+ACTIVITY_STREAM_BATCH_SIZE = 500
 
-        # Enrich activities with client information
-        enriched_activities = []
-        for activity in activities:
-            # Get registration data for this activity
-            registration = await db.admin_registrations.find_one(
-                {"id": activity["registration_id"]}
-            )
-            if registration:
-                enriched_activity = {
-                    "id": activity["id"],
-                    "registration_id": activity["registration_id"],
-                    "date": activity["date"],
-                    "time": activity.get("time", ""),
-                    "description": activity["description"],
-                    "created_at": activity["created_at"],
-                    "updated_at": activity.get("updated_at"),
-                    # Client information
-                    "client_name": f"{registration.get('firstName', '')} {registration.get('lastName', '')}".strip(),
-                    "client_first_name": registration.get("firstName", ""),
-                    "client_last_name": registration.get("lastName", ""),
-                    "client_phone": registration.get("phone1", ""),
-                    "client_email": registration.get("email", ""),
-                    # Activity status based on date/time
-                    "status": (
-                        "completed"
-                        if activity["date"]
-                        < datetime.now(
-                            pytz.timezone("America/Toronto")
-                        ).strftime("%Y-%m-%d")
-                        else "upcoming"
-                    ),
-                }
-                enriched_activities.append(enriched_activity)
 
-        return {"activities": enriched_activities}
+@api_router.get("/admin-activities")
+async def get_all_activities(format: str = "json"):
+    """Get all activities across all registrations for admin dashboard
+
+    Streams the response in batches so memory stays flat however many
+    activities exist. format=ndjson emits one activity per line instead
+    of the {"activities": [...]} document."""
+    ndjson = format == "ndjson"
+    today = datetime.now(pytz.timezone("America/Toronto")).strftime(
+        "%Y-%m-%d"
+    )
+
+    # Only the fields shown on the dashboard - never photos or attachments
+    registration_projection = {
+        "_id": 0,
+        "id": 1,
+        "firstName": 1,
+        "lastName": 1,
+        "phone1": 1,
+        "email": 1,
+    }
+
+    def enrich(activity, registration):
+        return {
+            "id": activity["id"],
+            "registration_id": activity["registration_id"],
+            "date": activity["date"],
+            "time": activity.get("time", ""),
+            "description": activity["description"],
+            "created_at": activity["created_at"],
+            "updated_at": activity.get("updated_at"),
+            # Client information
+            "client_name": f"{registration.get('firstName', '')} {registration.get('lastName', '')}".strip(),
+            "client_first_name": registration.get("firstName", ""),
+            "client_last_name": registration.get("lastName", ""),
+            "client_phone": registration.get("phone1", ""),
+            "client_email": registration.get("email", ""),
+            # Activity status based on date/time
+            "status": (
+                "completed" if activity["date"] < today else "upcoming"
+            ),
+        }
 
-    except HTTPException:
-        raise
-    except Exception as e:
-        logger.error(f"Error retrieving all activities: {str(e)}")
-        raise HTTPException(
-            status_code=500,
-            detail=f"Error retrieving all activities: {str(e)}",
+    async def join_batch(activities):
+        # One $in query per batch instead of one find_one per activity
+        registration_ids = list(
+            {activity["registration_id"] for activity in activities}
         )
+        registrations = {
+            registration["id"]: registration
+            async for registration in db.admin_registrations.find(
+                {"id": {"$in": registration_ids}}, registration_projection
+            )
+        }
+        return [
+            enrich(activity, registrations[activity["registration_id"]])
+            for activity in activities
+            if activity["registration_id"] in registrations
+        ]
+
+    async def enriched_batches():
+        cursor = (
+            db.activities.find({}, {"_id": 0})
+            .sort("created_at", -1)
+            .batch_size(ACTIVITY_STREAM_BATCH_SIZE)
+        )
+        batch = []
+        async for activity in cursor:
+            batch.append(activity)
+            if len(batch) >= ACTIVITY_STREAM_BATCH_SIZE:
+                yield await join_batch(batch)
+                batch = []
+        if batch:
+            yield await join_batch(batch)
+
+    async def stream():
+        first = True
+        if not ndjson:
+            yield '{"activities": ['
+        try:
+            async for enriched_activities in enriched_batches():
+                for enriched_activity in enriched_activities:
+                    line = json.dumps(enriched_activity, default=str)
+                    if ndjson:
+                        yield line + "\n"
+                    else:
+                        yield line if first else "," + line
+                    first = False
+        except Exception as e:
+            # Headers are already sent, so the error can only be logged
+            logger.error(f"Error retrieving all activities: {str(e)}")
+            raise
+        if not ndjson:
+            yield "]}"
+
+    return StreamingResponse(
+        stream(),
+        media_type="application/x-ndjson" if ndjson else "application/json",
+    )
 
 
 # Admin backup endpoint
@@ -4360,53 +5155,31 @@ async def verify_backup_integrity():
         )
 
 
+# Database diagnostics endpoints
+@api_router.get("/admin/diagnostics/mongo")
+async def get_mongo_diagnostics():
+    """Per-collection command latency, recent slow operations and sampled
+    explain plans recorded by the MongoDB command listener"""
+    return command_monitor.snapshot()
+
+
+@api_router.delete("/admin/diagnostics/mongo")
+async def reset_mongo_diagnostics():
+    """Clear the recorded command statistics"""
+    command_monitor.reset()
+    return {"message": "MongoDB diagnostics reset"}
+
+
 @api_router.delete("/admin-delete-all-data")
 async def delete_all_client_data():
     """Delete ALL client data from the system for testing purposes"""
     try:
         logging.info("Starting complete data deletion process...")
 
-        # Track deletion counts
-        deletion_counts = {}
-
-        # Delete all admin registrations
-        result = await db.admin_registrations.delete_many({})
-        deletion_counts["admin_registrations"] = result.deleted_count
-        logging.info(f"Deleted {result.deleted_count} admin registrations")
-
-        # Delete all legacy data if it exists
-        try:
-            result = await db.legacy_data.delete_many({})
-            deletion_counts["legacy_data"] = result.deleted_count
-            logging.info(f"Deleted {result.deleted_count} legacy data records")
-        except Exception as e:
-            logging.warning(f"Legacy data deletion (may not exist): {e}")
-            deletion_counts["legacy_data"] = 0
-
-        # Delete any other collections that might exist
-        collections_to_check = [
-            "activities",
-            "notes",
-            "medications",
-            "tests",
-            "interactions",
-            "dispensing",
-            "attachments",
-        ]
-
-        for collection_name in collections_to_check:
-            try:
-                collection = db[collection_name]
-                result = await collection.delete_many({})
-                deletion_counts[collection_name] = result.deleted_count
-                logging.info(
-                    f"Deleted {result.deleted_count} records from {collection_name}"
-                )
-            except Exception as e:
-                logging.warning(
-                    f"Collection {collection_name} deletion (may not exist): {e}"
-                )
-                deletion_counts[collection_name] = 0
+        # Drop and recreate the collections instead of deleting every document
+        deletion_counts = await drop_client_data()
+        for collection_name, count in deletion_counts.items():
+            logging.info(f"Deleted {count} records from {collection_name}")
 
         # Calculate total deletions
         total_deleted = sum(deletion_counts.values())
@@ -4694,11 +5467,28 @@ async def get_all_activities_optimized(
             elif status_filter == "completed":
                 activity_filter["date"] = {"$lt": current_date}
 
+        # Search runs on the client name and description words stored on
+        # each activity, so it filters before pagination and is reflected in
+        # total_count. Every search word must start a name or description
+        # word - anchored prefixes keep both on their indexes.
+        search_words = tokenize(search_term)[:10]
+        if search_words:
+            activity_filter["$and"] = []
+            for word in search_words:
+                prefix = {"$regex": f"^{re.escape(word)}"}
+                activity_filter["$and"].append(
+                    {
+                        "$or": [
+                            {"client_name_tokens": prefix},
+                            {"description_tokens": prefix},
+                        ]
+                    }
+                )
+
         skip = (page - 1) * page_size
         total_count = await db.activities.count_documents(activity_filter)
 
-        # OPTIMIZED: Use MongoDB aggregation pipeline to JOIN data efficiently
-        # This replaces the N+1 query problem with a single aggregation query
+        # Contact details are joined for the current page only
         pipeline = [
             {"$match": activity_filter},
             {"$sort": {"created_at": -1}},
@@ -4713,8 +5503,6 @@ async def get_all_activities_optimized(
                     "pipeline": [
                         {
                             "$project": {
-                                "firstName": 1,
-                                "lastName": 1,
                                 "phone1": 1,
                                 "email": 1,
                                 "disposition": 1,
@@ -4733,15 +5521,6 @@ async def get_all_activities_optimized(
             },
             {
                 "$addFields": {
-                    "client_name": {
-                        "$concat": [
-                            {"$ifNull": ["$registration_data.firstName", ""]},
-                            " ",
-                            {"$ifNull": ["$registration_data.lastName", ""]},
-                        ]
-                    },
-                    "client_first_name": "$registration_data.firstName",
-                    "client_last_name": "$registration_data.lastName",
                     "client_phone": "$registration_data.phone1",
                     "client_email": "$registration_data.email",
                     "client_disposition": "$registration_data.disposition",
@@ -4782,44 +5561,6 @@ async def get_all_activities_optimized(
             },
         ]
 
-        # Add search term filtering to the aggregation pipeline if provided
-        if search_term.strip():
-            search_lower = search_term.lower().strip()
-            # Add match stage for text searching after the lookup
-            pipeline.insert(
-                -1,
-                {
-                    "$match": {
-                        "$or": [
-                            {
-                                "description": {
-                                    "$regex": search_lower,
-                                    "$options": "i",
-                                }
-                            },
-                            {
-                                "client_name": {
-                                    "$regex": search_lower,
-                                    "$options": "i",
-                                }
-                            },
-                            {
-                                "client_first_name": {
-                                    "$regex": search_lower,
-                                    "$options": "i",
-                                }
-                            },
-                            {
-                                "client_last_name": {
-                                    "$regex": search_lower,
-                                    "$options": "i",
-                                }
-                            },
-                        ]
-                    }
-                },
-            )
-
         # Execute the optimized aggregation query
         enriched_activities = await db.activities.aggregate(pipeline).to_list(
             None
@@ -4877,22 +5618,6 @@ async def get_registration_photo(registration_id: str):
 async def revert_registration_to_pending(registration_id: str):
     """Revert a submitted registration back to pending status for corrections"""
     try:
-        # Find the registration
-        existing = await db.admin_registrations.find_one(
-            {"id": registration_id}
-        )
-        if not existing:
-            raise HTTPException(
-                status_code=404, detail="Registration not found"
-            )
-
-        # Check if it's currently submitted/completed
-        if existing.get("status") != "completed":
-            raise HTTPException(
-                status_code=400,
-                detail="Registration is not in completed status",
-            )
-
         # Update status back to pending and remove finalized timestamp
         update_data = {
             "status": "pending_review",
@@ -4900,18 +5625,31 @@ async def revert_registration_to_pending(registration_id: str):
                 pytz.timezone("America/Toronto")
             ).isoformat(),
         }
+        result = await db.admin_registrations.update_one(
+            {"id": registration_id, "status": "completed"},
+            {"$unset": {"finalized_at": ""}, "$set": update_data},
+        )
 
-        # Remove finalized timestamp if it exists
-        if "finalized_at" in existing:
-            await db.admin_registrations.update_one(
-                {"id": registration_id},
-                {"$unset": {"finalized_at": ""}, "$set": update_data},
+        if result.matched_count == 0:
+            exists = await db.admin_registrations.count_documents(
+                {"id": registration_id}, limit=1
             )
-        else:
-            await db.admin_registrations.update_one(
-                {"id": registration_id}, {"$set": update_data}
+            if not exists:
+                raise HTTPException(
+                    status_code=404, detail="Registration not found"
+                )
+            raise HTTPException(
+                status_code=400,
+                detail="Registration is not in completed status",
             )
 
+        await record_write(
+            "admin_registrations",
+            "revert",
+            [registration_id],
+            status="pending_review",
+        )
+
         logging.info(
             f"Registration {registration_id} reverted to pending status"
         )
@@ -4933,6 +5671,153 @@ async def revert_registration_to_pending(registration_id: str):
         )
 
 
+@api_router.post("/admin-registrations/revert-to-pending", response_model=dict)
+async def revert_registrations_to_pending(
+    request: BulkRegistrationStatusRequest,
+):
+    """Revert many completed registrations back to pending in one update"""
+    try:
+        registration_ids = list(dict.fromkeys(request.registration_ids))
+        updated_time = datetime.now(
+            pytz.timezone("America/Toronto")
+        ).isoformat()
+
+        results = await transition_registrations(
+            registration_ids,
+            "completed",
+            {
+                "$set": {"status": "pending_review", "updated_at": updated_time},
+                "$unset": {"finalized_at": ""},
+            },
+            ("updated_at", updated_time),
+        )
+        reverted_ids = [
+            result["registration_id"]
+            for result in results
+            if result["outcome"] == "updated"
+        ]
+        for result in results:
+            if result["outcome"] == "updated":
+                result["status"] = "pending_review"
+        reverted_count = len(reverted_ids)
+        if reverted_ids:
+            await record_write(
+                "admin_registrations",
+                "revert",
+                reverted_ids,
+                status="pending_review",
+            )
+
+        logging.info(
+            f"Bulk revert: {reverted_count}/{len(registration_ids)} reverted to pending"
+        )
+        return {
+            "message": f"{reverted_count} registrations reverted to pending",
+            "reverted_count": reverted_count,
+            "results": results,
+        }
+
+    except Exception as e:
+        logging.error(f"Bulk revert to pending failed: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail=f"Failed to revert registrations: {str(e)}"
+        )
+
+
+@api_router.get("/events")
+async def live_events():
+    """Server-sent stream of registration and activity changes, so
+    dashboards can patch what they show instead of refetching"""
+    queue = broker.subscribe()
+    return StreamingResponse(
+        stream_events(queue),
+        media_type="text/event-stream",
+        headers={
+            "Cache-Control": "no-cache",
+            # Stop nginx from buffering the stream
+            "X-Accel-Buffering": "no",
+        },
+    )
+
+
+@api_router.get("/registration-rollups")
+async def get_registration_rollups(
+    group_by: str = "day",
+    date_level: str = "month",
+    referralSite: str = "",
+    disposition: str = "",
+    physician: str = "",
+    testType: str = "",
+    status: str = "",
+    province: str = "",
+    from_date: str = "",
+    to_date: str = "",
+    limit: int = 1000,
+):
+    """Registration counts cross-tabbed by any of day, referralSite,
+    disposition, physician, testType, status and province (comma-separated
+    group_by), with day rolled up to day, month or year. The other
+    parameters slice the cube - each takes comma-separated values."""
+    try:
+        dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+        unknown = set(dimensions) - set(ROLLUP_DIMENSIONS)
+        if unknown:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Unknown dimension: {', '.join(sorted(unknown))}",
+            )
+        if date_level not in ROLLUP_DATE_LEVELS:
+            raise HTTPException(
+                status_code=400,
+                detail="date_level must be day, month or year",
+            )
+
+        slice_params = {
+            "referralSite": referralSite,
+            "disposition": disposition,
+            "physician": physician,
+            "testType": testType,
+            "status": status,
+            "province": province,
+        }
+        slices = {
+            dimension: [v.strip() for v in values.split(",") if v.strip()]
+            for dimension, values in slice_params.items()
+            if values.strip()
+        }
+
+        return await query_rollups(
+            dimensions,
+            date_level=date_level,
+            slices=slices,
+            from_date=from_date or None,
+            to_date=to_date or None,
+            limit=max(1, min(limit, 5000)),
+        )
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logging.error(f"Error querying registration rollups: {str(e)}")
+        raise HTTPException(
+            status_code=500, detail="Failed to query registration rollups"
+        )
+
+
+@api_router.post("/registration-rollups/rebuild")
+async def rebuild_registration_rollups():
+    """Recount the registration rollups from scratch in the background"""
+    started = start_rollup_rebuild()
+    return {
+        "message": (
+            "Rollup rebuild started"
+            if started
+            else "Rollup rebuild already running"
+        ),
+        "started": started,
+    }
+
+
 @api_router.get("/admin-dashboard-stats")
 async def get_dashboard_stats():
     """Get dashboard statistics efficiently with single queries"""
@@ -4,7 +4,7 @@ from pydantic import (
     EmailStr,
     validator,
 )
-from typing import List, Optional
+from typing import List, Literal, Optional
 import uuid
 from datetime import datetime, date
 import pytz
@@ -238,6 +238,77 @@ class AdminRegistrationCreate(BaseModel):
     hivTester: Optional[str] = Field(default="CM")  # HIV tester initials
 
 
+class AdminRegistrationPatch(BaseModel):
+    """Sparse registration update - only the fields sent are applied, a
+    null clears the field"""
+
+    firstName: Optional[str] = Field(None, min_length=1, max_length=100)
+    lastName: Optional[str] = Field(None, min_length=1, max_length=100)
+    dob: Optional[date] = None
+    patientConsent: Optional[str] = None
+    gender: Optional[str] = None
+    province: Optional[str] = None
+    disposition: Optional[str] = None
+    aka: Optional[str] = None
+    age: Optional[str] = None
+    regDate: Optional[date] = None
+    healthCard: Optional[str] = None
+    healthCardVersion: Optional[str] = None
+    referralSite: Optional[str] = None
+    address: Optional[str] = None
+    unitNumber: Optional[str] = None
+    city: Optional[str] = None
+    postalCode: Optional[str] = None
+    phone1: Optional[str] = None
+    phone2: Optional[str] = None
+    ext1: Optional[str] = None
+    ext2: Optional[str] = None
+    leaveMessage: Optional[bool] = None
+    voicemail: Optional[bool] = None
+    text: Optional[bool] = None
+    preferredTime: Optional[str] = None
+    email: Optional[EmailStr] = None
+    language: Optional[str] = None
+    specialAttention: Optional[str] = None
+    instructions: Optional[str] = None
+    photo: Optional[str] = None
+    summaryTemplate: Optional[str] = None
+    selectedTemplate: Optional[str] = None
+    physician: Optional[str] = None
+    rnaAvailable: Optional[str] = None
+    rnaSampleDate: Optional[str] = None
+    rnaResult: Optional[str] = None
+    coverageType: Optional[str] = None
+    testType: Optional[str] = None
+    hivDate: Optional[str] = None
+    hivResult: Optional[str] = None
+    hivType: Optional[str] = None
+    hivTester: Optional[str] = None
+    # Version the client last saw - a mismatch means someone else saved
+    version: Optional[int] = None
+
+
+class BulkRegistrationStatusRequest(BaseModel):
+    registration_ids: List[str] = Field(..., min_length=1, max_length=500)
+
+
+class TemplateRenderRequest(BaseModel):
+    template_id: str
+    template_type: Literal["clinical", "notes"] = "clinical"
+    registration_ids: List[str] = Field(..., min_length=1, max_length=500)
+
+# Registration fields a patch may change but never clear
+REQUIRED_REGISTRATION_FIELDS = {
+    "firstName",
+    "lastName",
+    "patientConsent",
+    "leaveMessage",
+    "voicemail",
+    "text",
+    "language",
+}
+
+
 # 2FA Models
 class AdminUser(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
@@ -628,6 +699,13 @@ class ActivityRecord(BaseModel):
     date: str = Field(..., description="Activity date - defaults to today")
     time: Optional[str] = None
     description: str = Field(..., description="Activity description")
+    # Denormalized from the registration for index-backed search
+    client_first_name: Optional[str] = None
+    client_last_name: Optional[str] = None
+    client_name: Optional[str] = None
+    client_name_key: Optional[str] = None
+    client_name_tokens: List[str] = []
+    description_tokens: List[str] = []
     created_at: str = Field(
         default_factory=lambda: datetime.utcnow()
         .replace(tzinfo=pytz.UTC)
@@ -690,11 +768,58 @@ class ClaudeChatResponse(BaseModel):
 
 
 # Excel Upload Models
-class ExcelUploadResponse(BaseModel):
-    message: str
-    records_count: int
-    preview: List[dict]
+class LegacyUploadJob(BaseModel):
+    job_id: str
     upload_id: str
+    filename: str
+    status: Literal["queued", "running", "completed", "failed"]
+    percent: int
+    rows_written: int
+    records_count: Optional[int] = None
+    preview: List[dict]
+    message: str
+    error: Optional[str] = None
+
+
+class LegacyQueryFilter(BaseModel):
+    column: str
+    op: Literal[
+        "eq",
+        "ne",
+        "in",
+        "not_in",
+        "gt",
+        "gte",
+        "lt",
+        "lte",
+        "between",
+        "contains",
+        "blank",
+        "not_blank",
+    ] = "eq"
+    value: Optional[object] = None
+
+
+class LegacyQueryAggregate(BaseModel):
+    op: Literal["count", "sum", "mean", "min", "max"] = "count"
+    column: Optional[str] = None  # Not needed for count
+    name: Optional[str] = None  # Output column, e.g. "mean_Age"
+
+
+class LegacyDateBucket(BaseModel):
+    column: str
+    unit: Literal["day", "week", "month", "quarter", "year"] = "month"
+
+
+class LegacyQuery(BaseModel):
+    filters: List[LegacyQueryFilter] = []
+    group_by: List[str] = []
+    date_bucket: Optional[LegacyDateBucket] = None
+    aggregates: List[LegacyQueryAggregate] = []
+    columns: List[str] = []  # Row queries only - all columns when empty
+    order_by: Optional[str] = None
+    descending: bool = True
+    top: int = Field(default=100, ge=1, le=1000)
 
 
 class DataSummaryResponse(BaseModel):
@@ -709,6 +834,7 @@ class ClinicalTemplate(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str  # Template name (e.g., "Positive", "Negative - Pipes")
     content: str  # Template content
+    syntax: Literal["text", "jinja"] = "text"  # jinja opts in to placeholders
     is_default: bool = Field(
         default=False
     )  # Whether this is a default template
@@ -719,12 +845,14 @@ class ClinicalTemplate(BaseModel):
 class ClinicalTemplateCreate(BaseModel):
     name: str
     content: str
+    syntax: Literal["text", "jinja"] = "text"  # jinja opts in to placeholders
     is_default: bool = Field(default=False)
 
 
 class ClinicalTemplateUpdate(BaseModel):
     name: Optional[str] = None
     content: Optional[str] = None
+    syntax: Optional[Literal["text", "jinja"]] = None
     is_default: Optional[bool] = None
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -734,6 +862,7 @@ class NotesTemplate(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str  # Template name (e.g., "Consultation", "Lab", "Prescription")
     content: str  # Template content
+    syntax: Literal["text", "jinja"] = "text"  # jinja opts in to placeholders
     is_default: bool = Field(
         default=False
     )  # Whether this is a default template
@@ -744,12 +873,14 @@ class NotesTemplate(BaseModel):
 class NotesTemplateCreate(BaseModel):
     name: str
     content: str
+    syntax: Literal["text", "jinja"] = "text"  # jinja opts in to placeholders
     is_default: bool = Field(default=False)
 
 
 class NotesTemplateUpdate(BaseModel):
     name: Optional[str] = None
     content: Optional[str] = None
+    syntax: Optional[Literal["text", "jinja"]] = None
     is_default: Optional[bool] = None
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
@@ -812,6 +943,7 @@ class ReferralSiteUpdate(BaseModel):
 class ShareAttachmentRequest(BaseModel):
     attachment_data: dict
     expires_in_minutes: int = 30
+    registration_id: Optional[str] = None
 
 
 class ShareAttachmentResponse(BaseModel):
@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import re
+import unicodedata
+from datetime import datetime
+from pymongo import DeleteMany, ReplaceOne
+
+from app.database import db
+from app.hooks import CLIENT_COLLECTION, register_write_hook
+
+
+SEARCH_COLLECTION = "search_documents"
+
+# Source collection -> search document type
+SEARCH_TYPES = {
+    CLIENT_COLLECTION: "client",
+    "notes_records": "note",
+    "activities": "activity",
+    "interactions": "interaction",
+    "test_records": "test",
+}
+
+# A client record itself outranks a note that mentions the same words
+TYPE_WEIGHTS = {"client": 3}
+
+# Only what the search documents are built from - never photos or
+# attachments
+SOURCE_PROJECTIONS = {
+    CLIENT_COLLECTION: {
+        "_id": 0,
+        "id": 1,
+        "firstName": 1,
+        "lastName": 1,
+        "aka": 1,
+        "dob": 1,
+        "healthCard": 1,
+        "phone1": 1,
+        "phone2": 1,
+        "email": 1,
+        "city": 1,
+        "postalCode": 1,
+        "regDate": 1,
+        "status": 1,
+    },
+    "notes_records": {
+        "_id": 0,
+        "id": 1,
+        "registration_id": 1,
+        "noteDate": 1,
+        "noteText": 1,
+        "templateType": 1,
+    },
+    "activities": {
+        "_id": 0,
+        "id": 1,
+        "registration_id": 1,
+        "date": 1,
+        "description": 1,
+    },
+    "interactions": {
+        "_id": 0,
+        "id": 1,
+        "registration_id": 1,
+        "date": 1,
+        "description": 1,
+        "referral_id": 1,
+        "payment_type": 1,
+    },
+    "test_records": {
+        "_id": 0,
+        "id": 1,
+        "registration_id": 1,
+        "test_type": 1,
+        "test_date": 1,
+        "hiv_result": 1,
+        "hcv_result": 1,
+        "bloodwork_result": 1,
+    },
+}
+
+# Long notes keep their first distinct words only
+MAX_TOKENS = 300
+SUMMARY_LENGTH = 120
+MATCHES_PER_CLIENT = 5
+REBUILD_BATCH_SIZE = 500
+
+# The running full rebuild, if any
+_rebuild_task = None
+
+
+def tokenize(*values) -> list:
+    """Distinct lowercase, accent-free word tokens in first-seen order"""
+    tokens = {}
+    for value in values:
+        if not value:
+            continue
+        text = unicodedata.normalize("NFKD", str(value))
+        text = text.encode("ascii", "ignore").decode().lower()
+        for token in re.findall(r"[a-z0-9]+", text):
+            tokens.setdefault(token, None)
+    return list(tokens)[:MAX_TOKENS]
+
+
+def _compact(value) -> str:
+    """Phone numbers, health cards and postal codes as one token, so
+    "416-555-0199" is found by "4165550199" too"""
+    return re.sub(r"[^a-z0-9]", "", str(value or "").lower())
+
+
+def _summary(text) -> str:
+    text = " ".join(str(text or "").split())
+    if len(text) > SUMMARY_LENGTH:
+        return text[:SUMMARY_LENGTH].rsplit(" ", 1)[0] + "…"
+    return text
+
+
+def build_search_document(collection: str, source: dict) -> dict:
+    """The compact search entry for one source document"""
+    doc_type = SEARCH_TYPES[collection]
+
+    if doc_type == "client":
+        registration_id = source["id"]
+        title = f"{source.get('firstName') or ''} {source.get('lastName') or ''}"
+        summary = " · ".join(
+            part
+            for part in (
+                f"DOB {source['dob']}" if source.get("dob") else "",
+                source.get("city") or "",
+                source.get("status") or "",
+            )
+            if part
+        )
+        date = source.get("regDate")
+        compact = [
+            _compact(source.get(field))
+            for field in ("healthCard", "phone1", "phone2", "postalCode")
+        ]
+        tokens = tokenize(
+            source.get("firstName"),
+            source.get("lastName"),
+            source.get("aka"),
+            source.get("email"),
+            source.get("city"),
+            source.get("dob"),
+            source.get("healthCard"),
+            source.get("phone1"),
+            source.get("phone2"),
+            *compact,
+        )
+    else:
+        registration_id = source.get("registration_id")
+        if doc_type == "note":
+            title = source.get("templateType") or "Note"
+            summary = _summary(source.get("noteText"))
+            date = source.get("noteDate")
+            tokens = tokenize(source.get("templateType"), source.get("noteText"))
+        elif doc_type == "test":
+            results = [
+                f"{name} {source[field]}"
+                for name, field in (
+                    ("HIV", "hiv_result"),
+                    ("HCV", "hcv_result"),
+                    ("Bloodwork", "bloodwork_result"),
+                )
+                if source.get(field)
+            ]
+            title = f"{source.get('test_type') or ''} test".strip()
+            summary = ", ".join(results)
+            date = source.get("test_date")
+            tokens = tokenize(source.get("test_type"), *results)
+        else:
+            title = source.get("description") or doc_type.title()
+            summary = _summary(
+                " ".join(
+                    str(source.get(field) or "")
+                    for field in ("description", "referral_id", "payment_type")
+                )
+            )
+            date = source.get("date")
+            tokens = tokenize(
+                source.get("description"),
+                source.get("referral_id"),
+                source.get("payment_type"),
+            )
+
+    return {
+        "_id": f"{doc_type}:{source['id']}",
+        "type": doc_type,
+        "ref_id": source["id"],
+        "registration_id": registration_id,
+        "title": title.strip(),
+        "summary": summary,
+        "date": date,
+        "tokens": tokens,
+        "indexed_at": datetime.utcnow(),
+    }
+
+
+async def create_search_indexes():
+    await db[SEARCH_COLLECTION].create_index("tokens")
+    await db[SEARCH_COLLECTION].create_index("registration_id")
+    await db[SEARCH_COLLECTION].create_index("indexed_at")
+
+
+async def index_documents(collection: str, ids: list):
+    """Re-index source documents by id, dropping entries whose source is
+    gone"""
+    doc_type = SEARCH_TYPES[collection]
+    sources = await db[collection].find(
+        {"id": {"$in": list(ids)}}, SOURCE_PROJECTIONS[collection]
+    ).to_list(None)
+    found = {source["id"] for source in sources}
+
+    operations = [
+        ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+        for document in (
+            build_search_document(collection, source) for source in sources
+        )
+    ]
+    missing = [f"{doc_type}:{doc_id}" for doc_id in ids if doc_id not in found]
+    if missing:
+        operations.append(DeleteMany({"_id": {"$in": missing}}))
+    if operations:
+        await db[SEARCH_COLLECTION].bulk_write(operations, ordered=False)
+
+
+async def index_write(event: dict):
+    """Write hook keeping search documents in step with their sources"""
+    collection = event["collection"]
+    if collection not in SEARCH_TYPES:
+        return
+    search_documents = db[SEARCH_COLLECTION]
+
+    if event["operation"] == "drop":
+        await search_documents.delete_many({})
+    elif event["operation"] == "delete":
+        if collection == CLIENT_COLLECTION:
+            # A deleted client takes all of its records with it
+            await search_documents.delete_many(
+                {"registration_id": {"$in": event["ids"]}}
+            )
+        else:
+            doc_type = SEARCH_TYPES[collection]
+            await search_documents.delete_many(
+                {"_id": {"$in": [f"{doc_type}:{i}" for i in event["ids"]]}}
+            )
+    else:
+        await index_documents(collection, event["ids"])
+
+
+register_write_hook(index_write)
+
+
+async def rebuild_search_index() -> dict:
+    """Rebuild every search document from the source collections"""
+    started_at = datetime.utcnow()
+    await create_search_indexes()
+    counts = {}
+    for collection, projection in SOURCE_PROJECTIONS.items():
+        counts[collection] = 0
+        batch = []
+        async for source in db[collection].find(
+            {"id": {"$exists": True}}, projection
+        ).batch_size(REBUILD_BATCH_SIZE):
+            document = build_search_document(collection, source)
+            batch.append(
+                ReplaceOne({"_id": document["_id"]}, document, upsert=True)
+            )
+            if len(batch) == REBUILD_BATCH_SIZE:
+                await db[SEARCH_COLLECTION].bulk_write(batch, ordered=False)
+                counts[collection] += len(batch)
+                batch = []
+        if batch:
+            await db[SEARCH_COLLECTION].bulk_write(batch, ordered=False)
+            counts[collection] += len(batch)
+
+    # Anything not touched by this rebuild has no source any more
+    stale = await db[SEARCH_COLLECTION].delete_many(
+        {"indexed_at": {"$lt": started_at}}
+    )
+    counts["removed"] = stale.deleted_count
+    logging.info(f"🔎 Search index rebuilt: {counts}")
+    return counts
+
+
+def start_rebuild() -> bool:
+    """Run a full rebuild in the background unless one is running"""
+    global _rebuild_task
+    if _rebuild_task is not None and not _rebuild_task.done():
+        return False
+    _rebuild_task = asyncio.create_task(rebuild_search_index())
+    return True
+
+
+async def ensure_search_index():
+    """Build the search index at startup when it is missing or its clients
+    do not match the registrations (e.g. after a restore)"""
+    await create_search_indexes()
+    indexed_clients = await db[SEARCH_COLLECTION].count_documents(
+        {"type": "client"}
+    )
+    clients = await db[CLIENT_COLLECTION].count_documents({})
+    if indexed_clients != clients:
+        await rebuild_search_index()
+
+
+def search_match(terms: list, types: list = None) -> dict:
+    """Search documents with a token starting with every term"""
+    match = {
+        "$and": [
+            {"tokens": {"$regex": f"^{re.escape(term)}"}} for term in terms
+        ]
+    }
+    if types:
+        match["type"] = {"$in": types}
+    return match
+
+
+async def search(
+    query: str, page: int = 1, page_size: int = 20, types: list = None
+) -> dict:
+    """Clients with records matching every query word, best first, each
+    with its best matching records. Query words match token prefixes."""
+    terms = tokenize(query)[:10]
+    match = search_match(terms, types)
+
+    type_weight = {
+        "$switch": {
+            "branches": [
+                {"case": {"$eq": ["$type", doc_type]}, "then": weight}
+                for doc_type, weight in TYPE_WEIGHTS.items()
+            ],
+            "default": 1,
+        }
+    }
+    # Whole-word matches count double over prefix matches
+    exact_matches = {
+        "$size": {
+            "$filter": {"input": "$tokens", "cond": {"$in": ["$$this", terms]}}
+        }
+    }
+
+    pipeline = [
+        {"$match": match},
+        {
+            "$project": {
+                "_id": 0,
+                "type": 1,
+                "ref_id": 1,
+                "registration_id": 1,
+                "title": 1,
+                "summary": 1,
+                "date": 1,
+                "score": {
+                    "$add": [type_weight, {"$multiply": [exact_matches, 2]}]
+                },
+            }
+        },
+        {"$sort": {"score": -1, "date": -1}},
+        {
+            "$group": {
+                "_id": "$registration_id",
+                "score": {"$max": "$score"},
+                "match_count": {"$sum": 1},
+                "matches": {
+                    "$push": {
+                        "type": "$type",
+                        "id": "$ref_id",
+                        "title": "$title",
+                        "summary": "$summary",
+                        "date": "$date",
+                    }
+                },
+            }
+        },
+        {"$sort": {"score": -1, "match_count": -1, "_id": 1}},
+        {
+            "$facet": {
+                "total": [{"$count": "count"}],
+                "clients": [
+                    {"$skip": (page - 1) * page_size},
+                    {"$limit": page_size},
+                    {
+                        "$project": {
+                            "score": 1,
+                            "match_count": 1,
+                            "matches": {
+                                "$slice": ["$matches", MATCHES_PER_CLIENT]
+                            },
+                        }
+                    },
+                ],
+            }
+        },
+    ]
+    facets = await db[SEARCH_COLLECTION].aggregate(
+        pipeline, allowDiskUse=True
+    ).to_list(1)
+    total = facets[0]["total"][0]["count"] if facets[0]["total"] else 0
+    groups = facets[0]["clients"]
+
+    # Names for the page of clients in one query
+    clients = {
+        client["id"]: client
+        async for client in db[CLIENT_COLLECTION].find(
+            {"id": {"$in": [group["_id"] for group in groups]}},
+            {"_id": 0, "id": 1, "firstName": 1, "lastName": 1, "dob": 1, "status": 1},
+        )
+    }
+
+    results = []
+    for group in groups:
+        client = clients.get(group["_id"], {})
+        results.append(
+            {
+                "registration_id": group["_id"],
+                "client_name": f"{client.get('firstName') or ''} {client.get('lastName') or ''}".strip(),
+                "dob": client.get("dob"),
+                "status": client.get("status"),
+                "score": group["score"],
+                "match_count": group["match_count"],
+                "matches": group["matches"],
+            }
+        )
+
+    return {
+        "query": query,
+        "total_clients": total,
+        "page": page,
+        "page_size": page_size,
+        "total_pages": (total + page_size - 1) // page_size,
+        "clients": results,
+    }
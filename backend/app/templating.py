@@ -0,0 +1,226 @@
+import hashlib
+import logging
+import re
+from datetime import date
+from cachetools import LRUCache
+from jinja2 import TemplateError, meta
+from jinja2.sandbox import SandboxedEnvironment
+
+
+# Client fields a template may reference, by type. Dates are parsed from
+# the stored ISO strings so templates can format them.
+CLIENT_FIELD_TYPES = {
+    "firstName": "str",
+    "lastName": "str",
+    "aka": "str",
+    "age": "str",
+    "gender": "str",
+    "language": "str",
+    "address": "str",
+    "unitNumber": "str",
+    "city": "str",
+    "province": "str",
+    "postalCode": "str",
+    "phone1": "str",
+    "phone2": "str",
+    "email": "str",
+    "healthCard": "str",
+    "healthCardVersion": "str",
+    "disposition": "str",
+    "referralSite": "str",
+    "physician": "str",
+    "coverageType": "str",
+    "testType": "str",
+    "rnaAvailable": "str",
+    "rnaResult": "str",
+    "hivResult": "str",
+    "hivType": "str",
+    "hivTester": "str",
+    "specialAttention": "str",
+    "instructions": "str",
+    "dob": "date",
+    "regDate": "date",
+    "rnaSampleDate": "date",
+    "hivDate": "date",
+    "leaveMessage": "bool",
+    "voicemail": "bool",
+    "text": "bool",
+}
+
+# Convenience values computed from the client fields
+DERIVED_FIELDS = {
+    "full_name",
+    "has_address",
+    "has_phone",
+    "rna_available",
+    "rna_positive",
+    "today",
+}
+
+# Projection for loading only what templates can use
+CLIENT_FIELD_PROJECTION = {
+    "_id": 0,
+    "id": 1,
+    "phone": 1,
+    **{field: 1 for field in CLIENT_FIELD_TYPES},
+}
+
+# The positive template predates the engine and carries this fixed
+# sentence - it is compiled into the equivalent conditional
+LEGACY_CONTACT_SENTENCE = "Client does have a valid address and has also provided a phone number for results."
+LEGACY_CONTACT_SOURCE = (
+    "{% if has_address and has_phone %}"
+    "Client does have a valid address and has also provided a phone number for results."
+    "{% elif has_address %}"
+    "Client does have a valid address but no phone number for results."
+    "{% elif has_phone %}"
+    "Client does not have a valid address but has provided a phone number for results."
+    "{% else %}"
+    "Client does not have a valid address or phone number for results."
+    "{% endif %}"
+)
+
+# Compiled templates keyed on (template id, updated_at), or on a content
+# hash for ad-hoc content - a saved edit changes updated_at and so the key
+compiled_templates = LRUCache(maxsize=256)
+
+
+def _format_date(value, fmt="%Y-%m-%d"):
+    if isinstance(value, date):
+        return value.strftime(fmt)
+    return value or ""
+
+
+def _format_phone(value):
+    digits = re.sub(r"\D", "", value or "")
+    if len(digits) == 11 and digits.startswith("1"):
+        digits = digits[1:]
+    if len(digits) == 10:
+        return f"({digits[:3]}) {digits[3:6]}-{digits[6:]}"
+    return value or ""
+
+
+def _yesno(value, choices="Yes,No"):
+    yes, no = choices.split(",", 1)
+    return yes if value else no
+
+
+environment = SandboxedEnvironment(
+    keep_trailing_newline=True, trim_blocks=True, lstrip_blocks=True
+)
+environment.filters.update(
+    {"date": _format_date, "phone": _format_phone, "yesno": _yesno}
+)
+
+
+def _to_source(content: str) -> str:
+    return content.replace(LEGACY_CONTACT_SENTENCE, LEGACY_CONTACT_SOURCE)
+
+
+def validate_template(content: str, syntax: str = "text") -> list:
+    """Problems that would stop a template from rendering - syntax errors
+    and placeholders that are not client fields"""
+    if syntax != "jinja":
+        return []
+    try:
+        parsed = environment.parse(_to_source(content or ""))
+    except TemplateError as e:
+        return [f"Template syntax error: {e}"]
+    unknown = meta.find_undeclared_variables(parsed) - (
+        set(CLIENT_FIELD_TYPES) | DERIVED_FIELDS
+    )
+    return [f"Unknown placeholder: {name}" for name in sorted(unknown)]
+
+
+def get_compiled(content: str, template_id: str = None, updated_at=None):
+    if template_id:
+        key = (template_id, str(updated_at))
+    else:
+        key = ("content", hashlib.sha1(content.encode()).hexdigest())
+    compiled = compiled_templates.get(key)
+    if compiled is None:
+        compiled = environment.from_string(_to_source(content))
+        compiled_templates[key] = compiled
+    return compiled
+
+
+def _parse_date(value):
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10]) if value else None
+    except ValueError:
+        return None
+
+
+def build_context(registration_data: dict) -> dict:
+    """Typed template variables for one client"""
+    context = {}
+    for field, field_type in CLIENT_FIELD_TYPES.items():
+        value = registration_data.get(field)
+        if field_type == "date":
+            context[field] = _parse_date(value)
+        elif field_type == "bool":
+            context[field] = bool(value)
+        else:
+            context[field] = str(value).strip() if value is not None else ""
+
+    phone = context["phone1"] or str(registration_data.get("phone") or "").strip()
+    context.update(
+        {
+            "full_name": f"{context['firstName']} {context['lastName']}".strip(),
+            "has_address": bool(context["address"]),
+            "has_phone": bool(phone),
+            "rna_available": context["rnaAvailable"].lower() == "yes",
+            "rna_positive": context["rnaResult"].lower() == "positive",
+            "today": date.today(),
+        }
+    )
+    return context
+
+
+def render_template(
+    content: str,
+    registration_data: dict,
+    template_id: str = None,
+    updated_at=None,
+    syntax: str = "text",
+) -> str:
+    """Render template content for one client. Content that does not
+    compile is returned unchanged.
+
+    Templates are plain text unless they opt in to the "jinja" syntax -
+    plain text keeps any braces as typed and only adapts the legacy
+    contact sentence."""
+    if not content:
+        return content
+    if syntax != "jinja":
+        # Only the fixed contact sentence adapts to the client
+        if LEGACY_CONTACT_SENTENCE not in content:
+            return content
+        sentence = get_compiled(LEGACY_CONTACT_SOURCE).render(
+            build_context(registration_data)
+        )
+        return content.replace(LEGACY_CONTACT_SENTENCE, sentence)
+    try:
+        compiled = get_compiled(content, template_id, updated_at)
+        return compiled.render(build_context(registration_data))
+    except TemplateError as e:
+        logging.warning(
+            f"Template {template_id or '<inline>'} failed to render: {e}"
+        )
+        return content
+
+
+def render_many(
+    content: str,
+    registrations: list,
+    template_id: str = None,
+    updated_at=None,
+    syntax: str = "text",
+) -> list:
+    """Render one template for many clients, compiling it once"""
+    return [
+        render_template(content, registration, template_id, updated_at, syntax)
+        for registration in registrations
+    ]
@@ -1,5 +1,6 @@
 import asyncio
 import logging
+import re
 import smtplib
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
@@ -8,9 +9,6 @@ from email import encoders
 import base64
 import subprocess
 from pathlib import Path
-import plotly.graph_objects as go
-from plotly.subplots import make_subplots
-from scipy import stats
 from datetime import datetime, date
 from collections import defaultdict
 
@@ -46,26 +44,11 @@ def verify_production_protection():
             return False
 
 
-def send_registration_email(registration_data):
-    """Send registration details to support email"""
-    try:
-        # Email configuration
-        smtp_server = settings.smtp_server
-        smtp_port = settings.smtp_port
-        smtp_username = settings.smtp_username
-        smtp_password = settings.smtp_password
-        support_email = settings.support_email
+def build_registration_email(registration_data: dict) -> tuple:
+    """Subject and body for a public testing registration"""
+    subject = "New Testing Registration - my420.ca"
 
-        # CRITICAL: Log the email address being used for debugging
-        logging.error(
-            f"🚨 CLIENT REGISTRATION EMAIL - Sending to: {support_email}"
-        )
-
-        # Create email content
-        subject = "New Testing Registration - my420.ca"
-
-        # Email body
-        body = f"""
+    body = f"""
 New Registration for Hepatitis C and HIV Testing
 
 Registration Details:
@@ -83,35 +66,56 @@ Please contact this individual to schedule their testing appointment.
 This registration was submitted through my420.ca
         """
 
-        # Create message
-        msg = MIMEMultipart()
-        msg["From"] = smtp_username or support_email
-        msg["To"] = support_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
+    return subject, body
 
-        # Send email (only if SMTP credentials are configured)
-        if smtp_username and smtp_password:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            text = msg.as_string()
-            server.sendmail(smtp_username, support_email, text)
-            server.quit()
-            logging.info(
-                f"Registration email sent successfully to {support_email}"
-            )
-            return True
-        else:
-            # Log the registration for development/testing
-            logging.info(
-                f"Registration email would be sent to {support_email}: {body}"
-            )
-            return True
 
-    except Exception as e:
-        logging.error(f"Failed to send registration email: {str(e)}")
-        return False
+def attach_photo(
+    msg: MIMEMultipart, photo_base64: str, filename: str = "client_photo.jpg"
+):
+    """Attach a base64 (optionally data: URL) photo to a message"""
+    try:
+        # Decode base64 image
+        if photo_base64.startswith("data:"):
+            # Remove data:image/xxx;base64, prefix
+            photo_base64 = photo_base64.split(",")[1]
+
+        photo_data = base64.b64decode(photo_base64)
+
+        # Create attachment
+        attachment = MIMEBase("application", "octet-stream")
+        attachment.set_payload(photo_data)
+        encoders.encode_base64(attachment)
+        attachment.add_header(
+            "Content-Disposition",
+            f'attachment; filename="{filename}"',
+        )
+        msg.attach(attachment)
+        logging.info("Photo attachment added to email")
+    except Exception as photo_error:
+        logging.error(f"Error adding photo attachment: {str(photo_error)}")
+
+
+def build_email_message(
+    to_email: str,
+    subject: str,
+    body: str,
+    photo_base64: str = None,
+    reply_to: str = None,
+) -> MIMEMultipart:
+    """Build a plain text email with an optional photo attachment"""
+    msg = MIMEMultipart()
+    msg["From"] = settings.smtp_username or to_email
+    msg["To"] = to_email
+    if reply_to:
+        msg["Reply-To"] = reply_to
+    msg["Subject"] = subject
+    msg.attach(MIMEText(body, "plain"))
+
+    # Add photo attachment if provided
+    if photo_base64:
+        attach_photo(msg, photo_base64)
+
+    return msg
 
 
 async def send_email(
@@ -124,37 +128,7 @@ async def send_email(
         smtp_username = settings.smtp_username
         smtp_password = settings.smtp_password
 
-        # Create message
-        msg = MIMEMultipart()
-        msg["From"] = smtp_username or to_email
-        msg["To"] = to_email
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        # Add photo attachment if provided
-        if photo_base64:
-            try:
-                # Decode base64 image
-                if photo_base64.startswith("data:"):
-                    # Remove data:image/xxx;base64, prefix
-                    photo_base64 = photo_base64.split(",")[1]
-
-                photo_data = base64.b64decode(photo_base64)
-
-                # Create attachment
-                attachment = MIMEBase("application", "octet-stream")
-                attachment.set_payload(photo_data)
-                encoders.encode_base64(attachment)
-                attachment.add_header(
-                    "Content-Disposition",
-                    'attachment; filename="client_photo.jpg"',
-                )
-                msg.attach(attachment)
-                logging.info("Photo attachment added to email")
-            except Exception as photo_error:
-                logging.error(
-                    f"Error adding photo attachment: {str(photo_error)}"
-                )
+        msg = build_email_message(to_email, subject, body, photo_base64)
 
         # Send email (only if SMTP credentials are configured)
         if smtp_username and smtp_password:
@@ -179,24 +153,88 @@ async def send_email(
         return False
 
 
-def send_contact_email(contact_data):
-    """Send contact message to support email"""
+def deliver_messages(messages: list) -> list:
+    """Send prepared messages over a single SMTP session. Returns the
+    positions of the messages that could not be sent."""
+    if not (settings.smtp_username and settings.smtp_password):
+        for msg in messages:
+            logging.info(f"Email would be sent to {msg['To']}: {msg['Subject']}")
+        return []
+
+    failed = []
+    server = smtplib.SMTP(settings.smtp_server, settings.smtp_port)
     try:
-        # Email configuration
-        smtp_server = settings.smtp_server
-        smtp_port = settings.smtp_port
-        smtp_username = settings.smtp_username
-        smtp_password = settings.smtp_password
-        support_email = settings.support_email
+        server.starttls()
+        server.login(settings.smtp_username, settings.smtp_password)
+        for index, msg in enumerate(messages):
+            try:
+                server.sendmail(
+                    settings.smtp_username, msg["To"], msg.as_string()
+                )
+            except smtplib.SMTPException as e:
+                failed.append(index)
+                logging.error(f"Failed to send email {msg['Subject']}: {e}")
+    finally:
+        server.quit()
+    return failed
 
-        # CRITICAL: Log the email address being used for debugging
-        logging.error(f"🚨 CONTACT EMAIL - Sending to: {support_email}")
 
-        # Create email content
-        subject = f"New Contact Message - {contact_data.get('subject', 'General Inquiry')} - my420.ca"
+# Larger photos are left out so the email still gets delivered
+EMAIL_PHOTO_LIMIT = 2 * 1024 * 1024
+
+
+def build_finalization_email(registration_data: dict) -> tuple:
+    """Subject, body and attachable photo for a finalized registration"""
+    subject = f"New Registration - {registration_data.get('firstName')} {registration_data.get('lastName')}"
+
+    body = f"""
+Registration Date: {registration_data.get('regDate') or 'Not provided'}
+
+PATIENT INFORMATION:
+• Name: {registration_data.get('firstName')} {registration_data.get('lastName')}
+• Date of Birth: {registration_data.get('dob') or 'Not provided'}
+• Age: {registration_data.get('age') or 'Not provided'}
+• Gender: {registration_data.get('gender') or 'Not provided'}
+• Health Card: {registration_data.get('healthCard') or 'Not provided'}
+• Health Card Version: {registration_data.get('healthCardVersion') or 'Not provided'}
+
+CONTACT INFORMATION:
+• Phone 1: {registration_data.get('phone1') or 'Not provided'}
+• Phone 2: {registration_data.get('phone2') or 'Not provided'}
+• Email: {registration_data.get('email') or 'Not provided'}
+• Address: {registration_data.get('address') or 'Not provided'}
+• City: {registration_data.get('city') or 'Not provided'}
+• Province: {registration_data.get('province')}
+• Postal Code: {registration_data.get('postalCode') or 'Not provided'}
+
+OTHER INFORMATION:
+• Patient Consent: {registration_data.get('patientConsent')}
+• Disposition: {registration_data.get('disposition') or 'Not provided'}
+• Referral Site: {registration_data.get('referralSite') or 'Not provided'}
+• Physician: {registration_data.get('physician') or 'Not specified'}
+• Language: {registration_data.get('language')}
+
+ADDITIONAL NOTES:
+• Special Attention: {registration_data.get('specialAttention') or 'None'}
+• Instructions: {registration_data.get('instructions') or 'None'}
+• Clinical Summary: {registration_data.get('summaryTemplate') or 'None provided'}
+"""
 
-        # Email body
-        body = f"""
+    photo_data = registration_data.get("photo")
+    if photo_data and len(photo_data) >= EMAIL_PHOTO_LIMIT:
+        logging.info(
+            f"Photo too large ({len(photo_data)} bytes), skipping to ensure email delivery"
+        )
+        photo_data = None
+
+    return subject, body, photo_data
+
+
+def build_contact_email(contact_data: dict) -> tuple:
+    """Subject and body for a contact form message"""
+    subject = f"New Contact Message - {contact_data.get('subject', 'General Inquiry')} - my420.ca"
+
+    body = f"""
 New Contact Message from my420.ca
 
 Contact Details:
@@ -213,34 +251,7 @@ Reply directly to: {contact_data.get('email', 'N/A')}
 This message was submitted through my420.ca contact form
         """
 
-        # Create message
-        msg = MIMEMultipart()
-        msg["From"] = smtp_username or support_email
-        msg["To"] = support_email
-        msg["Reply-To"] = contact_data.get("email", support_email)
-        msg["Subject"] = subject
-        msg.attach(MIMEText(body, "plain"))
-
-        # Send email (only if SMTP credentials are configured)
-        if smtp_username and smtp_password:
-            server = smtplib.SMTP(smtp_server, smtp_port)
-            server.starttls()
-            server.login(smtp_username, smtp_password)
-            text = msg.as_string()
-            server.sendmail(smtp_username, support_email, text)
-            server.quit()
-            logging.info(f"Contact email sent successfully to {support_email}")
-            return True
-        else:
-            # Log the contact message for development/testing
-            logging.info(
-                f"Contact email would be sent to {support_email}: {body}"
-            )
-            return True
-
-    except Exception as e:
-        logging.error(f"Failed to send contact email: {str(e)}")
-        return False
+    return subject, body
 
 
 async def send_finalization_email_async(
@@ -365,49 +376,111 @@ def send_finalization_email_sync(
 
 # Clinical Template Processing Function
 def process_clinical_template(
-    template_content: str, registration_data: dict
+    template_content: str, registration_data: dict, syntax: str = "text"
 ) -> str:
     """Process clinical template content to make it conditional based on client data"""
-    if not template_content:
-        return template_content
+    from app.templating import render_template
+
+    return render_template(template_content, registration_data, syntax=syntax)
+
+
+# Activity Client Name Denormalization
+def activity_client_fields(first_name: str, last_name: str) -> dict:
+    """Client name fields stored on each activity so activity search and
+    counting can run on the activities collection alone"""
+    from app.search import tokenize
+
+    first_name = (first_name or "").strip()
+    last_name = (last_name or "").strip()
+    client_name = f"{first_name} {last_name}".strip()
+    return {
+        "client_first_name": first_name,
+        "client_last_name": last_name,
+        "client_name": client_name,
+        "client_name_key": client_name.lower(),
+        # Each name part is also kept whole, so "obrien" finds O'Brien
+        "client_name_tokens": tokenize(
+            client_name,
+            *(re.sub(r"[\W_]", "", part) for part in (first_name, last_name)),
+        ),
+    }
+
+
+async def sync_activity_client_names(
+    registration_id: str, first_name: str, last_name: str
+) -> int:
+    """Refresh the denormalized client name on a registration's activities"""
+    result = await db.activities.update_many(
+        {"registration_id": registration_id},
+        {"$set": activity_client_fields(first_name, last_name)},
+    )
+    return result.modified_count
 
-    # Check if this is the positive template that needs address/phone processing
-    if (
-        "Client does have a valid address and has also provided a phone number for results"
-        in template_content
-    ):
-        # Extract client contact information
-        address = registration_data.get("address", "").strip()
-        phone = (
-            registration_data.get("phone1", "").strip()
-            or registration_data.get("phone", "").strip()
-        )
 
-        # Determine the appropriate contact message
-        if address and phone:
-            contact_message = "Client does have a valid address and has also provided a phone number for results."
-        elif address and not phone:
-            contact_message = "Client does have a valid address but no phone number for results."
-        elif not address and phone:
-            contact_message = "Client does not have a valid address but has provided a phone number for results."
-        else:
-            contact_message = "Client does not have a valid address or phone number for results."
+# Health Card Keys
+# Fewer digits than this is a placeholder ("N/A", "0"), not a card
+HEALTH_CARD_MIN_DIGITS = 8
 
-        # Replace the static message with the dynamic one
-        processed_content = template_content.replace(
-            "Client does have a valid address and has also provided a phone number for results.",
-            contact_message,
-        )
 
-        return processed_content
+def health_card_key(health_card: str, version: str = None) -> str:
+    """Health card number and version code as one comparable key -
+    uppercase letters and digits only. None when there is no real card."""
+    number = re.sub(r"[^0-9A-Z]", "", (health_card or "").upper())
+    if sum(ch.isdigit() for ch in number) < HEALTH_CARD_MIN_DIGITS:
+        return None
+    return number + re.sub(r"[^0-9A-Z]", "", (version or "").upper())
+
+
+# Notes Search Snippets
+def search_terms(query: str) -> list:
+    """Lowercased words of a $text search string, including the words of
+    quoted phrases and leaving out negated words"""
+    return [
+        word.lower()
+        for word in re.findall(r"-?\w+", query or "")
+        if not word.startswith("-")
+    ]
+
+
+def build_snippet(text: str, terms: list, width: int = 160) -> dict:
+    """A window of the note around the first matching word, with the
+    [start, end) offsets of each matching word in the snippet. Words match
+    on prefix because $text matches stemmed words."""
+    text = text or ""
+    matches = [
+        match
+        for match in re.finditer(r"\w+", text)
+        if any(match.group().lower().startswith(term) for term in terms)
+    ]
 
-    return template_content
+    start = 0
+    if matches and matches[0].start() > width // 3:
+        # Open the window on a word boundary a little before the match
+        start = text.rfind(" ", 0, matches[0].start() - width // 3) + 1
+    end = min(len(text), start + width)
+
+    prefix = "…" if start > 0 else ""
+    suffix = "…" if end < len(text) else ""
+    return {
+        "snippet": prefix + text[start:end] + suffix,
+        "highlights": [
+            [
+                match.start() - start + len(prefix),
+                match.end() - start + len(prefix),
+            ]
+            for match in matches
+            if match.start() >= start and match.end() <= end
+        ],
+    }
 
 
 def generate_monthly_trend_chart(
     monthly_data: dict, title: str = "Monthly Registration Trends"
 ) -> tuple:
     """Generate interactive bar chart with trend line"""
+    import plotly.graph_objects as go
+    from plotly.subplots import make_subplots
+    from scipy import stats
 
     # Prepare data
     months = sorted(monthly_data.keys())
@@ -492,6 +565,7 @@ def generate_disposition_bar_chart(
     disposition_data: dict, title: str = "Disposition Breakdown"
 ) -> tuple:
     """Generate horizontal bar chart for dispositions"""
+    import plotly.graph_objects as go
 
     # Sort by count (descending) and take top 15 for mobile
     sorted_dispositions = sorted(
@@ -558,6 +632,7 @@ def generate_yearly_comparison_chart(
     title: str = "Year-over-Year Comparison",
 ) -> tuple:
     """Generate comparison chart between years"""
+    import plotly.graph_objects as go
 
     # Group monthly data by year
     year_month_data = {}
@@ -115,7 +115,20 @@ const AdminAnalytics = () => {
       });
 
       if (response.ok) {
-        const result = await response.json();
+        // The file is ingested in the background - follow its job
+        let result = await response.json();
+        while (result.status === 'queued' || result.status === 'running') {
+          setUploadStatus({
+            type: 'progress',
+            message: `Processing ${file.name}... ${result.percent}% (${result.rows_written} records)`
+          });
+          await new Promise(resolve => setTimeout(resolve, 1000));
+          const jobResponse = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/upload-legacy-data/${result.job_id}`);
+          if (!jobResponse.ok) throw new Error('Lost track of the upload');
+          result = await jobResponse.json();
+        }
+        if (result.status === 'failed') throw new Error(result.error || 'Upload failed');
+
         setUploadStatus({
           type: 'success',
           message: result.message,
@@ -359,7 +372,8 @@ const AdminAnalytics = () => {
               {/* Upload Status */}
               {uploadStatus && (
                 <div className={`mt-4 p-4 rounded-md ${
-                  uploadStatus.type === 'success' ? 'bg-green-50 text-green-800' : 'bg-red-50 text-red-800'
+                  uploadStatus.type === 'success' ? 'bg-green-50 text-green-800' :
+                  uploadStatus.type === 'progress' ? 'bg-blue-50 text-blue-800' : 'bg-red-50 text-red-800'
                 }`}>
                   <p className="font-medium">{uploadStatus.message}</p>
                   {uploadStatus.data && (
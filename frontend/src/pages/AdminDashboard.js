@@ -112,6 +112,9 @@ const AdminDashboard = () => {
   const [searchReferralSite, setSearchReferralSite] = useState('');
   const [activitySearchTerm, setActivitySearchTerm] = useState('');
   const [activityStatusFilter, setActivityStatusFilter] = useState('all');
+  const [healthCardLookup, setHealthCardLookup] = useState('');
+  const [healthCardMatches, setHealthCardMatches] = useState([]);
+  const [healthCardLookupError, setHealthCardLookupError] = useState('');
   
   // Photo lazy loading state
   const [loadedPhotos, setLoadedPhotos] = useState({});
@@ -253,6 +256,113 @@ const AdminDashboard = () => {
     return () => clearTimeout(debounceTimer);
   }, [searchName, searchDate, searchDisposition, searchReferralSite, activitySearchTerm, activityStatusFilter]);
 
+  // Live updates: the server pushes compact change events and the
+  // dashboard patches its counts and rows instead of refetching them
+  const liveViewRef = useRef({});
+  liveViewRef.current = {
+    activeTab,
+    currentPage,
+    filtered: Boolean(
+      searchName || searchDate || searchDisposition || searchReferralSite ||
+      activitySearchTerm || activityStatusFilter !== 'all'
+    )
+  };
+  const liveConnectedRef = useRef(false);
+
+  useEffect(() => {
+    if (typeof EventSource === 'undefined') return;
+    const source = new EventSource(`${API_BASE}/api/events`);
+    const on = (type, handler) => {
+      source.addEventListener(type, (e) => handler(JSON.parse(e.data)));
+    };
+    // New rows only belong at the top of an unfiltered first page
+    const showsNewRows = (tab) => {
+      const view = liveViewRef.current;
+      return view.activeTab === tab && view.currentPage === 1 && !view.filtered;
+    };
+    const prependRows = (rows) => {
+      setCurrentData(prev => {
+        const ids = new Set(rows.map(row => row.id));
+        return [...rows, ...prev.filter(item => !ids.has(item.id))].slice(0, pageSize);
+      });
+    };
+    const removeRows = (ids) => {
+      setCurrentData(prev => prev.filter(item => !ids.includes(item.id)));
+    };
+    const moveRegistrations = (event, from, to) => {
+      const count = event.ids.length;
+      setDashboardStats(prev => ({
+        ...prev,
+        [`${from}_registrations`]: Math.max(0, prev[`${from}_registrations`] - count),
+        [`${to}_registrations`]: prev[`${to}_registrations`] + count
+      }));
+      const view = liveViewRef.current;
+      if (view.activeTab === from) {
+        removeRows(event.ids);
+      } else if (showsNewRows(to)) {
+        prependRows(event.registrations || []);
+      }
+    };
+
+    // Reload everything the stream may have missed while it was down
+    const resync = () => {
+      const view = liveViewRef.current;
+      fetchDashboardStats();
+      fetchPaginatedData(view.activeTab, view.currentPage, true);
+    };
+    let hasOpened = false;
+    source.onopen = () => {
+      liveConnectedRef.current = true;
+      // EventSource reconnects by itself - events sent in between are lost
+      if (hasOpened) resync();
+      hasOpened = true;
+    };
+    source.onerror = () => { liveConnectedRef.current = false; };
+
+    on('registration.created', (event) => {
+      setDashboardStats(prev => ({
+        ...prev,
+        pending_registrations: prev.pending_registrations + event.ids.length
+      }));
+      if (showsNewRows('pending')) prependRows(event.registrations || []);
+    });
+    on('registration.finalized', (event) => moveRegistrations(event, 'pending', 'submitted'));
+    on('registration.reverted', (event) => moveRegistrations(event, 'submitted', 'pending'));
+    on('registration.updated', (event) => {
+      const updated = new Map((event.registrations || []).map(row => [row.id, row]));
+      setCurrentData(prev => prev.map(item =>
+        updated.has(item.id) && liveViewRef.current.activeTab !== 'activities'
+          ? { ...item, ...updated.get(item.id) }
+          : item
+      ));
+    });
+    on('registration.deleted', (event) => {
+      removeRows(event.ids);
+      // Which tab each deleted client was on is not known here
+      fetchDashboardStats();
+    });
+    on('activity.added', (event) => {
+      setDashboardStats(prev => ({
+        ...prev,
+        total_activities: prev.total_activities + event.ids.length
+      }));
+      if (showsNewRows('activities')) prependRows(event.activities || []);
+    });
+    on('activity.deleted', (event) => {
+      setDashboardStats(prev => ({
+        ...prev,
+        total_activities: Math.max(0, prev.total_activities - event.ids.length)
+      }));
+      if (liveViewRef.current.activeTab === 'activities') removeRows(event.ids);
+    });
+    on('resync', resync);
+
+    return () => {
+      liveConnectedRef.current = false;
+      source.close();
+    };
+  }, []);
+
   // Handle page changes with scroll to top
   const handlePageChange = (newPage) => {
     if (newPage >= 1 && newPage <= totalPages && !loading) {
@@ -279,6 +389,31 @@ const AdminDashboard = () => {
     setSearchReferralSite(value);
   };
 
+  const handleHealthCardLookup = async (e) => {
+    e.preventDefault();
+    setHealthCardLookupError('');
+    setHealthCardMatches([]);
+    if (!healthCardLookup.trim()) return;
+
+    try {
+      const params = new URLSearchParams({ health_card: healthCardLookup });
+      const response = await fetch(`${API_BASE}/api/admin-registrations/lookup?${params}`);
+      const data = await response.json();
+      if (!response.ok) {
+        setHealthCardLookupError(data.detail || 'Lookup failed');
+      } else if (data.registration_id) {
+        navigate(`/admin-edit/${data.registration_id}`);
+      } else if (data.matches.length > 0) {
+        setHealthCardMatches(data.matches);
+      } else {
+        setHealthCardLookupError('No client has this health card');
+      }
+    } catch (error) {
+      console.error('Health card lookup failed:', error);
+      setHealthCardLookupError('Lookup failed');
+    }
+  };
+
   const clearAllFilters = () => {
     setSearchName('');
     setSearchDate('');
@@ -309,9 +444,11 @@ const AdminDashboard = () => {
       if (response.ok) {
         alert(`✅ ${firstName} ${lastName} deleted successfully!`);
         
-        // Sequential refresh to prevent race conditions
-        await fetchDashboardStats();
-        await fetchPaginatedData(activeTab, currentPage, true);
+        // The live stream patches stats and rows; refetch only without it
+        if (!liveConnectedRef.current) {
+          await fetchDashboardStats();
+          await fetchPaginatedData(activeTab, currentPage, true);
+        }
         
       } else {
         // Revert optimistic update on failure
@@ -357,18 +494,12 @@ const AdminDashboard = () => {
         const photoText = result.photo_attached ? " with photo attachment" : "";
         alert(`✅ ${firstName} ${lastName} finalized successfully!\n📧 Email sent${photoText}`);
         
-        // Sequential data refresh to prevent race conditions
-        // First refresh dashboard stats
-        await fetchDashboardStats();
-        
-        // Then refresh the current pending tab if we're on it
-        if (activeTab === 'pending') {
-          await fetchPaginatedData('pending', currentPage, true);
+        // The live stream patches stats and rows; refetch only without it
+        if (!liveConnectedRef.current) {
+          await fetchDashboardStats();
+          await fetchPaginatedData(activeTab, currentPage, true);
         }
         
-        // Finally refresh submitted tab (page 1 to show newly submitted)
-        await fetchPaginatedData('submitted', 1, true);
-        
       } else {
         // Revert optimistic update on failure
         setCurrentData(originalData);
@@ -414,18 +545,12 @@ const AdminDashboard = () => {
         const result = await response.json();
         alert(`✅ ${firstName} ${lastName} moved back to pending status!\n🔄 You can now make corrections and resubmit.`);
         
-        // Sequential data refresh to prevent race conditions
-        // First refresh dashboard stats
-        await fetchDashboardStats();
-        
-        // Then refresh the current submitted tab if we're on it
-        if (activeTab === 'submitted') {
-          await fetchPaginatedData('submitted', currentPage, true);
+        // The live stream patches stats and rows; refetch only without it
+        if (!liveConnectedRef.current) {
+          await fetchDashboardStats();
+          await fetchPaginatedData(activeTab, currentPage, true);
         }
         
-        // Finally refresh pending tab (page 1 to show newly reverted)
-        await fetchPaginatedData('pending', 1, true);
-        
       } else {
         // Revert optimistic update on failure
         setCurrentData(originalData);
@@ -879,6 +1004,45 @@ const AdminDashboard = () => {
               )}
             </div>
             
+            {/* Health Card Lookup */}
+            <form onSubmit={handleHealthCardLookup} className="mt-4 flex flex-col sm:flex-row sm:items-end gap-2">
+              <div className="flex-1 min-w-0">
+                <label className="block text-sm font-medium text-gray-700 mb-1">Find by Health Card</label>
+                <input
+                  type="text"
+                  placeholder="e.g. 1234 567 890 AB"
+                  value={healthCardLookup}
+                  onChange={(e) => setHealthCardLookup(e.target.value)}
+                  className="w-full px-3 py-2 border border-gray-300 rounded-md text-sm focus:outline-none focus:ring-2 focus:ring-blue-500"
+                  style={{ height: '40px', minHeight: '40px', maxHeight: '40px' }}
+                />
+              </div>
+              <button
+                type="submit"
+                className="bg-black text-white px-4 rounded-md hover:bg-gray-800 transition-colors text-sm"
+                style={{ height: '40px' }}
+              >
+                Open Client
+              </button>
+            </form>
+            {healthCardLookupError && (
+              <p className="mt-2 text-sm text-red-600">{healthCardLookupError}</p>
+            )}
+            {healthCardMatches.length > 0 && (
+              <div className="mt-2 text-sm">
+                <p className="text-gray-700 mb-1">Several clients share this card number:</p>
+                {healthCardMatches.map((match) => (
+                  <button
+                    key={match.id}
+                    onClick={() => navigate(`/admin-edit/${match.id}`)}
+                    className="block text-blue-600 hover:text-blue-800"
+                  >
+                    {match.firstName} {match.lastName} - {match.healthCard} {match.healthCardVersion || ''} ({match.dob || 'no DOB'})
+                  </button>
+                ))}
+              </div>
+            )}
+
             {/* Clear All Filters Button */}
             {(searchName || searchDate || searchDisposition || searchReferralSite || activitySearchTerm || activityStatusFilter !== 'all') && (
               <div className="mt-4 flex justify-center">
@@ -1,9 +1,10 @@
-import React, { useState, useEffect } from "react";
+import React, { useState, useEffect, useRef } from "react";
 import { useNavigate, useParams } from "react-router-dom";
 import AddressAutocomplete from '../components/AddressAutocomplete';
 
 const AdminEdit = () => {
   const navigate = useNavigate();
+  const savedRegistrationRef = useRef(null);
   
   // Get current user permissions
   const getCurrentUserPermissions = () => {
@@ -455,6 +456,8 @@ ${currentDate} ${currentTime}`;
     noteText: ''
   });
   const [savedNotes, setSavedNotes] = useState([]);
+  const [notesCursor, setNotesCursor] = useState(null);
+  const [isLoadingOlderNotes, setIsLoadingOlderNotes] = useState(false);
   const [editingNoteId, setEditingNoteId] = useState(null);
   const [isSavingNotes, setIsSavingNotes] = useState(false);
   const [isRecording, setIsRecording] = useState(false);
@@ -767,12 +770,31 @@ ${currentDate} ${currentTime}`;
       if (response.ok) {
         const data = await response.json();
         setSavedNotes(data.notes || []);
+        setNotesCursor(data.next_cursor || null);
       }
     } catch (error) {
       console.error('Error loading notes:', error);
     }
   };
 
+  const loadOlderNotes = async () => {
+    if (!registrationId || !notesCursor) return;
+
+    setIsLoadingOlderNotes(true);
+    try {
+      const response = await fetch(`${process.env.REACT_APP_BACKEND_URL}/api/admin-registration/${registrationId}/notes?before=${encodeURIComponent(notesCursor)}`);
+      if (response.ok) {
+        const data = await response.json();
+        setSavedNotes(prev => [...prev, ...(data.notes || [])]);
+        setNotesCursor(data.next_cursor || null);
+      }
+    } catch (error) {
+      console.error('Error loading older notes:', error);
+    } finally {
+      setIsLoadingOlderNotes(false);
+    }
+  };
+
   const editNote = (note) => {
     setNotesData({
       noteDate: note.noteDate || new Date().toISOString().split('T')[0],
@@ -2291,6 +2313,7 @@ ${currentDate} ${currentTime}`;
         if (response.ok) {
           const data = await response.json();
           setFormData(data);
+          savedRegistrationRef.current = data;
           
           // Set photo preview if exists
           if (data.photo) {
@@ -3407,7 +3430,8 @@ ${currentDate} ${currentTime}`;
             filename: documentPreview.filename,
             type: documentPreview.type
           },
-          expires_in_minutes: 30
+          expires_in_minutes: 30,
+          registration_id: registrationId
         }),
       });
 
@@ -3468,6 +3492,20 @@ ${currentDate} ${currentTime}`;
     }
   };
 
+  // Only the fields that differ from the last saved copy are sent, so an
+  // edit does not re-upload the photo
+  const buildRegistrationPatch = (cleanedFormData) => {
+    const saved = savedRegistrationRef.current || {};
+    const patch = {};
+    Object.keys(cleanedFormData).forEach(key => {
+      if (key === 'version') return;
+      if (JSON.stringify(cleanedFormData[key] ?? null) !== JSON.stringify(saved[key] ?? null)) {
+        patch[key] = cleanedFormData[key];
+      }
+    });
+    return { ...patch, version: saved.version ?? 0 };
+  };
+
   const handleSaveAndContinue = async (e) => {
     e.preventDefault();
     setSaving(true);
@@ -3526,14 +3564,17 @@ ${currentDate} ${currentTime}`;
       });
       
       const response = await fetch(`${API}/api/admin-registration/${registrationId}`, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(cleanedFormData),
+        body: JSON.stringify(buildRegistrationPatch(cleanedFormData)),
       });
 
       if (response.ok) {
+        const result = await response.json();
+        savedRegistrationRef.current = { ...cleanedFormData, version: result.version };
+        setFormData(prev => ({ ...prev, version: result.version }));
         setSaveStatus({
           type: 'success',
           message: 'Changes saved successfully! You can continue editing or return to admin menu or dashboard.'
@@ -3563,6 +3604,11 @@ ${currentDate} ${currentTime}`;
           }
         } else if (response.status === 404) {
           errorMessage = 'Registration not found.';
+        } else if (response.status === 409) {
+          const errorData = await response.json().catch(() => ({}));
+          errorMessage = errorData.detail === 'This health card belongs to another client'
+            ? 'This health card already belongs to another client. Use Find by Health Card on the dashboard to open that client.'
+            : 'This registration was changed by someone else. Reload the page to get the latest version.';
         } else if (response.status >= 500) {
           errorMessage = 'Server error. Please try again later.';
         }
@@ -3641,14 +3687,17 @@ ${currentDate} ${currentTime}`;
       });
       
       const response = await fetch(`${API}/api/admin-registration/${registrationId}`, {
-        method: 'PUT',
+        method: 'PATCH',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify(cleanedFormData),
+        body: JSON.stringify(buildRegistrationPatch(cleanedFormData)),
       });
 
       if (response.ok) {
+        const result = await response.json();
+        savedRegistrationRef.current = { ...cleanedFormData, version: result.version };
+        setFormData(prev => ({ ...prev, version: result.version }));
         // Successfully saved, navigate back to admin menu
         navigate('/admin-menu');
       } else {
@@ -3675,6 +3724,11 @@ ${currentDate} ${currentTime}`;
           }
         } else if (response.status === 404) {
           errorMessage = 'Registration not found.';
+        } else if (response.status === 409) {
+          const errorData = await response.json().catch(() => ({}));
+          errorMessage = errorData.detail === 'This health card belongs to another client'
+            ? 'This health card already belongs to another client. Use Find by Health Card on the dashboard to open that client.'
+            : 'This registration was changed by someone else. Reload the page to get the latest version.';
         } else if (response.status >= 500) {
           errorMessage = 'Server error. Please try again later.';
         }
@@ -5809,6 +5863,18 @@ ${currentDate} ${currentTime}`;
                             </div>
                           </div>
                         ))}
+                        {notesCursor && (
+                          <div className="text-center pt-2">
+                            <button
+                              type="button"
+                              onClick={loadOlderNotes}
+                              disabled={isLoadingOlderNotes}
+                              className="border border-gray-300 text-gray-700 px-4 py-2 rounded-md hover:bg-gray-50 disabled:text-gray-400 transition-colors"
+                            >
+                              {isLoadingOlderNotes ? 'Loading...' : 'Load Older Notes'}
+                            </button>
+                          </div>
+                        )}
                         </div>
                       )}
                     </div>
@@ -4899,8 +4899,11 @@ ${currentDate} ${currentTime}`;
 
         setSubmitStatus({
           type: "success",
-          message:
-            "Registration saved for review! You can now access the dashboard to review and finalize registrations.",
+          message: result.duplicate_prevented
+            ? result.duplicate_match === "health_card"
+              ? "A client with this health card is already registered - the existing record has been opened."
+              : "A client with this name and date of birth is already registered - the existing record has been opened."
+            : "Registration saved for review! You can now access the dashboard to review and finalize registrations.",
           id: result.registration_id,
         });
 
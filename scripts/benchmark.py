@@ -0,0 +1,279 @@
+#!/usr/bin/env python3
+"""
+Local Benchmark Suite for the Admin API
+Builds a deterministic dataset in a local MongoDB, drives the key endpoints
+concurrently in-process through an ASGI client and reports latency
+percentiles and throughput, optionally compared against a stored baseline
+"""
+
+import asyncio
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "benchmark-baseline.json"
+
+SEARCH_TERMS = ["smith", "johnson", "lee", "garcia", "outreach"]
+
+INSERT_BATCH_SIZE = 1000
+
+
+async def build_dataset(db, size, seed):
+    """Recreate the benchmark collections with size registrations"""
+    from app.database import (
+        backfill_activity_client_names,
+        create_performance_indexes,
+        create_unique_indexes,
+    )
+    from generate_test_data import iter_shard, load_distribution
+
+    for name in await db.list_collection_names():
+        await db.drop_collection(name)
+    await create_unique_indexes()
+    await create_performance_indexes()
+
+    registration_ids = []
+    buffers = {}
+
+    async def flush():
+        for collection_name, documents in buffers.items():
+            if documents:
+                await db[collection_name].insert_many(documents, ordered=False)
+                documents.clear()
+
+    # A single shard keeps the dataset identical for a given seed and size
+    for registration, children in iter_shard(seed, 0, 0, size, load_distribution()):
+        registration_ids.append(registration["id"])
+        buffers.setdefault("admin_registrations", []).append(registration)
+        for collection_name, documents in children.items():
+            buffers.setdefault(collection_name, []).extend(documents)
+        if len(buffers["admin_registrations"]) >= INSERT_BATCH_SIZE:
+            await flush()
+    await flush()
+
+    # The generator writes no search tokens and the app's startup backfills
+    # do not run under ASGITransport - add them so activity search matches
+    await backfill_activity_client_names()
+
+    return registration_ids
+
+
+def build_scenarios(registration_ids, rng):
+    """Endpoint name -> callable returning the next request path"""
+    return {
+        "pending_optimized": lambda: f"/api/admin-registrations-pending-optimized?page={rng.randint(1, 5)}",
+        "submitted_optimized": lambda: f"/api/admin-registrations-submitted-optimized?page={rng.randint(1, 5)}",
+        "activities_optimized": lambda: "/api/admin-activities-optimized?page=1",
+        "activities_search": lambda: f"/api/admin-activities-optimized?search_term={rng.choice(SEARCH_TERMS)}",
+        "registration_detail": lambda: f"/api/admin-registration/{rng.choice(registration_ids)}",
+        "registration_photo": lambda: f"/api/admin-registration/{rng.choice(registration_ids)}/photo",
+        "registration_notes": lambda: f"/api/admin-registration/{rng.choice(registration_ids)}/notes",
+        "registration_activities": lambda: f"/api/admin-registration/{rng.choice(registration_ids)}/activities",
+        "dashboard_stats": lambda: "/api/admin-dashboard-stats",
+        "dispositions": lambda: "/api/dispositions",
+    }
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def run_scenario(client, next_path, requests, concurrency):
+    """Fire requests at concurrency and collect per-request latency"""
+    latencies = []
+    errors = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            path = next_path()
+            start = time.perf_counter()
+            response = await client.get(path)
+            latencies.append((time.perf_counter() - start) * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "requests": requests,
+        "errors": errors,
+        "p50_ms": round(percentile(latencies, 0.50), 2),
+        "p95_ms": round(percentile(latencies, 0.95), 2),
+        "p99_ms": round(percentile(latencies, 0.99), 2),
+        "mean_ms": round(statistics.fmean(latencies), 2) if latencies else 0.0,
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Print per-endpoint deltas and return the list of regressions"""
+    regressions = []
+    for size, endpoints in results.items():
+        for endpoint, current in endpoints.items():
+            previous = baseline.get(size, {}).get(endpoint)
+            if not previous:
+                continue
+            for metric in ("p50_ms", "p95_ms", "p99_ms"):
+                if not previous[metric]:
+                    continue
+                change = (current[metric] - previous[metric]) / previous[metric]
+                marker = ""
+                if change > tolerance:
+                    marker = "  ❌ REGRESSION"
+                    regressions.append(f"{size}/{endpoint}/{metric}")
+                print(
+                    f"   {size:>7} {endpoint:<24} {metric:<7} "
+                    f"{previous[metric]:>9.2f} -> {current[metric]:>9.2f} "
+                    f"({change:+.0%}){marker}"
+                )
+    return regressions
+
+
+def start_mongod():
+    """Start a throwaway mongod and return (process, url, data_dir)"""
+    mongod = shutil.which("mongod")
+    if not mongod:
+        print("❌ mongod not found on PATH - start MongoDB yourself and pass --mongo-url")
+        sys.exit(1)
+    data_dir = tempfile.mkdtemp(prefix="crm-benchmark-")
+    port = 27099
+    process = subprocess.Popen(
+        [mongod, "--dbpath", data_dir, "--port", str(port), "--bind_ip", "127.0.0.1", "--quiet"],
+        stdout=subprocess.DEVNULL,
+    )
+    return process, f"mongodb://127.0.0.1:{port}", data_dir
+
+
+async def wait_for_mongo(client, timeout=30):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            await client.admin.command("ping")
+            return
+        except Exception:
+            if time.monotonic() > deadline:
+                raise
+            await asyncio.sleep(0.5)
+
+
+async def run_benchmark(args):
+    import httpx
+    from app.database import client, db
+    from app.main import app
+
+    await wait_for_mongo(client)
+
+    results = {}
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+        for size in args.sizes:
+            print(f"\n📦 Building dataset: {size:,} registrations (seed {args.seed})...")
+            start = time.perf_counter()
+            registration_ids = await build_dataset(db, size, args.seed)
+            print(f"   Built in {time.perf_counter() - start:.1f}s")
+
+            scenarios = build_scenarios(registration_ids, random.Random(args.seed))
+            size_results = {}
+            for name, next_path in scenarios.items():
+                if args.only and name not in args.only:
+                    continue
+                # Warm caches and connection pool before measuring
+                await run_scenario(http, next_path, min(10, args.requests), 1)
+                size_results[name] = await run_scenario(
+                    http, next_path, args.requests, args.concurrency
+                )
+                r = size_results[name]
+                print(
+                    f"   {name:<24} p50 {r['p50_ms']:>8.2f}ms  p95 {r['p95_ms']:>8.2f}ms  "
+                    f"p99 {r['p99_ms']:>8.2f}ms  {r['throughput_rps']:>7.1f} req/s"
+                    + (f"  ({r['errors']} errors)" if r["errors"] else "")
+                )
+            results[str(size)] = size_results
+
+    client.close()
+    return results
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Local API benchmark suite")
+    parser.add_argument("--sizes", default="1000,10000,100000",
+                        help="Comma separated registration counts")
+    parser.add_argument("--requests", type=int, default=200, help="Requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=10, help="Concurrent clients")
+    parser.add_argument("--seed", type=int, default=42, help="Dataset random seed")
+    parser.add_argument("--only", default="", help="Comma separated endpoint names to run")
+    parser.add_argument("--mongo-url", default=os.environ.get("BENCHMARK_MONGO_URL"),
+                        help="MongoDB to benchmark against (default: start a local mongod)")
+    parser.add_argument("--db-name", default="my420_benchmark")
+    parser.add_argument("--baseline", default=str(DEFAULT_BASELINE))
+    parser.add_argument("--save-baseline", action="store_true",
+                        help="Store these results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown before a metric counts as a regression")
+    parser.add_argument("--output", help="Write results JSON to this file")
+    args = parser.parse_args()
+    args.sizes = [int(size) for size in args.sizes.split(",") if size]
+    args.only = [name for name in args.only.split(",") if name]
+
+    mongod = None
+    data_dir = None
+    if not args.mongo_url:
+        mongod, args.mongo_url, data_dir = start_mongod()
+        print(f"🚀 Started local mongod at {args.mongo_url}")
+
+    # The app reads its settings at import time
+    os.environ["MONGO_URL"] = args.mongo_url
+    os.environ["DB_NAME"] = args.db_name
+    os.environ.setdefault("ANTHROPIC_API_KEY", "benchmark")
+    sys.path.insert(0, str(BACKEND_DIR))
+
+    try:
+        results = asyncio.run(run_benchmark(args))
+    finally:
+        if mongod:
+            mongod.terminate()
+            mongod.wait()
+            shutil.rmtree(data_dir, ignore_errors=True)
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(results, indent=2))
+
+    baseline_path = Path(args.baseline)
+    exit_code = 0
+    if args.save_baseline:
+        baseline_path.write_text(json.dumps(results, indent=2))
+        print(f"\n💾 Baseline saved to {baseline_path}")
+    elif baseline_path.exists():
+        print(f"\n📊 Comparison against {baseline_path}:")
+        regressions = compare_to_baseline(
+            results, json.loads(baseline_path.read_text()), args.tolerance
+        )
+        if regressions:
+            print(f"\n❌ {len(regressions)} metric(s) regressed beyond {args.tolerance:.0%}")
+            exit_code = 1
+        else:
+            print("\n✅ No regressions against baseline")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,7 +4,7 @@ Comprehensive Backup Script for All Production Data
 Ensures all templates and data are backed up properly
 """
 
-import pymongo
+from mongo_connection import connect
 import json
 import os
 import sys
@@ -15,9 +15,7 @@ def create_comprehensive_backup():
     """Create a complete backup of all production data"""
     try:
         # Connect to MongoDB
-        mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-        client = pymongo.MongoClient(mongo_url)
-        db = client['my420_ca_db']
+        client, db = connect()
         
         # Create backup directory
         backup_dir = Path('/app/persistent-data/backups')
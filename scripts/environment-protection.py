@@ -6,7 +6,7 @@ Ensures test data doesn't contaminate production environment
 
 import os
 import sys
-import pymongo
+from mongo_connection import connect
 import json
 from datetime import datetime
 from pathlib import Path
@@ -18,8 +18,7 @@ class EnvironmentProtection:
         self.is_production = os.environ.get('ENVIRONMENT', 'production').lower() == 'production'
         
         # Connect to MongoDB
-        self.client = pymongo.MongoClient(self.mongo_url)
-        self.db = self.client[self.db_name]
+        self.client, self.db = connect(self.mongo_url, self.db_name)
         
         # Test data patterns to identify
         self.test_patterns = [
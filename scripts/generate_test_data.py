@@ -1,24 +1,31 @@
 #!/usr/bin/env python3
 """
 Test Data Generator for Medical Platform
-Creates realistic test records for pending and submitted client registrations
+Bulk-generates realistic registrations with photos, attachments and child
+records (tests, notes, medications, interactions, dispensing, activities).
+Output is deterministic for a given seed and is written either straight to
+MongoDB with batched insert_many from several worker processes, or as NDJSON
+files for mongoimport.
+
+Examples:
+    python generate_test_data.py --registrations 1500
+    python generate_test_data.py --registrations 200000 --workers 8 --seed 7
+    python generate_test_data.py --registrations 200000 --ndjson /tmp/crm-data
+    python generate_test_data.py --clear
 """
 
-import asyncio
+import base64
+import json
 import os
+import random
 import sys
-from datetime import datetime, date, timedelta
-from motor.motor_asyncio import AsyncIOMotorClient
+import time
 import uuid
-import random
-import pytz
-from faker import Faker
-import json
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+from pathlib import Path
 
-# Add parent directory to path for imports
-sys.path.append('/app')
-
-fake = Faker('en_CA')  # Canadian locale
+import pytz
 
 # Lists of realistic medical platform data
 FIRST_NAMES = [
@@ -72,263 +79,471 @@ LANGUAGES = ["English", "French"]  # Using only commonly supported languages to
 
 PATIENT_CONSENT = ["Verbal", "Written"]
 
-def generate_phone_number():
+MEDICATIONS = ["Epclusa", "Maviret", "Vosevi"]
+
+MEDICATION_OUTCOMES = ["Active", "Completed", "Non Compliance", "Side Effect", "Did not start"]
+
+INTERACTION_TYPES = [
+    "Screening", "Adherence", "Bloodwork", "Referral", "Consultation", "Outreach",
+    "Results", "Lab Req", "Telephone", "Counselling", "Housing", "SVR",
+]
+
+ACTIVITY_DESCRIPTIONS = [
+    "Follow up call", "Lab visit", "Outreach", "Medication pickup",
+    "Results discussion", "Housing referral", "Appointment reminder",
+]
+
+NOTE_SENTENCES = [
+    "Client attended appointment as scheduled.",
+    "Discussed treatment options and next steps.",
+    "Client reports no side effects.",
+    "Bloodwork requisition provided.",
+    "Left voicemail requesting call back.",
+    "Client requested housing support information.",
+]
+
+# Child record counts per registration are drawn uniformly from [min, max].
+# Override any of these with --distribution path/to/file.json
+DEFAULT_DISTRIBUTION = {
+    "pending_ratio": 0.33,
+    "photo_ratio": 0.8,
+    "photo_bytes": 30_000,
+    "attachment_bytes": 100_000,
+    "attachments": [0, 2],
+    "children": {
+        "activities": [1, 4],
+        "test_records": [0, 3],
+        "notes_records": [0, 5],
+        "medications": [0, 1],
+        "interactions": [0, 3],
+        "dispensing": [0, 1],
+    },
+}
+
+CHILD_COLLECTIONS = list(DEFAULT_DISTRIBUTION["children"])
+
+TORONTO_TZ = pytz.timezone("America/Toronto")
+
+# Fixed reference point so the same seed always yields identical documents
+BASE_TIME = TORONTO_TZ.localize(datetime(2025, 1, 1, 9, 0))
+
+
+def make_uuid(rng):
+    """UUID4 drawn from rng so ids are reproducible"""
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+
+def make_blob(rng, size):
+    """Base64 payload of roughly size random bytes"""
+    return base64.b64encode(rng.randbytes(size)).decode()
+
+
+def generate_phone_number(rng):
     """Generate Canadian phone number in format (XXX) XXX-XXXX"""
     area_codes = ["416", "647", "437", "905", "289", "365", "613", "519", "705", "807"]
-    area_code = random.choice(area_codes)
-    exchange = random.randint(200, 999)
-    number = random.randint(1000, 9999)
-    return f"({area_code}) {exchange}-{number}"
+    return f"({rng.choice(area_codes)}) {rng.randint(200, 999)}-{rng.randint(1000, 9999)}"
+
 
-def generate_health_card():
+def generate_health_card(rng):
     """Generate Ontario health card number (AAAA-BBB-CCC-AA)"""
-    return f"{random.randint(1000, 9999)}-{random.randint(100, 999)}-{random.randint(100, 999)}-{random.choice(['ON', 'AB', 'BC', 'MB', 'SK', 'QC', 'NS', 'NB'])}"
+    return f"{rng.randint(1000, 9999)}-{rng.randint(100, 999)}-{rng.randint(100, 999)}-{rng.choice(['ON', 'AB', 'BC', 'MB', 'SK', 'QC', 'NS', 'NB'])}"
 
-def generate_postal_code():
+
+def generate_postal_code(rng):
     """Generate Canadian postal code (A1A 1A1)"""
     letters = "ABCDEFGHIJKLMNPRSTUVWXYZ"
     numbers = "0123456789"
-    return f"{random.choice(letters)}{random.choice(numbers)}{random.choice(letters)} {random.choice(numbers)}{random.choice(letters)}{random.choice(numbers)}"
+    return f"{rng.choice(letters)}{rng.choice(numbers)}{rng.choice(letters)} {rng.choice(numbers)}{rng.choice(letters)}{rng.choice(numbers)}"
+
 
-def generate_dob():
+def generate_dob(rng):
     """Generate date of birth between 18-80 years old"""
-    today = date.today()
-    min_age = 18
-    max_age = 80
-    min_date = today - timedelta(days=max_age * 365)
-    max_date = today - timedelta(days=min_age * 365)
-    
-    random_days = random.randint(0, (max_date - min_date).days)
-    return min_date + timedelta(days=random_days)
-
-def generate_reg_date():
-    """Generate registration date within last 3 months"""
-    today = date.today()
-    start_date = today - timedelta(days=90)
-    random_days = random.randint(0, 90)
-    return start_date + timedelta(days=random_days)
-
-def generate_email(first_name, last_name):
+    return BASE_TIME.date() - timedelta(days=rng.randint(18 * 365, 80 * 365))
+
+
+def generate_reg_date(rng):
+    """Generate registration date within the year before BASE_TIME"""
+    return BASE_TIME.date() - timedelta(days=rng.randint(0, 365))
+
+
+def generate_email(rng, first_name, last_name, index):
     """Generate realistic email address"""
     domains = ["gmail.com", "yahoo.com", "hotmail.com", "outlook.com", "bell.net", "rogers.com"]
-    domain = random.choice(domains)
-    formats = [
-        f"{first_name.lower()}.{last_name.lower()}@{domain}",
-        f"{first_name.lower()}{last_name.lower()}@{domain}",
-        f"{first_name[0].lower()}{last_name.lower()}@{domain}",
-        f"{first_name.lower()}{random.randint(10, 99)}@{domain}"
-    ]
-    return random.choice(formats)
+    return f"{first_name.lower()}.{last_name.split('-')[0].lower()}{index}@{rng.choice(domains)}"
+
 
-def generate_address(city):
+def generate_address(rng):
     """Generate realistic Canadian address"""
-    street_numbers = [str(random.randint(1, 9999))]
-    if random.random() < 0.3:  # 30% chance of unit number
-        unit = f"Unit {random.randint(1, 50)} "
-        street_numbers.append(unit)
-    
     street_names = [
         "Main Street", "King Street", "Queen Street", "Church Street", "University Ave",
         "Bloor Street", "Yonge Street", "Dundas Street", "College Street", "Bay Street",
         "Front Street", "Richmond Street", "Adelaide Street", "Elm Street", "Oak Avenue",
-        "Maple Drive", "Pine Road", "Cedar Lane", "Birch Way", "Willow Court"
     ]
-    
-    street_name = random.choice(street_names)
-    street_num = random.randint(1, 9999)
-    
-    if len(street_numbers) > 1:
-        return f"{street_numbers[1]}{street_num} {street_name}"
-    else:
-        return f"{street_num} {street_name}"
+    return f"{rng.randint(1, 9999)} {rng.choice(street_names)}"
 
-def generate_special_attention():
+
+def generate_special_attention(rng):
     """Generate realistic special attention notes"""
     notes = [
         "Patient requires interpreter services",
         "Mobility assistance needed",
         "Anxiety about blood draws",
-        "Previous adverse reaction to medications",
         "Hard of hearing - please speak clearly",
         "Prefers morning appointments",
-        "Has transportation limitations",
         "Needs reminder calls",
-        "Requires wheelchair access",
-        "Diabetic - may need glucose monitoring",
         None, None, None, None  # 40% chance of no special notes
     ]
-    return random.choice(notes)
+    return rng.choice(notes)
+
 
-def generate_instructions():
+def generate_instructions(rng):
     """Generate realistic instruction notes"""
     instructions = [
         "Fasting required 12 hours before test",
         "Bring all current medications",
-        "Contact if symptoms worsen",
         "Follow up in 2 weeks",
-        "Schedule follow-up appointment",
         "Lab results will be mailed",
-        "Return for additional testing if needed",
-        "Maintain current medication regimen",
         None, None, None  # 30% chance of no instructions
     ]
-    return random.choice(instructions)
-
-async def create_test_record(status="pending_review"):
-    """Create a single test record with realistic data"""
-    first_name = random.choice(FIRST_NAMES)
-    last_name = random.choice(LAST_NAMES)
-    city = random.choice(CITIES)
-    
-    # Calculate timezone-aware timestamp
-    toronto_tz = pytz.timezone('America/Toronto')
-    base_time = datetime.now(toronto_tz)
-    # Randomize timestamp within last 90 days
-    random_days = random.randint(0, 90)
-    random_hours = random.randint(0, 23)
-    random_minutes = random.randint(0, 59)
-    timestamp = base_time - timedelta(days=random_days, hours=random_hours, minutes=random_minutes)
-    
-    record = {
-        "id": str(uuid.uuid4()),
+    return rng.choice(instructions)
+
+
+def build_registration(rng, index, distribution, blobs):
+    """Create one registration and its child records
+
+    Returns (registration, {collection_name: [documents]})."""
+    first_name = rng.choice(FIRST_NAMES)
+    # Index suffix keeps (firstName, lastName) unique at any scale
+    last_name = f"{rng.choice(LAST_NAMES)}-{index}"
+    city = rng.choice(CITIES)
+    registration_id = make_uuid(rng)
+    reg_date = generate_reg_date(rng)
+    timestamp = BASE_TIME - timedelta(
+        days=(BASE_TIME.date() - reg_date).days,
+        minutes=rng.randint(0, 600),
+    )
+    status = "pending_review" if rng.random() < distribution["pending_ratio"] else "completed"
+
+    photo = None
+    if rng.random() < distribution["photo_ratio"]:
+        photo = f"data:image/jpeg;base64,{blobs['photo']}"
+
+    attachments = [
+        {
+            "id": make_uuid(rng),
+            "type": rng.choice(["PDF", "Image"]),
+            "filename": f"document-{n + 1}.pdf",
+            "url": f"data:application/pdf;base64,{blobs['attachment']}",
+            "savedAt": timestamp.isoformat(),
+        }
+        for n in range(rng.randint(*distribution["attachments"]))
+    ]
+
+    registration = {
+        "id": registration_id,
         "firstName": first_name,
         "lastName": last_name,
-        "dob": generate_dob().isoformat(),
-        "patientConsent": random.choice(PATIENT_CONSENT),
-        "gender": random.choice(GENDERS),
-        "province": random.choice(PROVINCES),
-        "disposition": random.choice(DISPOSITIONS),
-        "aka": None if random.random() < 0.8 else f"{first_name} {fake.first_name()}",
-        "age": str(random.randint(18, 80)),
-        "regDate": generate_reg_date().isoformat(),
-        "healthCard": generate_health_card(),
-        "healthCardVersion": str(random.randint(1, 9)),
-        "referralSite": random.choice(REFERRAL_SITES),
-        "address": generate_address(city),
-        "unitNumber": None if random.random() < 0.7 else str(random.randint(1, 50)),
+        "dob": generate_dob(rng).isoformat(),
+        "patientConsent": rng.choice(PATIENT_CONSENT),
+        "gender": rng.choice(GENDERS),
+        "province": rng.choice(PROVINCES),
+        "disposition": rng.choice(DISPOSITIONS),
+        "aka": None,
+        "age": str(rng.randint(18, 80)),
+        "regDate": reg_date.isoformat(),
+        "healthCard": generate_health_card(rng),
+        "healthCardVersion": str(rng.randint(1, 9)),
+        "referralSite": rng.choice(REFERRAL_SITES),
+        "address": generate_address(rng),
+        "unitNumber": None if rng.random() < 0.7 else str(rng.randint(1, 50)),
         "city": city,
-        "postalCode": generate_postal_code(),
-        "phone1": generate_phone_number(),
-        "phone2": None if random.random() < 0.8 else generate_phone_number(),
-        "ext1": None if random.random() < 0.9 else str(random.randint(100, 9999)),
+        "postalCode": generate_postal_code(rng),
+        "phone1": generate_phone_number(rng),
+        "phone2": None if rng.random() < 0.8 else generate_phone_number(rng),
+        "ext1": None,
         "ext2": None,
-        "leaveMessage": random.choice([True, False]),
-        "voicemail": random.choice([True, False]),
-        "text": random.choice([True, False]),
-        "preferredTime": random.choice([None, "Morning", "Afternoon", "Evening"]),
-        "email": generate_email(first_name, last_name),
-        "language": random.choice(LANGUAGES),
-        "specialAttention": generate_special_attention(),
-        "instructions": generate_instructions(),
-        "photo": None,  # No photos for test data
+        "leaveMessage": rng.choice([True, False]),
+        "voicemail": rng.choice([True, False]),
+        "text": rng.choice([True, False]),
+        "preferredTime": rng.choice([None, "Morning", "Afternoon", "Evening"]),
+        "email": generate_email(rng, first_name, last_name, index),
+        "language": rng.choice(LANGUAGES),
+        "specialAttention": generate_special_attention(rng),
+        "instructions": generate_instructions(rng),
+        "photo": photo,
         "summaryTemplate": None,
         "selectedTemplate": "Select",
-        "physician": random.choice(PHYSICIANS),
-        "rnaAvailable": random.choice(["Yes", "No"]),
-        "rnaSampleDate": None if random.random() < 0.7 else generate_reg_date().isoformat(),
-        "rnaResult": random.choice(["Positive", "Negative", "Pending"]),
-        "coverageType": random.choice(["OHIP", "Private", "Out of Province", "Select"]),
-        "referralPerson": None if random.random() < 0.6 else fake.name(),
+        "physician": rng.choice(PHYSICIANS),
+        "rnaAvailable": rng.choice(["Yes", "No"]),
+        "rnaResult": rng.choice(["Positive", "Negative", "Pending"]),
+        "coverageType": rng.choice(["OHIP", "Private", "Out of Province", "Select"]),
         "testType": "Tests",
-        "hivDate": None if random.random() < 0.8 else generate_reg_date().isoformat(),
-        "hivResult": None if random.random() < 0.8 else random.choice(["Negative", "Positive"]),
-        "hivType": None if random.random() < 0.9 else random.choice(["Type 1", "Type 2"]),
-        "hivTester": random.choice(["CM", "JD", "SP", "MK", "AL"]),
-        "timestamp": timestamp,
+        "hivTester": rng.choice(["CM", "JD", "SP", "MK", "AL"]),
+        "timestamp": timestamp.isoformat(),
         "status": status,
-        "attachments": []
+        "attachments": attachments,
     }
-    
-    return record
-
-async def generate_test_data():
-    """Generate all test data and insert into database"""
-    print("🚀 Starting test data generation...")
-    
-    # Connect to MongoDB
-    mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-    client = AsyncIOMotorClient(mongo_url)
-    db = client[os.environ.get('DB_NAME', 'my420_ca_db')]
-    collection = db.admin_registrations
-    
+
+    def child_date():
+        return (reg_date + timedelta(days=rng.randint(0, 90))).isoformat()
+
+    def child(**fields):
+        return {
+            "id": make_uuid(rng),
+            "registration_id": registration_id,
+            **fields,
+            "created_at": timestamp.isoformat(),
+            "updated_at": timestamp.isoformat(),
+        }
+
+    counts = {
+        collection_name: rng.randint(*bounds)
+        for collection_name, bounds in distribution["children"].items()
+    }
+    client_name = f"{first_name} {last_name}"
+
+    children = {
+        "activities": [
+            child(
+                date=child_date(),
+                time=f"{rng.randint(8, 17):02d}:{rng.choice(['00', '15', '30', '45'])}",
+                description=rng.choice(ACTIVITY_DESCRIPTIONS),
+                client_first_name=first_name,
+                client_last_name=last_name,
+                client_name=client_name,
+                client_name_key=client_name.lower(),
+            )
+            for _ in range(counts.get("activities", 0))
+        ],
+        "test_records": [
+            child(
+                test_type=rng.choice(["HIV", "HCV", "Bloodwork"]),
+                test_date=child_date(),
+                hiv_result=rng.choice(["negative", "positive", None]),
+                hcv_result=rng.choice(["negative", "positive", None]),
+                hiv_tester="CM",
+                hcv_tester="CM",
+                bloodwork_tester="CM",
+            )
+            for _ in range(counts.get("test_records", 0))
+        ],
+        "notes_records": [
+            child(
+                noteDate=child_date(),
+                noteTime=f"{rng.randint(8, 17):02d}:{rng.randint(0, 59):02d}",
+                noteText=" ".join(rng.choices(NOTE_SENTENCES, k=rng.randint(1, 12))),
+                templateType="General Note",
+            )
+            for _ in range(counts.get("notes_records", 0))
+        ],
+        "medications": [
+            child(
+                medication=rng.choice(MEDICATIONS),
+                start_date=child_date(),
+                outcome=rng.choice(MEDICATION_OUTCOMES),
+            )
+            for _ in range(counts.get("medications", 0))
+        ],
+        "interactions": [
+            child(
+                date=child_date(),
+                description=rng.choice(INTERACTION_TYPES),
+                issued="Select",
+            )
+            for _ in range(counts.get("interactions", 0))
+        ],
+        "dispensing": [
+            child(
+                medication=rng.choice(MEDICATIONS),
+                rx=str(rng.randint(100000, 999999)),
+                quantity="28",
+                product_type=rng.choice(["Commercial", "Compassionate"]),
+            )
+            for _ in range(counts.get("dispensing", 0))
+        ],
+    }
+    return registration, children
+
+
+def load_distribution(path=None):
+    """Default distribution, updated from an optional JSON file"""
+    distribution = json.loads(json.dumps(DEFAULT_DISTRIBUTION))
+    if path:
+        overrides = json.loads(Path(path).read_text())
+        distribution["children"].update(overrides.pop("children", {}))
+        distribution.update(overrides)
+    return distribution
+
+
+def iter_shard(seed, shard, start, stop, distribution):
+    """Yield (registration, children) for indices [start, stop)
+
+    Every shard has its own seeded generator, so output does not depend
+    on how many workers run or in which order they finish."""
+    rng = random.Random(f"{seed}:{shard}")
+    # Blobs are generated once per shard - realistic size, cheap to build
+    blobs = {
+        "photo": make_blob(rng, distribution["photo_bytes"]),
+        "attachment": make_blob(rng, distribution["attachment_bytes"]),
+    }
+    for index in range(start, stop):
+        yield build_registration(rng, index, distribution, blobs)
+
+
+def write_shard_to_mongo(mongo_url, db_name, seed, shard, start, stop, distribution, batch_size):
+    """Worker process: generate one shard and insert it in batches"""
+    from mongo_connection import connect
+
+    client, db = connect(mongo_url, db_name, app_name="my420-test-data")
+    counts = {"admin_registrations": 0, **{name: 0 for name in CHILD_COLLECTIONS}}
+    buffers = {name: [] for name in counts}
+
+    def flush(collection_name):
+        documents = buffers[collection_name]
+        if documents:
+            db[collection_name].insert_many(documents, ordered=False)
+            counts[collection_name] += len(documents)
+            documents.clear()
+
     try:
-        # Clear any existing test data (optional - comment out if you want to keep existing records)
-        print("🗑️  Clearing existing test records...")
-        await collection.delete_many({"firstName": {"$in": FIRST_NAMES}})
-        
-        total_records = []
-        
-        # Generate 500 pending records
-        print("📝 Generating 500 pending records...")
-        pending_records = []
-        for i in range(500):
-            record = await create_test_record(status="pending_review")
-            pending_records.append(record)
-            if (i + 1) % 50 == 0:
-                print(f"   Generated {i + 1}/500 pending records...")
-        
-        # Generate 1000 submitted records  
-        print("📋 Generating 1000 submitted records...")
-        submitted_records = []
-        for i in range(1000):
-            record = await create_test_record(status="completed")
-            submitted_records.append(record)
-            if (i + 1) % 100 == 0:
-                print(f"   Generated {i + 1}/1000 submitted records...")
-        
-        total_records = pending_records + submitted_records
-        
-        # Insert in batches to handle potential duplicates
-        print("💾 Inserting records into database...")
-        batch_size = 100
-        inserted_count = 0
-        duplicate_count = 0
-        
-        for i in range(0, len(total_records), batch_size):
-            batch = total_records[i:i+batch_size]
-            
-            # Insert each record individually to handle duplicates
-            for record in batch:
-                try:
-                    await collection.insert_one(record)
-                    inserted_count += 1
-                except Exception as e:
-                    if "duplicate key" in str(e).lower():
-                        duplicate_count += 1
-                        # Generate new names and try again
-                        record["firstName"] = random.choice(FIRST_NAMES)
-                        record["lastName"] = random.choice(LAST_NAMES) 
-                        record["id"] = str(uuid.uuid4())
-                        try:
-                            await collection.insert_one(record)
-                            inserted_count += 1
-                        except:
-                            duplicate_count += 1
-                    else:
-                        print(f"Error inserting record: {e}")
-            
-            if (i + batch_size) % (batch_size * 5) == 0:
-                print(f"   Inserted {min(i + batch_size, len(total_records))}/{len(total_records)} records...")
-        
-        # Verify insertion
-        pending_count = await collection.count_documents({"status": "pending_review"})
-        submitted_count = await collection.count_documents({"status": "completed"})
-        
-        print(f"\n✅ Test data generation completed!")
-        print(f"📊 Results:")
-        print(f"   - Successfully inserted: {inserted_count} records")
-        print(f"   - Duplicates skipped: {duplicate_count} records") 
-        print(f"   - Pending records in DB: {pending_count}")
-        print(f"   - Submitted records in DB: {submitted_count}")
-        print(f"   - Total records in DB: {pending_count + submitted_count}")
-        
-        return True
-        
-    except Exception as e:
-        print(f"❌ Error generating test data: {e}")
-        return False
+        for registration, children in iter_shard(seed, shard, start, stop, distribution):
+            buffers["admin_registrations"].append(registration)
+            for collection_name, documents in children.items():
+                buffers[collection_name].extend(documents)
+            for collection_name, documents in buffers.items():
+                if len(documents) >= batch_size:
+                    flush(collection_name)
+        for collection_name in buffers:
+            flush(collection_name)
     finally:
         client.close()
+    return counts
+
+
+def write_shard_to_ndjson(output_dir, seed, shard, start, stop, distribution):
+    """Worker process: generate one shard as NDJSON files for mongoimport"""
+    counts = {"admin_registrations": 0, **{name: 0 for name in CHILD_COLLECTIONS}}
+    files = {
+        name: open(Path(output_dir) / f"{name}.{shard:04d}.ndjson", "w")
+        for name in counts
+    }
+    try:
+        for registration, children in iter_shard(seed, shard, start, stop, distribution):
+            files["admin_registrations"].write(json.dumps(registration) + "\n")
+            counts["admin_registrations"] += 1
+            for collection_name, documents in children.items():
+                for document in documents:
+                    files[collection_name].write(json.dumps(document) + "\n")
+                counts[collection_name] += len(documents)
+    finally:
+        for handle in files.values():
+            handle.close()
+    return counts
+
+
+def clear_generated_data(mongo_url, db_name, batch_size):
+    """Remove registrations created by this generator and their children"""
+    from mongo_connection import connect
+
+    client, db = connect(mongo_url, db_name, app_name="my420-test-data")
+    try:
+        pattern = f"^({'|'.join(LAST_NAMES)})-[0-9]+$"
+        query = {"firstName": {"$in": FIRST_NAMES}, "lastName": {"$regex": pattern}}
+        ids = [doc["id"] for doc in db.admin_registrations.find(query, {"_id": 0, "id": 1})]
+        for start in range(0, len(ids), batch_size):
+            batch = ids[start:start + batch_size]
+            for collection_name in CHILD_COLLECTIONS:
+                db[collection_name].delete_many({"registration_id": {"$in": batch}})
+            db.admin_registrations.delete_many({"id": {"$in": batch}})
+        return len(ids)
+    finally:
+        client.close()
+
+
+def generate_test_data(args):
+    """Generate all test data with a pool of worker processes"""
+    distribution = load_distribution(args.distribution)
+    # Shard boundaries depend only on shard_size so the worker count never
+    # changes the generated data
+    shard_size = max(1, args.shard_size)
+    shards = [
+        (shard, start, min(start + shard_size, args.registrations))
+        for shard, start in enumerate(range(0, args.registrations, shard_size))
+    ]
+
+    if args.ndjson:
+        Path(args.ndjson).mkdir(parents=True, exist_ok=True)
+        print(f"🚀 Writing {args.registrations:,} registrations as NDJSON to {args.ndjson} "
+              f"({len(shards)} shards, {args.workers} workers, seed {args.seed})")
+    else:
+        print(f"🚀 Inserting {args.registrations:,} registrations into {args.db_name} "
+              f"({len(shards)} shards, {args.workers} workers, seed {args.seed})")
+
+    totals = {"admin_registrations": 0, **{name: 0 for name in CHILD_COLLECTIONS}}
+    started = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        if args.ndjson:
+            futures = [
+                pool.submit(write_shard_to_ndjson, args.ndjson, args.seed, shard, start, stop, distribution)
+                for shard, start, stop in shards
+            ]
+        else:
+            futures = [
+                pool.submit(
+                    write_shard_to_mongo, args.mongo_url, args.db_name, args.seed,
+                    shard, start, stop, distribution, args.batch_size,
+                )
+                for shard, start, stop in shards
+            ]
+        for done, future in enumerate(as_completed(futures), start=1):
+            for collection_name, count in future.result().items():
+                totals[collection_name] += count
+            print(f"   Completed {done}/{len(shards)} shards "
+                  f"({totals['admin_registrations']:,} registrations)...")
+
+    elapsed = time.perf_counter() - started
+    child_total = sum(totals[name] for name in CHILD_COLLECTIONS)
+    print(f"\n✅ Test data generation completed in {elapsed:.1f}s")
+    print("📊 Results:")
+    for collection_name, count in totals.items():
+        print(f"   - {collection_name}: {count:,}")
+    print(f"   - Child records: {child_total:,} ({child_total / elapsed:,.0f}/s)")
+
+    if args.ndjson:
+        print("\n💡 Import with:")
+        print(f"   for f in {args.ndjson}/*.ndjson; do "
+              f"mongoimport --db {args.db_name} --collection \"$(basename $f | cut -d. -f1)\" --file \"$f\"; done")
+    return totals
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk synthetic test data generator")
+    parser.add_argument("--registrations", type=int, default=1500, help="Number of registrations")
+    parser.add_argument("--seed", type=int, default=42, help="Random seed - same seed, same data")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1, help="Worker processes")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Documents per insert_many")
+    parser.add_argument("--shard-size", type=int, default=5000, help="Registrations per work unit")
+    parser.add_argument("--distribution", help="JSON file overriding DEFAULT_DISTRIBUTION")
+    parser.add_argument("--ndjson", metavar="DIR", help="Write NDJSON files instead of inserting")
+    parser.add_argument("--mongo-url", default=os.environ.get("MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db-name", default=os.environ.get("DB_NAME", "my420_ca_db"))
+    parser.add_argument("--clear", action="store_true",
+                        help="Remove previously generated records and exit")
+    args = parser.parse_args()
+
+    if args.clear:
+        removed = clear_generated_data(args.mongo_url, args.db_name, args.batch_size)
+        print(f"🗑️  Removed {removed:,} generated registrations and their child records")
+        return
+
+    try:
+        generate_test_data(args)
+    except Exception as e:
+        print(f"❌ Error generating test data: {e}")
+        sys.exit(1)
+
 
 if __name__ == "__main__":
-    asyncio.run(generate_test_data())
\ No newline at end of file
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Startup Import Profile
+Imports the API module in a fresh interpreter with -X importtime, prints the
+slowest parts of the import tree and optionally enforces an import budget
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+
+# Only the analytics endpoints use these - they must stay lazy
+DEFERRED_MODULES = ["pandas", "numpy", "plotly", "scipy", "anthropic"]
+
+
+def profile_imports(module):
+    """Import module in a subprocess and return (name, self_us, cumulative_us, depth) rows"""
+    env = dict(os.environ)
+    env.setdefault("ANTHROPIC_API_KEY", "import-profile")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        print(result.stderr)
+        print(f"❌ Importing {module} failed")
+        sys.exit(1)
+
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|", 2)
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((name.strip(), int(self_us), int(cumulative_us), depth))
+    return rows
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Profile API import time")
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--top", type=int, default=25, help="Rows to show")
+    parser.add_argument("--max-depth", type=int, default=3,
+                        help="Deepest import level to list")
+    parser.add_argument("--budget-ms", type=float,
+                        help="Fail if the total import time exceeds this")
+    parser.add_argument("--runs", type=int, default=3,
+                        help="Take the fastest of this many runs")
+    args = parser.parse_args()
+
+    runs = [profile_imports(args.module) for _ in range(args.runs)]
+    rows = min(runs, key=lambda run: next(
+        (row[2] for row in run if row[0] == args.module), 0
+    ))
+    loaded = {name for name, _, _, _ in rows}
+    total_ms = next(
+        (cumulative / 1000 for name, _, cumulative, _ in rows if name == args.module),
+        0.0,
+    )
+
+    print(f"\n⏱️  import {args.module}: {total_ms:.1f}ms, {len(loaded)} modules")
+    print(f"   {'cumulative':>10}  {'self':>8}  module")
+    shown = sorted(
+        (row for row in rows if row[3] <= args.max_depth),
+        key=lambda row: row[2],
+        reverse=True,
+    )[:args.top]
+    for name, self_us, cumulative_us, depth in shown:
+        print(f"   {cumulative_us / 1000:>8.1f}ms  {self_us / 1000:>6.1f}ms  {'  ' * depth}{name}")
+
+    exit_code = 0
+    eager = [name for name in DEFERRED_MODULES if name in loaded]
+    if eager:
+        print(f"\n❌ Deferred modules imported at startup: {', '.join(eager)}")
+        exit_code = 1
+
+    if args.budget_ms is not None:
+        if total_ms > args.budget_ms:
+            print(f"\n❌ Import time {total_ms:.1f}ms is over the {args.budget_ms:.0f}ms budget")
+            exit_code = 1
+        else:
+            print(f"\n✅ Import time within the {args.budget_ms:.0f}ms budget")
+
+    sys.exit(exit_code)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,24 @@
+"""
+Shared MongoDB connection for the maintenance scripts
+Uses the backend's connection factory so scripts get the same pool,
+compression and timeout settings as the API
+"""
+
+import sys
+from pathlib import Path
+
+# The backend sits next to scripts/ in the repo and at /backend in the container
+for backend_dir in (Path(__file__).resolve().parent.parent / "backend", Path("/backend")):
+    if (backend_dir / "app" / "mongo.py").exists():
+        if str(backend_dir) not in sys.path:
+            sys.path.insert(0, str(backend_dir))
+        break
+
+from app.mongo import MongoSettings, create_sync_client  # noqa: E402
+
+
+def connect(mongo_url=None, db_name=None, app_name="my420-scripts"):
+    """Return (client, db) for MONGO_URL / DB_NAME unless overridden"""
+    mongo_settings = MongoSettings()
+    client = create_sync_client(mongo_settings, url=mongo_url, app_name=app_name)
+    return client, client[db_name or mongo_settings.db_name]
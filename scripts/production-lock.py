@@ -9,6 +9,7 @@ import os
 import sys
 import json
 import pymongo
+from mongo_connection import connect
 from datetime import datetime
 from pathlib import Path
 
@@ -25,8 +26,7 @@ class ProductionLock:
         
         # Connect to MongoDB
         try:
-            self.client = pymongo.MongoClient(self.mongo_url)
-            self.db = self.client[self.db_name]
+            self.client, self.db = connect(self.mongo_url, self.db_name)
         except Exception as e:
             print(f"❌ Failed to connect to MongoDB: {e}")
             sys.exit(1)
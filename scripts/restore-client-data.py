@@ -4,7 +4,7 @@ Robust Client Data Restoration Script
 Handles proper field mapping and data restoration
 """
 
-import pymongo
+from mongo_connection import connect
 import json
 import os
 import sys
@@ -14,9 +14,7 @@ from pathlib import Path
 def connect_to_mongodb():
     """Connect to MongoDB using environment variables"""
     try:
-        mongo_url = os.environ.get('MONGO_URL', 'mongodb://localhost:27017')
-        client = pymongo.MongoClient(mongo_url)
-        db = client['my420_ca_db']
+        client, db = connect()
         return db
     except Exception as e:
         print(f"Error connecting to MongoDB: {e}")
@@ -0,0 +1,11 @@
+import os
+import sys
+
+# The backend package is imported as "app", the way uvicorn runs it
+sys.path.insert(
+    0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "backend")
+)
+
+# Settings read these at import; nothing here talks to Claude or MongoDB
+os.environ.setdefault("ANTHROPIC_API_KEY", "test")
+os.environ.setdefault("ENVIRONMENT", "development")
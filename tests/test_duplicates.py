@@ -0,0 +1,107 @@
+import pytest
+
+from app.duplicates import SCORE_THRESHOLD, blocking_keys, score_pair
+
+
+JON = {
+    "id": "a",
+    "firstName": "Jon",
+    "lastName": "Smith",
+    "dob": "1980-02-03",
+    "phone1": "416-555-0199",
+}
+JOHN = {
+    "id": "b",
+    "firstName": "John",
+    "lastName": "Smyth",
+    "dob": "1980-03-02",
+    "phone1": "5550199",
+}
+
+
+def test_blocking_keys():
+    assert blocking_keys(JON) == [
+        "fn:JN|dob:1980-02-03",
+        "ln:SM0|fi:j",
+        "ln:SM0|y:1980",
+        "ph:5550199",
+    ]
+
+
+def test_spelling_variants_share_blocking_keys():
+    shared = set(blocking_keys(JON)) & set(blocking_keys(JOHN))
+    assert shared == {"ln:SM0|fi:j", "ln:SM0|y:1980", "ph:5550199"}
+
+
+def test_changed_last_name_still_shares_a_block():
+    married = {**JON, "lastName": "Jones", "phone1": ""}
+    assert set(blocking_keys(JON)) & set(blocking_keys(married)) == {
+        "fn:JN|dob:1980-02-03"
+    }
+
+
+@pytest.mark.parametrize(
+    "registration",
+    [
+        {},
+        {"lastName": "Smith"},
+        {"firstName": "Ann", "dob": "1980"},
+        {"phone1": "555-01"},
+    ],
+)
+def test_too_little_to_block_on(registration):
+    assert blocking_keys(registration) == []
+
+
+def test_likely_duplicate_scores_over_threshold():
+    score, reasons = score_pair(JON, JOHN)
+    assert score == pytest.approx(0.821)
+    assert score >= SCORE_THRESHOLD
+    assert reasons == [
+        "similar last name",
+        "similar first name",
+        "close date of birth",
+        "same phone",
+    ]
+
+
+def test_score_is_symmetric():
+    assert score_pair(JON, JOHN) == score_pair(JOHN, JON)
+
+
+def test_same_health_card_is_certain():
+    card = {"healthCardKey": "1234567890AB"}
+    assert score_pair(
+        {**JON, **card}, {"firstName": "Someone", **card}
+    ) == (1.0, ["same health card"])
+
+
+def test_renewed_card_version_is_not_a_different_card():
+    score, _ = score_pair(
+        {**JON, "healthCardKey": "1234567890AB"},
+        {**JON, "healthCardKey": "1234567890AC"},
+    )
+    assert score == 1.0
+
+
+def test_different_health_cards_halve_the_score():
+    score, _ = score_pair(
+        {**JON, "healthCardKey": "1234567890AB"},
+        {**JON, "healthCardKey": "9999567890AB"},
+    )
+    assert score == 0.5
+
+
+def test_missing_fields_are_neutral():
+    score, reasons = score_pair({"firstName": "Bob"}, {"firstName": "Alice"})
+    assert score == pytest.approx(0.375)
+    assert reasons == []
+
+
+def test_aka_counts_as_a_first_name():
+    score, reasons = score_pair(
+        {"firstName": "Rob", "lastName": "Lee"},
+        {"firstName": "Xavier", "aka": "Rob", "lastName": "Lee"},
+    )
+    assert "similar first name" in reasons
+    assert score == pytest.approx(0.8)
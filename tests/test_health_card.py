@@ -0,0 +1,36 @@
+import pytest
+
+from app.utils import health_card_key
+
+
+@pytest.mark.parametrize(
+    "health_card, version, key",
+    [
+        ("1234-567-890", "AB", "1234567890AB"),
+        ("1234 567 890 ab", None, "1234567890AB"),
+        (" 1234567890 ", " ab ", "1234567890AB"),
+        ("1234567890", "", "1234567890"),
+        ("A12345678", None, "A12345678"),
+    ],
+)
+def test_health_card_key_normalizes(health_card, version, key):
+    assert health_card_key(health_card, version) == key
+
+
+@pytest.mark.parametrize(
+    "health_card", [None, "", "N/A", "0", "unknown", "1234567", "12-34-56-7"]
+)
+def test_placeholders_have_no_key(health_card):
+    assert health_card_key(health_card, "AB") is None
+
+
+def test_formatting_does_not_change_the_key():
+    assert health_card_key("1234-567-890", "ab") == health_card_key(
+        "1234567890", "AB"
+    )
+
+
+def test_version_is_part_of_the_key():
+    assert health_card_key("1234567890", "AB") != health_card_key(
+        "1234567890", "AC"
+    )
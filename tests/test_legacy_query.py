@@ -0,0 +1,160 @@
+import pytest
+
+from app.legacy import build_frame, describe_frame, run_query
+
+
+RECORDS = [
+    {"RegDate": "2021-01-05T00:00:00", "Disposition": "ACTIVE", "Site": "North", "Age": 30},
+    {"RegDate": "2021-01-20T00:00:00", "Disposition": "CURED", "Site": "South", "Age": 40},
+    {"RegDate": "2021-02-03T00:00:00", "Disposition": "ACTIVE", "Site": "North", "Age": ""},
+    {"RegDate": "2021-04-11T00:00:00", "Disposition": "SOT", "Site": "East", "Age": 50},
+    {"RegDate": "", "Disposition": "ACTIVE", "Site": "South", "Age": 20},
+    {"RegDate": "2021-04-30T00:00:00", "Disposition": "CURED", "Site": "North", "Age": 60},
+]
+
+
+def query(**overrides):
+    base = {
+        "filters": [],
+        "group_by": [],
+        "date_bucket": None,
+        "aggregates": [],
+        "columns": [],
+        "order_by": None,
+        "descending": True,
+        "top": 100,
+    }
+    return {**base, **overrides}
+
+
+@pytest.fixture(scope="module")
+def frame():
+    return build_frame(RECORDS)
+
+
+def test_columns_are_typed(frame):
+    types = {column["name"]: column["type"] for column in describe_frame(frame)}
+    assert types == {
+        "RegDate": "date",
+        "Disposition": "text",
+        "Site": "text",
+        "Age": "number",
+    }
+
+
+def test_group_by_counts_biggest_first(frame):
+    result = run_query(frame, query(group_by=["Disposition"]))
+    assert result["rows"] == [
+        {"Disposition": "ACTIVE", "count": 3},
+        {"Disposition": "CURED", "count": 2},
+        {"Disposition": "SOT", "count": 1},
+    ]
+
+
+def test_filters_and_numeric_aggregates(frame):
+    result = run_query(
+        frame,
+        query(
+            filters=[{"column": "Age", "op": "gte", "value": 30}],
+            group_by=["Site"],
+            aggregates=[
+                {"op": "sum", "column": "Age", "name": None},
+                {"op": "mean", "column": "Age", "name": None},
+            ],
+            order_by="Site",
+            descending=False,
+        ),
+    )
+    assert result["matched_records"] == 4
+    assert result["rows"] == [
+        {"Site": "East", "sum_Age": 50, "mean_Age": 50},
+        {"Site": "North", "sum_Age": 90, "mean_Age": 45},
+        {"Site": "South", "sum_Age": 40, "mean_Age": 40},
+    ]
+
+
+def test_date_bucket_skips_undated_rows_in_time_order(frame):
+    result = run_query(
+        frame, query(date_bucket={"column": "RegDate", "unit": "month"})
+    )
+    assert result["rows"] == [
+        {"RegDate_month": "2021-01", "count": 2},
+        {"RegDate_month": "2021-02", "count": 1},
+        {"RegDate_month": "2021-04", "count": 2},
+    ]
+
+
+def test_top_k(frame):
+    result = run_query(
+        frame, query(columns=["Site", "Age"], order_by="Age", top=2)
+    )
+    assert [row["Age"] for row in result["rows"]] == [60, 50]
+    assert result["total_rows"] == 6
+
+
+@pytest.mark.parametrize(
+    "op, value, expected",
+    [
+        ("gt", "North", ["South", "South"]),
+        ("lte", "North", ["North", "North", "East", "North"]),
+        ("between", ["E", "O"], ["North", "North", "East", "North"]),
+        ("contains", "OUT", ["South", "South"]),
+        ("in", ["East", "South"], ["South", "East", "South"]),
+    ],
+)
+def test_text_filters(frame, op, value, expected):
+    result = run_query(
+        frame,
+        query(
+            filters=[{"column": "Site", "op": op, "value": value}],
+            columns=["Site"],
+        ),
+    )
+    assert [row["Site"] for row in result["rows"]] == expected
+
+
+def test_text_min_max(frame):
+    result = run_query(
+        frame,
+        query(
+            group_by=["Disposition"],
+            aggregates=[
+                {"op": "min", "column": "Site", "name": None},
+                {"op": "max", "column": "Site", "name": None},
+            ],
+            order_by="Disposition",
+            descending=False,
+        ),
+    )
+    assert result["rows"] == [
+        {"Disposition": "ACTIVE", "min_Site": "North", "max_Site": "South"},
+        {"Disposition": "CURED", "min_Site": "North", "max_Site": "South"},
+        {"Disposition": "SOT", "min_Site": "East", "max_Site": "East"},
+    ]
+
+
+@pytest.mark.parametrize(
+    "overrides, message",
+    [
+        ({"group_by": ["Nope"]}, "Unknown column"),
+        (
+            {"aggregates": [{"op": "mean", "column": "Site", "name": None}]},
+            "not a number column",
+        ),
+        (
+            {"filters": [{"column": "Age", "op": "eq", "value": "abc"}]},
+            "not a valid number",
+        ),
+        (
+            {"date_bucket": {"column": "Site", "unit": "month"}},
+            "not a date column",
+        ),
+        (
+            {"filters": [{"column": "Age", "op": "between", "value": [1]}]},
+            "needs two values",
+        ),
+    ],
+)
+def test_bad_queries_raise_value_error(frame, overrides, message):
+    with pytest.raises(ValueError, match=message):
+        run_query(frame, query(**overrides))
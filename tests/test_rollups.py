@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+from app import rollups
+from app.rollups import DIMENSIONS, _cell_document, cell_id, rollup_cell
+
+
+REGISTRATION = {
+    "id": "r1",
+    "regDate": "2024-03-05T10:00:00",
+    "referralSite": "  North ",
+    "disposition": "",
+    "physician": None,
+    "testType": "POC",
+    "status": "completed",
+    "province": "ON",
+}
+
+
+def test_rollup_cell_trims_and_groups_blanks():
+    assert rollup_cell(REGISTRATION) == {
+        "day": "2024-03-05",
+        "referralSite": "North",
+        "disposition": None,
+        "physician": None,
+        "testType": "POC",
+        "status": "completed",
+        "province": "ON",
+    }
+
+
+def test_rollup_cell_of_empty_registration():
+    assert rollup_cell({}) == {dimension: None for dimension in DIMENSIONS}
+
+
+def test_cell_id_is_dimension_ordered():
+    cell = rollup_cell(REGISTRATION)
+    assert json.loads(cell_id(cell)) == [cell[d] for d in DIMENSIONS]
+    shuffled = dict(reversed(list(cell.items())))
+    assert cell_id(shuffled) == cell_id(cell)
+
+
+def test_cell_id_tells_blank_from_text():
+    blank = rollup_cell({})
+    assert cell_id(blank) != cell_id({**blank, "province": "None"})
+
+
+def test_cell_document_adds_date_levels():
+    document = _cell_document(rollup_cell(REGISTRATION))
+    assert document["month"] == "2024-03"
+    assert document["year"] == "2024"
+    assert document["day"] == "2024-03-05"
+
+
+def test_cell_document_without_date():
+    document = _cell_document(rollup_cell({"status": "pending"}))
+    assert document["month"] is None and document["year"] is None
+
+
+class FakeCollection:
+    def __init__(self):
+        self.operations = []
+        self.deleted = []
+
+    async def bulk_write(self, operations, ordered=True):
+        self.operations.extend(operations)
+
+    async def delete_many(self, query):
+        self.deleted.append(query)
+
+
+class RecordedUpdate:
+    """Stands in for UpdateOne, keeping the arguments it was built with"""
+
+    def __init__(self, filter, update, upsert=False):
+        self.filter = filter
+        self.update = update
+        self.upsert = upsert
+
+
+def test_apply_changes_moves_counts(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(
+        rollups, "db", {rollups.ROLLUP_COLLECTION: collection}
+    )
+    monkeypatch.setattr(rollups, "UpdateOne", RecordedUpdate)
+    old = rollup_cell(REGISTRATION)
+    new = {**old, "status": "pending"}
+    asyncio.run(
+        rollups.apply_changes([(old, new), (None, old), (None, None)])
+    )
+
+    moves = [
+        (operation.filter["_id"], operation.update["$inc"]["count"])
+        for operation in collection.operations
+    ]
+    assert all(operation.upsert for operation in collection.operations)
+    assert moves == [(cell_id(old), -1), (cell_id(new), 1), (cell_id(old), 1)]
+    assert collection.deleted == [
+        {"_id": {"$in": [cell_id(old)]}, "count": {"$lte": 0}}
+    ]
+
+
+def test_apply_changes_without_moves_writes_nothing(monkeypatch):
+    collection = FakeCollection()
+    monkeypatch.setattr(
+        rollups, "db", {rollups.ROLLUP_COLLECTION: collection}
+    )
+    asyncio.run(rollups.apply_changes([(None, None)]))
+    assert collection.operations == [] and collection.deleted == []
@@ -0,0 +1,109 @@
+import re
+
+from app.search import (
+    MAX_TOKENS,
+    build_search_document,
+    search_match,
+    tokenize,
+)
+
+
+def matches(document: dict, query: str, types: list = None) -> bool:
+    """Evaluate search_match against one search document the way MongoDB
+    does - every condition must hold for some token"""
+    match = search_match(tokenize(query)[:10], types)
+    if "type" in match and document["type"] not in match["type"]["$in"]:
+        return False
+    return all(
+        any(
+            re.search(condition["tokens"]["$regex"], token)
+            for token in document["tokens"]
+        )
+        for condition in match["$and"]
+    )
+
+
+CLIENT = build_search_document(
+    "admin_registrations",
+    {
+        "id": "r1",
+        "firstName": "Zoë",
+        "lastName": "O'Brien-Smith",
+        "email": "zoe.obrien@example.com",
+        "dob": "1980-02-03",
+        "healthCard": "1234-567-890 AB",
+        "phone1": "(416) 555-0199",
+        "city": "Toronto",
+    },
+)
+
+NOTE = build_search_document(
+    "notes_records",
+    {
+        "id": "n1",
+        "registration_id": "r1",
+        "templateType": "Consultation",
+        "noteText": "Discussed Naloxone kit and follow-up.",
+    },
+)
+
+
+def test_tokenize_lowercases_and_strips_accents():
+    assert tokenize("Zoë", "ÉCOLE Café") == ["zoe", "ecole", "cafe"]
+
+
+def test_tokenize_splits_on_punctuation():
+    assert tokenize("O'Brien-Smith, 416-555-0199") == [
+        "o",
+        "brien",
+        "smith",
+        "416",
+        "555",
+        "0199",
+    ]
+
+
+def test_tokenize_keeps_first_seen_order_without_repeats():
+    assert tokenize("b a b", None, "", "a c") == ["b", "a", "c"]
+
+
+def test_tokenize_caps_token_count():
+    words = " ".join(f"w{index}" for index in range(MAX_TOKENS + 50))
+    assert len(tokenize(words)) == MAX_TOKENS
+
+
+def test_client_document_carries_compact_identifiers():
+    assert CLIENT["_id"] == "client:r1"
+    assert CLIENT["title"] == "Zoë O'Brien-Smith"
+    assert "4165550199" in CLIENT["tokens"]
+    assert "1234567890ab" in CLIENT["tokens"]
+
+
+def test_search_matches_token_prefixes():
+    assert matches(CLIENT, "zo")
+    assert matches(CLIENT, "ZOE brien")
+    assert matches(CLIENT, "smi tor")
+
+
+def test_search_requires_every_term():
+    assert not matches(CLIENT, "zoe vancouver")
+
+
+def test_search_does_not_match_inside_tokens():
+    assert not matches(CLIENT, "rien")
+
+
+def test_search_finds_formatted_numbers_either_way():
+    assert matches(CLIENT, "416-555-0199")
+    assert matches(CLIENT, "4165550199")
+    assert matches(CLIENT, "1234 567 890")
+
+
+def test_search_terms_are_escaped():
+    assert search_match(["a.b"])["$and"] == [{"tokens": {"$regex": "^a\\.b"}}]
+
+
+def test_search_filters_types():
+    assert matches(NOTE, "nalox", ["note"])
+    assert not matches(NOTE, "nalox", ["client"])
+    assert "type" not in search_match(["x"])
@@ -0,0 +1,52 @@
+from app.utils import build_snippet, search_terms
+
+
+def highlighted(result: dict) -> list:
+    return [result["snippet"][start:end] for start, end in result["highlights"]]
+
+
+def test_search_terms_keep_phrase_words_and_drop_negations():
+    assert search_terms('Naloxone "follow up" -cancelled') == [
+        "naloxone",
+        "follow",
+        "up",
+    ]
+    assert search_terms("") == [] and search_terms(None) == []
+
+
+def test_short_note_is_returned_whole():
+    result = build_snippet("Gave a Naloxone kit.", ["naloxone"])
+    assert result["snippet"] == "Gave a Naloxone kit."
+    assert highlighted(result) == ["Naloxone"]
+
+
+def test_words_match_on_prefix():
+    result = build_snippet("Counselled and counselling done", ["counsel"])
+    assert highlighted(result) == ["Counselled", "counselling"]
+
+
+def test_no_match_starts_at_the_beginning():
+    result = build_snippet("word " * 100, ["missing"], width=20)
+    assert result["snippet"] == "word word word word …"
+    assert result["highlights"] == []
+
+
+def test_window_opens_before_a_late_match():
+    text = " ".join(f"w{index}" for index in range(100)) + " naloxone kit"
+    result = build_snippet(text, ["naloxone"], width=60)
+    assert result["snippet"].startswith("…")
+    assert not result["snippet"].endswith("…")
+    assert highlighted(result) == ["naloxone"]
+    # The window opens on a word boundary
+    assert result["snippet"][1:].split(" ")[0].startswith("w")
+
+
+def test_highlights_outside_the_window_are_dropped():
+    text = "kit " + "x" * 200 + " kit"
+    result = build_snippet(text, ["kit"], width=50)
+    assert result["snippet"].endswith("…")
+    assert highlighted(result) == ["kit"]
+
+
+def test_empty_text():
+    assert build_snippet(None, ["kit"]) == {"snippet": "", "highlights": []}
@@ -0,0 +1,93 @@
+from app.templating import (
+    LEGACY_CONTACT_SENTENCE,
+    render_many,
+    render_template,
+    validate_template,
+)
+
+
+CLIENT = {
+    "firstName": "Jane",
+    "lastName": "Doe",
+    "dob": "1980-02-03",
+    "phone1": "4165550123",
+    "address": "1 Main St",
+}
+
+
+def test_text_keeps_braces_as_typed():
+    content = "Use {{ firstName }} and {% raw %} literally {# here #}"
+    assert render_template(content, CLIENT) == content
+    assert validate_template(content) == []
+
+
+def test_text_adapts_contact_sentence():
+    content = f"Summary. {LEGACY_CONTACT_SENTENCE} Done {{{{x}}}}."
+    assert render_template(content, CLIENT) == content
+
+    no_phone = {**CLIENT, "phone1": ""}
+    assert render_template(content, no_phone) == (
+        "Summary. Client does have a valid address but no phone number "
+        "for results. Done {{x}}."
+    )
+
+    nothing = {"firstName": "Jane"}
+    assert "does not have a valid address or phone number" in (
+        render_template(content, nothing)
+    )
+
+
+def test_text_contact_sentence_falls_back_to_phone():
+    client = {"address": "", "phone": "4165550123"}
+    assert render_template(LEGACY_CONTACT_SENTENCE, client) == (
+        "Client does not have a valid address but has provided a phone "
+        "number for results."
+    )
+
+
+def test_jinja_placeholders_and_filters():
+    content = "{{ full_name }} born {{ dob | date('%d/%m/%Y') }}, {{ phone1 | phone }}"
+    assert render_template(content, CLIENT, syntax="jinja") == (
+        "Jane Doe born 03/02/1980, (416) 555-0123"
+    )
+
+
+def test_jinja_conditionals():
+    content = "{% if has_phone %}call{% else %}mail{% endif %}"
+    assert render_template(content, CLIENT, syntax="jinja") == "call"
+    assert render_template(content, {}, syntax="jinja") == "mail"
+
+
+def test_jinja_contact_sentence():
+    no_address = {**CLIENT, "address": ""}
+    assert render_template(
+        LEGACY_CONTACT_SENTENCE, no_address, syntax="jinja"
+    ).startswith("Client does not have a valid address but has provided")
+
+
+def test_jinja_that_does_not_compile_is_returned_unchanged():
+    content = "Hello {{ firstName"
+    assert render_template(content, CLIENT, syntax="jinja") == content
+
+
+def test_validate_jinja_reports_syntax_errors():
+    assert validate_template("{% if has_phone %}no end", "jinja")
+    assert validate_template("{{ firstName", "jinja")
+
+
+def test_validate_jinja_reports_unknown_placeholders():
+    errors = validate_template("{{ firstName }} {{ favouriteColour }}", "jinja")
+    assert len(errors) == 1
+    assert "favouriteColour" in errors[0]
+
+
+def test_validate_jinja_accepts_known_fields():
+    content = "{{ full_name }} {{ dob | date }} {% if rna_positive %}+{% endif %}"
+    assert validate_template(content, "jinja") == []
+
+
+def test_render_many_uses_syntax():
+    content = "{{ firstName }}"
+    clients = [CLIENT, {**CLIENT, "firstName": "Sam"}]
+    assert render_many(content, clients) == [content, content]
+    assert render_many(content, clients, syntax="jinja") == ["Jane", "Sam"]